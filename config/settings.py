@@ -41,17 +41,34 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.RateLimitMiddleware',
+    'core.middleware.TrafficRecorderMiddleware',
+    'core.middleware.ServerTimingMiddleware',
+    'core.middleware.SlowQueryMiddleware',
+    'core.middleware.ProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
 
+# "ratelimit" is a file cache so every worker process on the host shares the
+# same token buckets; point both at Redis/Memcached when running on several hosts
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "ratelimit": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": BASE_DIR / "cache" / "ratelimit",
+    },
+}
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -80,6 +97,16 @@ DATABASES = {
     }
 }
 
+# pharmacy branches (code -> name and database alias). Each branch's
+# inventory lives in its alias; give a branch its own by adding e.g.
+#   DATABASES["branch_north"] = {"ENGINE": ..., "NAME": BASE_DIR / "branches" / "north.sqlite3"}
+#   BRANCHES["north"] = {"NAME": "North", "DATABASE": "branch_north"}
+# and running `manage.py migrate --database branch_north`
+BRANCHES = {
+    "main": {"NAME": "Main branch", "DATABASE": "default"},
+}
+DATABASE_ROUTERS = ["core.branches.BranchRouter"]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -117,10 +144,121 @@ USE_TZ = True
 
 STATIC_URL = "/static/"
 STATICFILES_DIRS = [BASE_DIR / "static"]
+STATIC_ROOT = BASE_DIR / "staticfiles"
+# core/dist/* bundles are built from core/app and core/styles (core/assets.py);
+# `manage.py build_assets` collects them under content-hashed names, so the
+# web server can cache STATIC_ROOT forever and serve the .gz/.br copies
+STATICFILES_FINDERS = [
+    "django.contrib.staticfiles.finders.FileSystemFinder",
+    "django.contrib.staticfiles.finders.AppDirectoriesFinder",
+    "core.assets.BundleFinder",
+]
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "core.assets.AssetStorage"},
+}
+ASSETS = {
+    "BUILD_DIR": BASE_DIR / "build" / "assets",
+    "MINIFY": True,
+}
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 LOGIN_URL = '/signin/'
 LOGIN_REDIRECT_URL = '/dashboard/'
-LOGOUT_REDIRECT_URL = '/signin/'
\ No newline at end of file
+LOGOUT_REDIRECT_URL = '/signin/'
+
+# Prometheus scrape endpoint (/metrics); staff users can always read it
+METRICS_ALLOWED_IPS = ["127.0.0.1", "::1"]
+
+# per-request query budget reported by ServerTimingMiddleware; QUERY_BUDGETS
+# overrides it per route (e.g. {"api/orders/": 10}); None disables the check
+QUERY_BUDGET = 50
+QUERY_BUDGETS = {}
+# log a "core.timing" record with per-request timing fields
+SERVER_TIMING_LOG = False
+
+# statements slower than THRESHOLD_MS are appended (with EXPLAIN QUERY PLAN)
+# to a rotating JSONL file; summarise with `manage.py slow_queries`
+SLOW_QUERY_LOG = {
+    "ENABLED": False,
+    "THRESHOLD_MS": 100,
+    "PATH": BASE_DIR / "logs" / "slow_queries.jsonl",
+    "MAX_BYTES": 10 * 1024 * 1024,
+    "BACKUP_COUNT": 5,
+    "EXPLAIN": True,
+}
+
+# on-demand request profiling, saved under DIR and listed at /api/debug/profiles/
+PROFILER = {
+    "ENABLED": True,
+    "DIR": BASE_DIR / "logs" / "profiles",
+    "MAX_FILES": 50,
+    "TOKEN_MAX_AGE": 3600,
+    "BACKEND": "auto",
+}
+
+# record every request (bodies with passwords redacted) to a rotating JSONL
+# file that `manage.py replay_traffic` replays against a running server
+TRAFFIC_RECORDING = {
+    "ENABLED": False,
+    "PATH": BASE_DIR / "logs" / "traffic.jsonl",
+    "MAX_BYTES": 50 * 1024 * 1024,
+    "BACKUP_COUNT": 5,
+    "SKIP_PREFIXES": ["/static/", "/metrics", "/api/debug/"],
+}
+
+# demand forecasts behind /api/forecasts/, recomputed nightly by
+# `manage.py forecast_demand` (needs NumPy); see core/forecasting.py
+FORECASTING = {
+    "METHOD": "ema",
+    "WINDOW_DAYS": 28,
+    "ALPHA": 0.1,
+    "LEAD_TIME_DAYS": 7,
+    "REVIEW_DAYS": 14,
+    "SERVICE_LEVEL": 0.95,
+}
+
+# `manage.py backup_db` snapshots: copied PAGES pages at a time with
+# SLEEP_MS between steps, gzip-compressed, the newest KEEP kept. A copy that
+# writes restart more than MAX_RESTARTS times fails (outside WAL mode)
+BACKUPS = {
+    "DIR": BASE_DIR / "backups",
+    "PAGES": 256,
+    "SLEEP_MS": 50,
+    "MAX_RESTARTS": 5,
+    "KEEP": 7,
+    "COMPRESS": True,
+}
+
+# per-route token buckets ("N/period", refilled evenly over the period) per
+# authenticated user and per client IP; exceeding one answers 429 + Retry-After.
+# Off under DEBUG, so local benchmark and replay runs are not throttled
+RATE_LIMITS = {
+    "ENABLED": not DEBUG,
+    "CACHE": "ratelimit",
+    "ROUTES": {
+        "api/pharmacist/all-orders/": {"user": "30/min", "ip": "120/min"},
+        "api/debug/diagnostics/": {"user": "6/min", "ip": "6/min"},
+        "api/bootstrap/": {"user": "30/min", "ip": "120/min"},
+        "api/users/": {"user": "30/min", "ip": "120/min"},
+        "api/login/": {"ip": "20/min"},
+    },
+}
+
+# embed each dashboard's initial data in the page (cached per role and user,
+# invalidated on writes). The default cache is per process: use a shared
+# backend (e.g. Redis) under several workers so invalidation reaches them all
+DASHBOARD_SSR = False
+DASHBOARD_CACHE_TIMEOUT = 300
+
+# gzip (and brotli, when the `brotli` package is installed) for API JSON
+# responses of at least MIN_SIZE bytes, negotiated through Accept-Encoding
+RESPONSE_COMPRESSION = {
+    "ENABLED": True,
+    "MIN_SIZE": 1024,
+    "GZIP_LEVEL": 6,
+    "BROTLI_QUALITY": 5,
+    "PATH_PREFIXES": ["/api/"],
+}
@@ -1,10 +1,179 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db.models import Max
+from django.utils.functional import cached_property
+
 from .models import *
 
-admin.site.register(Profile)
-admin.site.register(Medicine)
-admin.site.register(Prescription)
-admin.site.register(Order)
-admin.site.register(OrderItem)
-admin.site.register(Wallet)
-admin.site.register(Transaction)
\ No newline at end of file
+
+# Orders, transactions and prescriptions grow without bound, so their
+# changelists avoid anything that scans the whole table: counts are capped,
+# foreign keys are fetched in the page query or edited by id, and searches
+# and filters only use indexed columns.
+
+# lists up to this many rows are counted exactly
+EXACT_COUNT_LIMIT = 10000
+
+
+class EstimatedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        # COUNT(*) over a LIMITed subquery stops after EXACT_COUNT_LIMIT + 1
+        # rows; past that an unfiltered list is estimated from the largest
+        # primary key, and a filtered one reports the cap
+        queryset = self.object_list.order_by()
+        capped = queryset[:EXACT_COUNT_LIMIT + 1].count()
+        if capped <= EXACT_COUNT_LIMIT or queryset.query.has_filters():
+            return capped
+        return max(capped, queryset.aggregate(n=Max("pk"))["n"] or 0)
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    # skips the second, unfiltered COUNT(*) behind "N total"
+    show_full_result_count = False
+    list_per_page = 50
+
+
+class DerivedTableAdmin(LargeTableAdmin):
+    # rows the ledger, shard, FEFO, summary and forecast code keep in step
+    # with each other: editing one here would silently desync them, so they
+    # are view-only (deleting stays possible for the cascade from a medicine)
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Profile)
+class ProfileAdmin(admin.ModelAdmin):
+    list_display = ("user", "role", "national_id", "practice_code")
+    list_select_related = ("user",)
+    list_filter = ("role",)
+    search_fields = ("user__username", "national_id")
+    raw_id_fields = ("user",)
+
+
+@admin.register(Medicine)
+class MedicineAdmin(admin.ModelAdmin):
+    list_display = ("name", "category", "price", "stock", "stock_shards", "batch_tracked", "expiry_date")
+    list_filter = ("batch_tracked",)
+    search_fields = ("name", "category")
+    # stock only changes through the API, which records it in the ledger
+    # and moves the shards and batches with it
+    readonly_fields = ("stock", "stock_shards", "batch_tracked")
+
+
+@admin.register(Prescription)
+class PrescriptionAdmin(LargeTableAdmin):
+    list_display = ("prescription_id", "doctor", "patient_national_id", "medicine", "quantity", "status", "created_at")
+    list_select_related = ("doctor", "medicine")
+    list_filter = ("status",)
+    search_fields = ("prescription_id__exact", "patient_national_id__exact")
+    raw_id_fields = ("doctor", "medicine")
+    date_hierarchy = "created_at"
+
+
+class OrderItemInline(admin.TabularInline):
+    model = OrderItem
+    raw_id_fields = ("medicine",)
+    extra = 0
+
+
+@admin.register(Order)
+class OrderAdmin(LargeTableAdmin):
+    list_display = ("order_id", "patient", "total_amount", "status", "branch", "created_at")
+    list_select_related = ("patient",)
+    list_filter = ("status",)
+    search_fields = ("order_id__exact",)
+    raw_id_fields = ("patient", "prescription")
+    date_hierarchy = "created_at"
+    inlines = [OrderItemInline]
+
+
+@admin.register(OrderItem)
+class OrderItemAdmin(LargeTableAdmin):
+    list_display = ("id", "order", "medicine", "quantity", "price_at_time")
+    # OrderItem.__str__ reads the medicine name
+    list_select_related = ("order", "medicine")
+    search_fields = ("order__order_id__exact",)
+    raw_id_fields = ("order", "medicine")
+
+
+@admin.register(Wallet)
+class WalletAdmin(admin.ModelAdmin):
+    list_display = ("user", "balance", "updated_at")
+    list_select_related = ("user",)
+    search_fields = ("user__username",)
+    raw_id_fields = ("user",)
+
+
+@admin.register(Transaction)
+class TransactionAdmin(LargeTableAdmin):
+    list_display = ("transaction_id", "wallet_user", "type", "amount", "status", "created_at")
+    list_select_related = ("wallet__user",)
+    list_filter = ("type",)
+    search_fields = ("transaction_id__exact",)
+    raw_id_fields = ("wallet",)
+    date_hierarchy = "created_at"
+
+    @admin.display(description="User", ordering="wallet__user__username")
+    def wallet_user(self, obj):
+        return obj.wallet.user.username
+
+
+@admin.register(StockMovement)
+class StockMovementAdmin(DerivedTableAdmin):
+    list_display = ("id", "medicine", "kind", "quantity", "reference_id", "user", "created_at")
+    list_select_related = ("medicine", "user")
+    raw_id_fields = ("medicine", "user")
+
+
+@admin.register(StockSnapshot)
+class StockSnapshotAdmin(DerivedTableAdmin):
+    list_display = ("id", "medicine", "stock", "last_movement_id", "taken_at")
+    list_select_related = ("medicine",)
+    raw_id_fields = ("medicine",)
+
+
+@admin.register(StockShard)
+class StockShardAdmin(DerivedTableAdmin):
+    list_display = ("id", "medicine", "shard", "quantity")
+    list_select_related = ("medicine",)
+    raw_id_fields = ("medicine",)
+
+
+@admin.register(MedicineBatch)
+class MedicineBatchAdmin(DerivedTableAdmin):
+    list_display = ("id", "medicine", "batch_number", "expiry_date", "quantity", "received_at")
+    list_select_related = ("medicine",)
+    search_fields = ("batch_number__exact",)
+    raw_id_fields = ("medicine",)
+
+
+@admin.register(BatchAllocation)
+class BatchAllocationAdmin(DerivedTableAdmin):
+    list_display = ("id", "order_item_id", "batch", "quantity")
+    list_select_related = ("batch",)
+    raw_id_fields = ("order_item", "batch")
+
+
+@admin.register(PatientSummary)
+class PatientSummaryAdmin(DerivedTableAdmin):
+    list_display = ("user", "total_orders", "pending_orders", "total_spent", "active_prescriptions", "rebuilt_at")
+    list_select_related = ("user",)
+    search_fields = ("user__username__exact",)
+    raw_id_fields = ("user",)
+
+
+@admin.register(DemandForecast)
+class DemandForecastAdmin(DerivedTableAdmin):
+    list_display = ("medicine", "method", "daily_demand", "reorder_point", "suggested_order", "stock", "computed_at")
+    list_select_related = ("medicine",)
+    raw_id_fields = ("medicine",)
+
+
+# BranchStock is not registered: its rows live in each branch's own
+# database (core.branches.BranchRouter) and the admin only reads "default";
+# /api/branches/<code>/stock/ and the stock report cover them
@@ -1,16 +1,24 @@
 import json
 import re
-from datetime import datetime, date
+import uuid
+from functools import cached_property, lru_cache
+from itertools import chain
+from datetime import datetime, date, timedelta
 from decimal import Decimal
 from django.db import models
+from django.db import transaction as db_transaction
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
-from django.forms.models import model_to_dict
-from django.http import JsonResponse
+from django.http import JsonResponse, FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.timezone import localtime
 from django.views.decorators.http import require_http_methods
 
-from .models import Order, Profile, Medicine, Prescription, OrderItem, Wallet, Transaction 
+from .models import DemandForecast, Order, Profile, Medicine, Prescription, OrderItem, Wallet, Transaction
+from . import branches, compression, dashboard_cache, diagnostics, exports, fefo, ledger, patient_summary, profiling, stock_shards
+from .timing import timed_json_response
+from .metrics import ORDERS_CREATED, CHECKOUT_FAILURES, WALLET_DEPOSITS, WALLET_DEPOSIT_AMOUNT
 
 # parsing js to py
 def _json(request):
@@ -23,13 +31,31 @@ def _json(request):
         return None
 
 
+_DASH_DATE_FORMATS = ("%Y-%m-%d",)
+_SLASH_DATE_FORMATS = ("%m/%d/%Y", "%d/%m/%Y")
+
+
 def _parse_date(v):
     if v is None:
         return None
     s = str(v).strip()
     if not s:
         return None
-    for fmt in ("%Y-%m-%d", "%m/%d/%Y", "%d/%m/%Y"):
+    # sniff the separator instead of trying every format; ISO dates (what the
+    # dashboards send) skip strptime entirely
+    if "-" in s:
+        if (len(s) == 10 and s.isascii() and s[4] == "-" and s[7] == "-"
+                and s[:4].isdigit() and s[5:7].isdigit() and s[8:].isdigit()):
+            try:
+                return date.fromisoformat(s)
+            except ValueError:
+                pass
+        formats = _DASH_DATE_FORMATS
+    elif "/" in s:
+        formats = _SLASH_DATE_FORMATS
+    else:
+        return None
+    for fmt in formats:
         try:
             return datetime.strptime(s, fmt).date()
         except ValueError:
@@ -37,6 +63,8 @@ def _parse_date(v):
     return None
 
 def _to_int(v, default=0):
+    if type(v) is int:
+        return v
     try:
         if v is None or str(v).strip() == "":
             return default
@@ -45,6 +73,13 @@ def _to_int(v, default=0):
         return default
 
 def _to_decimal(v, default=Decimal("0")):
+    if type(v) is str:
+        if not v.strip():
+            return default
+        try:
+            return Decimal(v)
+        except Exception:
+            return default
     try:
         if v is None or str(v).strip() == "":
             return default
@@ -127,6 +162,9 @@ def signup_api(request):
         national_id=national_id if role == "patient" else "",
         practice_code=practice_code if role in ["doctor", "pharmacist"] else "",
     )
+    if role == "patient":
+        # prescriptions may already be waiting for this national id
+        patient_summary.rebuild([user.pk])
 
     return JsonResponse({"ok": True}, status=201)
 
@@ -159,6 +197,21 @@ def logout_api(request):
     logout(request)
     return JsonResponse({"ok": True}, status=200)
 
+def _user_row(user):
+    profile = getattr(user, "profile", None)
+    return {
+        "id": user.id,
+        "username": user.username,
+        "email": user.email,
+        "first_name": user.first_name or user.username,
+        "date_joined": user.date_joined.isoformat() if user.date_joined else None,
+        "last_login": user.last_login.isoformat() if user.last_login else None,
+        "is_active": user.is_active,
+        "role": getattr(profile, "role", "patient") if profile else "patient",
+        "national_id": getattr(profile, "national_id", "") if profile else "",
+        "practice_code": getattr(profile, "practice_code", "") if profile else "",
+    }
+
 @require_http_methods(["GET"])
 @login_required
 def users_api(request):
@@ -168,41 +221,40 @@ def users_api(request):
     if role not in ["pharmacist", "admin"]:
         return JsonResponse({"error": "Forbidden: Only pharmacists can view users"}, status=403)
 
-    users = User.objects.all().order_by("date_joined")
-    
-    user_list = []
-    for user in users:
-        profile = getattr(user, "profile", None)
-        
-        user_data = {
-            "id": user.id,
-            "username": user.username,
-            "email": user.email,
-            "first_name": user.first_name or user.username,
-            "date_joined": user.date_joined.isoformat() if user.date_joined else None,
-            "last_login": user.last_login.isoformat() if user.last_login else None,
-            "is_active": user.is_active,
-            "role": getattr(profile, "role", "patient") if profile else "patient",
-            "national_id": getattr(profile, "national_id", "") if profile else "",
-            "practice_code": getattr(profile, "practice_code", "") if profile else "",
-        }
-        user_list.append(user_data)
+    users = User.objects.select_related("profile").order_by("date_joined")
+    
+    user_list = [_user_row(user) for user in users]
     
-    return JsonResponse(user_list, safe=False, status=200)
+    return compression.cacheable(timed_json_response(user_list, safe=False, status=200))
+
+@lru_cache(maxsize=None)
+def _dict_fields(model):
+    # the fields model_to_dict() would pick, looked up once per model
+    opts = model._meta
+    return tuple(
+        f for f in chain(opts.concrete_fields, opts.private_fields, opts.many_to_many)
+        if getattr(f, "editable", False)
+    )
+
+@lru_cache(maxsize=None)
+def _field_names(model):
+    return frozenset(f.name for f in model._meta.fields)
 
 def _medicine_to_json(m: Medicine):
-    d = model_to_dict(m)
-    for k, v in list(d.items()):
+    d = {}
+    for f in _dict_fields(m.__class__):
+        v = f.value_from_object(m)
         if isinstance(v, (datetime, date)):
-            d[k] = v.isoformat()
+            v = v.isoformat()
         elif isinstance(v, Decimal):
-            d[k] = float(v)
+            v = float(v)
+        d[f.name] = v
     if "id" not in d:
         d["id"] = m.id
     return d
 
 def _set_if_exists(obj, field_name, value):
-    if field_name in {f.name for f in obj.__class__._meta.fields}:
+    if field_name in _field_names(obj.__class__):
         setattr(obj, field_name, value)
         return True
     return False
@@ -212,8 +264,10 @@ def _set_if_exists(obj, field_name, value):
 def medicines_api(request):
     if request.method == "GET":
         print(f"User: {request.user}, Authenticated: {request.user.is_authenticated}")
-        meds = Medicine.objects.all().order_by("-id")
-        return JsonResponse([_medicine_to_json(m) for m in meds], safe=False, status=200)
+        meds = stock_shards.overlay(list(Medicine.objects.all().order_by("-id")))
+        return compression.cacheable(
+            timed_json_response([_medicine_to_json(m) for m in meds], safe=False, status=200)
+        )
 
     prof = getattr(request.user, "profile", None)
     role = getattr(prof, "role", "patient") if prof else "patient"
@@ -229,15 +283,17 @@ def medicines_api(request):
         return JsonResponse({"error": "Medicine name is required"}, status=400)
 
     try:
-        medicine = Medicine.objects.create(
-            name=name,
-            category=(data.get("category") or "").strip(),
-            batch_number=(data.get("batch_number") or data.get("batch") or "").strip(),
-            expiry_date=_parse_date(data.get("expiry_date") or data.get("expiry")),
-            price=_to_decimal(data.get("price"), Decimal("0")),
-            stock=_to_int(data.get("stock"), 0),
-            notes=(data.get("notes") or "").strip(),
-        )
+        with db_transaction.atomic():
+            medicine = Medicine.objects.create(
+                name=name,
+                category=(data.get("category") or "").strip(),
+                batch_number=(data.get("batch_number") or data.get("batch") or "").strip(),
+                expiry_date=_parse_date(data.get("expiry_date") or data.get("expiry")),
+                price=_to_decimal(data.get("price"), Decimal("0")),
+                stock=_to_int(data.get("stock"), 0),
+                notes=(data.get("notes") or "").strip(),
+            )
+            ledger.record(medicine.id, "receipt", medicine.stock, user=request.user, note="Initial stock")
         return JsonResponse(_medicine_to_json(medicine), status=201)
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=400)
@@ -264,26 +320,58 @@ def medicine_detail_api(request, pk):
         return JsonResponse({"error": "Invalid JSON"}, status=400)
 
     try:
+        changes = {}
         if "name" in data:
-            medicine.name = (data.get("name") or "").strip()
+            changes["name"] = (data.get("name") or "").strip()
         if "category" in data:
-            medicine.category = (data.get("category") or "").strip()
+            changes["category"] = (data.get("category") or "").strip()
         if "batch_number" in data or "batch" in data:
-            medicine.batch_number = (data.get("batch_number") or data.get("batch") or "").strip()
+            changes["batch_number"] = (data.get("batch_number") or data.get("batch") or "").strip()
         if "expiry_date" in data or "expiry" in data:
-            medicine.expiry_date = _parse_date(data.get("expiry_date") or data.get("expiry"))
+            changes["expiry_date"] = _parse_date(data.get("expiry_date") or data.get("expiry"))
         if "price" in data:
-            medicine.price = _to_decimal(data.get("price"), Decimal("0"))
+            changes["price"] = _to_decimal(data.get("price"), Decimal("0"))
         if "stock" in data:
-            medicine.stock = _to_int(data.get("stock"), 0)
+            changes["stock"] = _to_int(data.get("stock"), 0)
         if "notes" in data:
-            medicine.notes = (data.get("notes") or "").strip()
-        
-        medicine.save()
+            changes["notes"] = (data.get("notes") or "").strip()
+
+        with db_transaction.atomic():
+            # the stock is read under the row lock, so a checkout that lands
+            # while the request is parsed ends up in the delta instead of
+            # being overwritten; only the edited columns are written
+            medicine = Medicine.objects.select_for_update().get(pk=pk)
+            old_stock = medicine.stock = stock_shards.available(medicine)
+            for field, value in changes.items():
+                setattr(medicine, field, value)
+            medicine.save(update_fields=list(changes))
+            stock_shards.set_total(medicine, medicine.stock)
+            if medicine.batch_tracked and medicine.stock != old_stock:
+                fefo.adjust(medicine, medicine.stock - old_stock)
+            ledger.record(medicine.id, "adjustment", medicine.stock - old_stock, user=request.user,
+                          note="Stock set by pharmacist")
         return JsonResponse(_medicine_to_json(medicine), status=200)
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=400)
 
+def _prescription_row(p):
+    doctor = p.doctor
+    medicine = p.medicine
+    return {
+        "id": p.id,
+        "prescription_id": p.prescription_id,
+        "doctor_name": doctor.first_name or doctor.username,
+        "patient_national_id": p.patient_national_id,
+        "medicine_name": medicine.name,
+        "medicine_id": medicine.id,
+        "dosage": p.dosage,
+        "duration": p.duration,
+        "quantity": p.quantity,
+        "notes": p.notes,
+        "status": p.status,
+        "created_at": p.created_at.isoformat(),
+    }
+
 @require_http_methods(["GET", "POST"])
 @login_required
 def prescriptions_api(request):
@@ -300,24 +388,10 @@ def prescriptions_api(request):
             prescriptions = Prescription.objects.all().order_by("-created_at")
         else:
             prescriptions = Prescription.objects.none()
+        prescriptions = prescriptions.select_related("doctor", "medicine")
         
-        result = []
-        for p in prescriptions:
-            result.append({
-                "id": p.id,
-                "prescription_id": p.prescription_id,
-                "doctor_name": p.doctor.first_name or p.doctor.username,
-                "patient_national_id": p.patient_national_id,
-                "medicine_name": p.medicine.name,
-                "medicine_id": p.medicine.id,
-                "dosage": p.dosage,
-                "duration": p.duration,
-                "quantity": p.quantity,
-                "notes": p.notes,
-                "status": p.status,
-                "created_at": p.created_at.isoformat(),
-            })
-        return JsonResponse(result, safe=False, status=200)
+        result = [_prescription_row(p) for p in prescriptions]
+        return timed_json_response(result, safe=False, status=200)
     
     if role != "doctor":
         return JsonResponse({"error": "Only doctors can create prescriptions"}, status=403)
@@ -343,20 +417,24 @@ def prescriptions_api(request):
     except Medicine.DoesNotExist:
         return JsonResponse({"error": "Medicine not found"}, status=404)
     
-    if medicine.stock < quantity:
-        return JsonResponse({"error": f"Insufficient stock. Available: {medicine.stock}"}, status=400)
+    stock = stock_shards.available(medicine)
+    if stock < quantity:
+        return JsonResponse({"error": f"Insufficient stock. Available: {stock}"}, status=400)
     
     try:
-        prescription = Prescription.objects.create(
-            doctor=request.user,
-            patient_national_id=patient_national_id,
-            medicine=medicine,
-            dosage=dosage,
-            duration=duration,
-            quantity=quantity,
-            notes=notes,
-            status='active'
-        )
+        # the counters are updated below, not dropped by the save signal
+        with db_transaction.atomic(), patient_summary.maintained():
+            prescription = Prescription.objects.create(
+                doctor=request.user,
+                patient_national_id=patient_national_id,
+                medicine=medicine,
+                dosage=dosage,
+                duration=duration,
+                quantity=quantity,
+                notes=notes,
+                status='active'
+            )
+            patient_summary.add_for_national_id(patient_national_id, active_prescriptions=1)
         
         return JsonResponse({
             "ok": True,
@@ -381,6 +459,9 @@ def orders_api(request):
         orders = Order.objects.all().order_by("-created_at")
     else:
         orders = Order.objects.filter(patient=request.user).order_by("-created_at")
+    orders = orders.select_related(
+        "patient", "prescription__medicine", "prescription__doctor"
+    ).prefetch_related("items__medicine")
     
     response_data = []
     for order in orders:
@@ -436,7 +517,53 @@ def orders_api(request):
         response_data.append(order_data)
     
     print(f" Returning {len(response_data)} orders with prescription details")
-    return JsonResponse(response_data, safe=False, status=200)
+    return timed_json_response(response_data, safe=False, status=200)
+
+def _patient_history_orders(user):
+    return Order.objects.filter(
+        patient=user,
+        status='completed'
+    ).select_related("prescription__medicine", "prescription__doctor").order_by("-created_at")
+
+def _order_history_row(order):
+    order_data = {
+        "id": order.id,
+        "order_id": order.order_id,
+        "total_amount": float(order.total_amount),
+        "status": order.status,
+        "created_at": order.created_at.isoformat(),
+        "payment_status": "completed",
+    }
+    
+    prescription = order.prescription
+    if prescription:
+        medicine = prescription.medicine
+        doctor = prescription.doctor
+        order_data["prescription"] = {
+            "prescription_id": prescription.prescription_id,
+            "medicine": {
+                "name": medicine.name,
+                "category": medicine.category,
+                "price_per_unit": float(medicine.price),
+            },
+            "quantity": prescription.quantity,
+            "dosage": prescription.dosage or "Not specified",
+            "duration": prescription.duration or "Not specified",
+            "notes": prescription.notes or "",
+            "doctor": {
+                "name": doctor.first_name or doctor.username,
+                "email": doctor.email,
+            },
+            "total_price": float(medicine.price * prescription.quantity),
+        }
+        
+        order_data["order_details"] = {
+            "medicine_quantity": prescription.quantity,
+            "unit_price": float(medicine.price),
+            "total_paid": float(order.total_amount),
+            "order_date": order.created_at.strftime("%Y-%m-%d %H:%M") if order.created_at else "N/A",
+        }
+    return order_data
 
 @require_http_methods(["GET"])
 @login_required
@@ -449,52 +576,47 @@ def patient_order_history_api(request):
     except:
         return JsonResponse({"error": "Patient profile not found"}, status=403)
     
-    orders = Order.objects.filter(
-        patient=request.user,
-        status='completed'
-    ).order_by("-created_at")
+    orders = _patient_history_orders(request.user)
     
-    response_data = []
-    for order in orders:
-        order_data = {
-            "id": order.id,
-            "order_id": order.order_id,
-            "total_amount": float(order.total_amount),
-            "status": order.status,
-            "created_at": order.created_at.isoformat(),
-            "payment_status": "completed",
-        }
-        
-        if order.prescription:
-            order_data["prescription"] = {
-                "prescription_id": order.prescription.prescription_id,
-                "medicine": {
-                    "name": order.prescription.medicine.name,
-                    "category": order.prescription.medicine.category,
-                    "price_per_unit": float(order.prescription.medicine.price),
-                },
-                "quantity": order.prescription.quantity,
-                "dosage": order.prescription.dosage or "Not specified",
-                "duration": order.prescription.duration or "Not specified",
-                "notes": order.prescription.notes or "",
-                "doctor": {
-                    "name": order.prescription.doctor.first_name or order.prescription.doctor.username,
-                    "email": order.prescription.doctor.email,
-                },
-                "total_price": float(order.prescription.medicine.price * order.prescription.quantity),
-            }
-            
-            order_data["order_details"] = {
-                "medicine_quantity": order.prescription.quantity,
-                "unit_price": float(order.prescription.medicine.price),
-                "total_paid": float(order.total_amount),
-                "order_date": order.created_at.strftime("%Y-%m-%d %H:%M") if order.created_at else "N/A",
-            }
-        
-        response_data.append(order_data)
+    response_data = [_order_history_row(order) for order in orders]
     
     print(f" Returning {len(response_data)} completed orders for patient")
-    return JsonResponse(response_data, safe=False, status=200)
+    return timed_json_response(response_data, safe=False, status=200)
+
+def _pharmacist_order_row(order, role):
+    patient = order.patient
+    prescription = order.prescription
+    order_data = {
+        "id": order.id,
+        "order_id": order.order_id,
+        "patient_id": patient.id if patient else None,
+        "patient_name": patient.first_name or patient.username if patient else "Unknown",
+        "patient_email": patient.email if patient else None,
+        "total_amount": float(order.total_amount) if order.total_amount else 0.0,
+        "status": order.status,
+        "created_at": order.created_at.isoformat() if order.created_at else None,
+        "updated_at": order.updated_at.isoformat() if order.updated_at else None,
+        "debug_info": {
+            "api": "pharmacist_all_orders",
+            "user_role": role,
+            "has_prescription": prescription is not None
+        }
+    }
+    
+    if prescription:
+        medicine = prescription.medicine
+        doctor = prescription.doctor
+        order_data["prescription"] = {
+            "prescription_id": prescription.prescription_id,
+            "medicine_name": medicine.name,
+            "quantity": prescription.quantity,
+            "doctor_name": doctor.first_name or doctor.username,
+        }
+        order_data["medicine_info"] = {
+            "name": medicine.name,
+            "category": medicine.category,
+        }
+    return order_data
 
 @require_http_methods(["GET"])
 @login_required
@@ -512,7 +634,9 @@ def pharmacist_all_orders_api(request):
         print(f" No profile found")
     
     from .models import Order
-    orders = Order.objects.all().order_by('-created_at')
+    orders = Order.objects.select_related(
+        "patient", "prescription__medicine", "prescription__doctor"
+    ).order_by('-created_at')
     
     print(f" Total orders in database: {orders.count()}")
     
@@ -520,43 +644,12 @@ def pharmacist_all_orders_api(request):
         patient_name = order.patient.username if order.patient else "None"
         print(f" Order {i+1}: ID={order.id}, OrderID={order.order_id}, Patient={patient_name}, Status={order.status}, Total=${order.total_amount}")
     
-    response_data = []
-    for order in orders:
-        order_data = {
-            "id": order.id,
-            "order_id": order.order_id,
-            "patient_id": order.patient.id if order.patient else None,
-            "patient_name": order.patient.first_name or order.patient.username if order.patient else "Unknown",
-            "patient_email": order.patient.email if order.patient else None,
-            "total_amount": float(order.total_amount) if order.total_amount else 0.0,
-            "status": order.status,
-            "created_at": order.created_at.isoformat() if order.created_at else None,
-            "updated_at": order.updated_at.isoformat() if order.updated_at else None,
-            "debug_info": {
-                "api": "pharmacist_all_orders",
-                "user_role": role,
-                "has_prescription": order.prescription is not None
-            }
-        }
-        
-        if order.prescription:
-            order_data["prescription"] = {
-                "prescription_id": order.prescription.prescription_id,
-                "medicine_name": order.prescription.medicine.name,
-                "quantity": order.prescription.quantity,
-                "doctor_name": order.prescription.doctor.first_name or order.prescription.doctor.username,
-            }
-            order_data["medicine_info"] = {
-                "name": order.prescription.medicine.name,
-                "category": order.prescription.medicine.category,
-            }
-        
-        response_data.append(order_data)
+    response_data = [_pharmacist_order_row(order, role) for order in orders]
     
     print(f" Returning {len(response_data)} orders")
     print("=" * 60)
     
-    return JsonResponse(response_data, safe=False, status=200)
+    return compression.cacheable(timed_json_response(response_data, safe=False, status=200))
 
 @require_http_methods(["GET"])
 @login_required
@@ -598,6 +691,24 @@ def wallet_balance_api(request):
             "error": "Wallet not initialized"
         }, status=200)
         
+def _transaction_row(txn):
+    created_at_str = ""
+    if txn.created_at:
+        created_at_str = localtime(txn.created_at).strftime("%Y-%m-%d %H:%M")
+    return {
+        "id": txn.id,
+        "transaction_id": txn.transaction_id,
+        "type": txn.type,
+        "amount": float(txn.amount),
+        "description": txn.description,
+        "reference_id": txn.reference_id,
+        "status": txn.status,
+        "created_at": txn.created_at.isoformat() if txn.created_at else None,
+        "created_at_display": created_at_str,
+        "metadata": txn.metadata,
+        "icon": "" if txn.type == 'deposit' else "" if txn.type == 'withdrawal' else ""
+    }
+
 @require_http_methods(["GET"])
 @login_required
 def wallet_transactions_api(request):
@@ -623,30 +734,10 @@ def wallet_transactions_api(request):
             )
             transactions = Transaction.objects.filter(wallet=wallet).order_by('-created_at')
         
-        transactions_list = []
-        for txn in transactions:
-            created_at_str = ""
-            if txn.created_at:
-                from django.utils.timezone import localtime
-                local_created = localtime(txn.created_at)
-                created_at_str = local_created.strftime("%Y-%m-%d %H:%M")
-            
-            transactions_list.append({
-                "id": txn.id,
-                "transaction_id": txn.transaction_id,
-                "type": txn.type,
-                "amount": float(txn.amount),
-                "description": txn.description,
-                "reference_id": txn.reference_id,
-                "status": txn.status,
-                "created_at": txn.created_at.isoformat() if txn.created_at else None,
-                "created_at_display": created_at_str,
-                "metadata": txn.metadata,
-                "icon": "" if txn.type == 'deposit' else "" if txn.type == 'withdrawal' else ""
-            })
+        transactions_list = [_transaction_row(txn) for txn in transactions]
         
         print(f"DEBUG: Returning {len(transactions_list)} transactions")
-        return JsonResponse(transactions_list, safe=False, status=200)
+        return timed_json_response(transactions_list, safe=False, status=200)
         
     except Exception as e:
         print(f"DEBUG: Wallet transactions error: {e}")
@@ -691,6 +782,8 @@ def wallet_deposit_api(request):
         wallet.save()
         
         print(f"DEBUG: Wallet balance updated to: {wallet.balance}")
+        WALLET_DEPOSITS.inc()
+        WALLET_DEPOSIT_AMOUNT.inc(float(amount))
         
         return JsonResponse({
             "ok": True,
@@ -705,6 +798,41 @@ def wallet_deposit_api(request):
         return JsonResponse({"error": str(e)}, status=400)
 
     
+def _active_patient_prescriptions(national_id):
+    return Prescription.objects.filter(
+        patient_national_id=national_id,
+        status='active'
+    ).select_related("doctor", "medicine").order_by('-created_at')
+
+def _with_current_stock(prescriptions):
+    prescriptions = list(prescriptions)
+    stock_shards.overlay([p.medicine for p in prescriptions])
+    return prescriptions
+
+def _patient_prescription_row(p):
+    medicine = p.medicine
+    doctor = p.doctor
+    medicine_price = medicine.price if medicine.price else Decimal('0.00')
+    total_price = medicine_price * p.quantity
+    return {
+        "id": p.id,
+        "prescription_id": p.prescription_id,
+        "doctor_name": doctor.first_name or doctor.username,
+        "medicine_id": medicine.id,
+        "medicine_name": medicine.name,
+        "dosage": p.dosage,
+        "duration": p.duration,
+        "quantity": p.quantity,
+        "notes": p.notes,
+        "status": p.status,
+        "created_at": p.created_at.isoformat() if p.created_at else None,
+        "price": float(medicine_price),
+        "total_price": float(total_price),
+        "medicine_category": medicine.category,
+        "medicine_stock": medicine.stock,
+        "can_order": medicine.stock >= p.quantity
+    }
+
 @require_http_methods(["GET"])
 @login_required
 def patient_prescriptions_api(request):
@@ -717,41 +845,9 @@ def patient_prescriptions_api(request):
     if not national_id:
         return JsonResponse({"error": "Patient national ID not found"}, status=400)
 
-    print(f"DEBUG: Looking for prescriptions for national_id: {national_id}")
-    
-    prescriptions = Prescription.objects.filter(
-        patient_national_id=national_id,
-        status='active'
-    ).order_by('-created_at')
-    
-    print(f"DEBUG: Found {prescriptions.count()} active prescriptions")
-    
-    result = []
-    for p in prescriptions:
-        medicine_price = p.medicine.price if p.medicine.price else Decimal('0.00')
-        total_price = medicine_price * p.quantity
-        
-        result.append({
-            "id": p.id,
-            "prescription_id": p.prescription_id,
-            "doctor_name": p.doctor.first_name or p.doctor.username,
-            "medicine_id": p.medicine.id,
-            "medicine_name": p.medicine.name,
-            "dosage": p.dosage,
-            "duration": p.duration,
-            "quantity": p.quantity,
-            "notes": p.notes,
-            "status": p.status,
-            "created_at": p.created_at.isoformat() if p.created_at else None,
-            "price": float(medicine_price),
-            "total_price": float(total_price),
-            "medicine_category": p.medicine.category,
-            "medicine_stock": p.medicine.stock,
-            "can_order": p.medicine.stock >= p.quantity
-        })
-    
-    print(f"DEBUG: Returning {len(result)} prescriptions")
-    return JsonResponse(result, safe=False, status=200)
+    prescriptions = _with_current_stock(_active_patient_prescriptions(national_id))
+    result = [_patient_prescription_row(p) for p in prescriptions]
+    return timed_json_response(result, safe=False, status=200)
 
 @require_http_methods(["POST"])
 @login_required
@@ -759,38 +855,44 @@ def create_order_api(request):
     prof = getattr(request.user, "profile", None)
     
     if not prof or prof.role != 'patient':
+        CHECKOUT_FAILURES.inc(reason="forbidden")
         return JsonResponse({"error": "Only patients can create orders"}, status=403)
     
     data = _json(request)
     if data is None:
+        CHECKOUT_FAILURES.inc(reason="invalid_json")
         return JsonResponse({"error": "Invalid JSON"}, status=400)
     
     prescription_id = data.get("prescription_id")
     
     if not prescription_id:
+        CHECKOUT_FAILURES.inc(reason="missing_prescription")
         return JsonResponse({"error": "Prescription ID is required"}, status=400)
-    
-    print(f" DEBUG: Creating order for prescription: {prescription_id}, user: {request.user.username}")
+
+    # optional: fill the order from this branch's inventory as well
+    branch = (data.get("branch") or "").strip()
+    if branch and branch not in branches.get_config():
+        CHECKOUT_FAILURES.inc(reason="unknown_branch")
+        return JsonResponse({"error": f"Unknown branch: {branch}"}, status=400)
     
     try:
-        prescription = Prescription.objects.get(
+        prescription = Prescription.objects.select_related("medicine").get(
             prescription_id=prescription_id,
             patient_national_id=prof.national_id,
             status='active'
         )
         
-        print(f" DEBUG: Found prescription ID: {prescription.id}, Medicine: {prescription.medicine.name}")
-        
-        if prescription.medicine.stock < prescription.quantity:
-            return JsonResponse({"error": f"Insufficient stock. Available: {prescription.medicine.stock}"}, status=400)
+        stock = stock_shards.available(prescription.medicine)
+        if stock < prescription.quantity:
+            CHECKOUT_FAILURES.inc(reason="insufficient_stock")
+            return JsonResponse({"error": f"Insufficient stock. Available: {stock}"}, status=400)
         
         total_amount = prescription.medicine.price * prescription.quantity
-        print(f" DEBUG: Total amount: {total_amount}, Quantity: {prescription.quantity}, Price per unit: {prescription.medicine.price}")
         
         wallet, created = Wallet.objects.get_or_create(user=request.user)
-        print(f" DEBUG: Wallet balance: {wallet.balance}, required: {total_amount}")
         
         if wallet.balance < total_amount:
+            CHECKOUT_FAILURES.inc(reason="insufficient_balance")
             return JsonResponse({
                 "error": "Insufficient wallet balance",
                 "required": float(total_amount),
@@ -798,13 +900,9 @@ def create_order_api(request):
                 "shortage": float(total_amount - wallet.balance)
             }, status=400)
         
-        from django.db import transaction as db_transaction
-        
-        with db_transaction.atomic():
-            old_balance = wallet.balance
+        with branches.atomic(branch), db_transaction.atomic(), patient_summary.maintained():
             wallet.balance -= total_amount
             wallet.save()
-            print(f" DEBUG: Wallet updated. Old: {old_balance}, New: {wallet.balance}")
             
             txn = Transaction.objects.create(
                 wallet=wallet,
@@ -821,43 +919,44 @@ def create_order_api(request):
                     "patient_id": request.user.id
                 }
             )
-            print(f" DEBUG: Transaction created: {txn.transaction_id}, Amount: {txn.amount}")
             
             order = Order.objects.create(
                 patient=request.user,
                 prescription=prescription, 
                 total_amount=total_amount,
-                status='completed'
+                status='completed',
+                branch=branch
             )
             order.save()
-            print(f" DEBUG: Order created! Order ID: {order.order_id}, Status: {order.status}")
-            print(f" DEBUG: Order patient: {order.patient.username}, Prescription: {order.prescription.prescription_id if order.prescription else 'None'}")
             
-            OrderItem.objects.create(
+            item = OrderItem.objects.create(
                 order=order,
                 medicine=prescription.medicine,
                 quantity=prescription.quantity,
                 price_at_time=prescription.medicine.price
             )
-            print(f" DEBUG: Order item created: {prescription.medicine.name} x {prescription.quantity}")
             
-            old_stock = prescription.medicine.stock
-            prescription.medicine.stock -= prescription.quantity
-            prescription.medicine.save()
-            print(f" DEBUG: Medicine stock updated: {prescription.medicine.name}, Old: {old_stock}, New: {prescription.medicine.stock}")
+            # conditional update (or a shard of a hot medicine), so two
+            # concurrent checkouts can never oversell
+            stock_shards.take(prescription.medicine, prescription.quantity)
+            if branch:
+                branches.take(branch, prescription.medicine.id, prescription.quantity)
+            if prescription.medicine.batch_tracked:
+                fefo.allocate(item, prescription.quantity)
+            ledger.record(prescription.medicine.id, "sale", -prescription.quantity,
+                          reference_id=order.order_id, user=request.user)
             
             prescription.status = 'filled'
             prescription.save()
-            print(f" DEBUG: Prescription status updated: {prescription.prescription_id} -> {prescription.status}")
+            # the prescription is this patient's, so one row takes both changes
+            patient_summary.add(request.user.id, active_prescriptions=-1,
+                                **patient_summary.order_deltas(None, order.status, total_amount))
             
-            print(f" DEBUG: ORDER COMPLETED SUCCESSFULLY!")
-            print(f" DEBUG: Order ID: {order.order_id}")
-            print(f" DEBUG: Patient: {request.user.username}")
-            print(f" DEBUG: Medicine: {prescription.medicine.name}")
-            print(f" DEBUG: Total: ${total_amount}")
-        
+        # the stock update above bypasses save(), so no signal fires for it
+        dashboard_cache.invalidate(roles=dashboard_cache.ROLES)
         order.refresh_from_db()
         prescription.refresh_from_db()
+        ORDERS_CREATED.inc()
         
         return JsonResponse({
             "ok": True,
@@ -872,11 +971,16 @@ def create_order_api(request):
             "transaction_id": txn.transaction_id
         }, status=201)
         
+    except stock_shards.InsufficientStock as e:
+        CHECKOUT_FAILURES.inc(reason="insufficient_stock")
+        return JsonResponse({"error": str(e)}, status=400)
     except Prescription.DoesNotExist:
         print(f" DEBUG: Prescription {prescription_id} not found for patient {prof.national_id}")
+        CHECKOUT_FAILURES.inc(reason="prescription_not_found")
         return JsonResponse({"error": "Prescription not found or not accessible"}, status=404)
     except Exception as e:
         import traceback
+        CHECKOUT_FAILURES.inc(reason="error")
         print(f" DEBUG: Error creating order: {str(e)}")
         print(" DEBUG: Traceback:")
         print(traceback.format_exc())
@@ -893,24 +997,11 @@ def patient_stats_api(request):
     try:
         wallet, created = Wallet.objects.get_or_create(user=request.user)
         
-        active_prescriptions = Prescription.objects.filter(
-            patient_national_id=prof.national_id,
-            status='active'
-        ).count()
-        
-        total_orders = Order.objects.filter(patient=request.user).count()
-        
-        pending_orders = Order.objects.filter(
-            patient=request.user,
-            status__in=['pending', 'processing']
-        ).count()
-        
-        from django.db.models import Sum
-        total_spent_result = Order.objects.filter(
-            patient=request.user,
-            status='completed'
-        ).aggregate(total=Sum('total_amount'))
-        total_spent = total_spent_result['total'] or Decimal('0.00')
+        summary = patient_summary.get(request.user)
+        active_prescriptions = summary.active_prescriptions
+        total_orders = summary.total_orders
+        pending_orders = summary.pending_orders
+        total_spent = summary.total_spent
         
         print(f"DEBUG STATS for {request.user.username}:")
         print(f"  - Wallet: ${wallet.balance}")
@@ -934,56 +1025,567 @@ def patient_stats_api(request):
     
     
 @require_http_methods(["GET"])
-def debug_simple_orders(request):
-    print("=" * 50)
-    print(" DEBUG SIMPLE ORDERS API CALLED")
-    
-    print(f" User: {request.user}, Authenticated: {request.user.is_authenticated}")
-    print(f" User ID: {request.user.id if request.user.is_authenticated else 'Not authenticated'}")
-    
-    from django.db import connection
-    with connection.cursor() as cursor:
-        cursor.execute("SELECT COUNT(*) FROM core_order")
-        total_orders = cursor.fetchone()[0]
-        print(f" Total orders in database: {total_orders}")
-        
-        cursor.execute("""
-            SELECT o.id, o.order_id, o.patient_id, o.total_amount, o.status, 
-                   u.username as patient_name
-            FROM core_order o
-            LEFT JOIN auth_user u ON o.patient_id = u.id
-            ORDER BY o.created_at DESC
-        """)
-        all_orders = cursor.fetchall()
-        
-        print("All orders in database:")
-        for order in all_orders:
-            print(f"  - ID: {order[0]}, OrderID: {order[1]}, PatientID: {order[2]}, Patient: {order[5]}, Total: {order[3]}, Status: {order[4]}")
-    
-    from .models import Order
-    orders = Order.objects.all()
-    
-    response_data = []
-    for order in orders:
-        item = {
-            "id": order.id,
-            "order_id": order.order_id,
-            "patient_id": order.patient.id if order.patient else None,
-            "patient_name": order.patient.username if order.patient else "Unknown",
-            "total_amount": float(order.total_amount),
-            "status": order.status,
-            "created_at": order.created_at.isoformat() if order.created_at else None,
-        }
-        response_data.append(item)
-    
-    print(f"DEBUG: Returning {len(response_data)} orders")
-    print("=" * 50)
-    
+@login_required
+def diagnostics_api(request):
+    if not request.user.is_staff:
+        return JsonResponse({"error": "Forbidden: staff only"}, status=403)
+
+    config = diagnostics.get_config()
+    limit = max(1, min(_to_int(request.GET.get("slow"), config["SLOW_QUERIES"]), config["MAX_SLOW_QUERIES"]))
+    return JsonResponse(diagnostics.report(slow_limit=limit, config=config), status=200)
+
+BULK_STATUS_MAX_ORDERS = 1000
+
+def _new_transaction_id():
+    # same format as Transaction.save, needed because bulk_create skips save()
+    return f"TXN-{uuid.uuid4().hex[:10].upper()}"
+
+def _refund_and_restock(orders, user=None):
+    refunds = {}
+    for o in orders:
+        if o["total_amount"] and o["total_amount"] > 0:
+            refunds[o["patient_id"]] = refunds.get(o["patient_id"], Decimal("0")) + o["total_amount"]
+
+    if refunds:
+        existing = set(Wallet.objects.filter(user_id__in=refunds).values_list("user_id", flat=True))
+        Wallet.objects.bulk_create([Wallet(user_id=uid) for uid in refunds if uid not in existing])
+
+        Wallet.objects.filter(user_id__in=refunds).update(
+            balance=models.Case(
+                *[models.When(user_id=uid, then=models.F("balance") + amount) for uid, amount in refunds.items()],
+                default=models.F("balance"),
+                output_field=models.DecimalField(max_digits=10, decimal_places=2),
+            ),
+            updated_at=timezone.now(),
+        )
+
+        wallet_ids = dict(Wallet.objects.filter(user_id__in=refunds).values_list("user_id", "id"))
+        Transaction.objects.bulk_create([
+            Transaction(
+                wallet_id=wallet_ids[o["patient_id"]],
+                transaction_id=_new_transaction_id(),
+                type='refund',
+                amount=o["total_amount"],
+                description=f"Refund for cancelled order {o['order_id']}",
+                reference_id=o["order_id"],
+                status='completed',
+                metadata={"order_id": o["order_id"], "reason": "cancelled"},
+            )
+            for o in orders if o["patient_id"] in refunds and o["total_amount"] > 0
+        ], batch_size=500)
+
+    order_refs = {o["id"]: o["order_id"] for o in orders}
+    items = list(
+        OrderItem.objects.filter(order_id__in=order_refs).values_list("id", "order_id", "medicine_id", "quantity")
+    )
+    fefo.release([item_id for item_id, _, _, _ in items])
+    order_branches = {o["id"]: o["branch"] for o in orders if o.get("branch")}
+    restock = {}
+    branch_restock = {}
+    for _, order_id, medicine_id, qty in items:
+        restock[medicine_id] = restock.get(medicine_id, 0) + qty
+        if order_id in order_branches:
+            per_branch = branch_restock.setdefault(order_branches[order_id], {})
+            per_branch[medicine_id] = per_branch.get(medicine_id, 0) + qty
+    for branch, quantities in branch_restock.items():
+        if branches.alias_for(branch):
+            branches.put_back(branch, quantities)
+    if restock:
+        stock_shards.put_back(restock)
+        ledger.record_many(
+            [(medicine_id, "return", qty, order_refs[order_id]) for _, order_id, medicine_id, qty in items], user=user,
+        )
+
+    return {"refunded": sum(refunds.values(), Decimal("0")), "restocked": restock}
+
+@require_http_methods(["POST"])
+@login_required
+def bulk_order_status_api(request):
+    if not _is_pharmacist(request.user):
+        return JsonResponse({"error": "Forbidden: Only pharmacists can update orders"}, status=403)
+
+    data = _json(request)
+    if data is None:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+
+    target = (data.get("status") or "").strip().lower()
+    if target not in dict(Order.ORDER_STATUS):
+        return JsonResponse({"error": f"Invalid status: {target or 'missing'}"}, status=400)
+
+    order_ids = data.get("order_ids")
+    if not isinstance(order_ids, list) or not order_ids:
+        return JsonResponse({"error": "order_ids must be a non-empty list"}, status=400)
+
+    order_ids = list(dict.fromkeys(str(o).strip() for o in order_ids if str(o).strip()))
+    if len(order_ids) > BULK_STATUS_MAX_ORDERS:
+        return JsonResponse({"error": f"At most {BULK_STATUS_MAX_ORDERS} orders per request"}, status=400)
+
+    skipped = []
+    updated = {}
+    summary = {"refunded": Decimal("0"), "restocked": {}}
+
+    with db_transaction.atomic():
+        rows = list(
+            Order.objects.select_for_update()
+            .filter(order_id__in=order_ids)
+            .values("id", "order_id", "patient_id", "total_amount", "status", "branch")
+        )
+        found = {r["order_id"] for r in rows}
+        not_found = [o for o in order_ids if o not in found]
+
+        groups = {}
+        for r in rows:
+            if target in Order.ORDER_TRANSITIONS.get(r["status"], []):
+                groups.setdefault(r["status"], []).append(r)
+            else:
+                skipped.append({
+                    "order_id": r["order_id"],
+                    "status": r["status"],
+                    "reason": f"Cannot move order from {r['status']} to {target}",
+                })
+
+        now = timezone.now()
+        moved = []
+        for current, group in groups.items():
+            count = Order.objects.filter(id__in=[r["id"] for r in group], status=current).update(
+                status=target, updated_at=now
+            )
+            if count < len(group):
+                # some rows changed status after they were read; only the
+                # ones this update touched carry its timestamp
+                touched = set(
+                    Order.objects.filter(id__in=[r["id"] for r in group], status=target, updated_at=now)
+                    .values_list("id", flat=True)
+                )
+                group = [r for r in group if r["id"] in touched]
+            updated[current] = count
+            moved.extend(group)
+
+        deltas = {}
+        for r in moved:
+            patient = deltas.setdefault(r["patient_id"], {})
+            for field, delta in patient_summary.order_deltas(r["status"], target, r["total_amount"]).items():
+                patient[field] = patient.get(field, 0) + delta
+        patient_summary.add_many(deltas)
+
+        if target == 'cancelled' and moved:
+            summary = _refund_and_restock(moved, request.user)
+        if moved:
+            # update() and bulk_create() skip the signals that normally
+            # invalidate cached dashboards; restocking touches medicines
+            dashboard_cache.invalidate(
+                roles=dashboard_cache.ROLES if target == 'cancelled' else ("pharmacist",),
+                user_ids={r["patient_id"] for r in moved},
+            )
+
     return JsonResponse({
-        "test": "success",
-        "total_orders_in_db": total_orders,
-        "orders_returned": len(response_data),
-        "current_user_id": request.user.id if request.user.is_authenticated else None,
-        "current_user_name": request.user.username if request.user.is_authenticated else None,
-        "orders": response_data
-    }, status=200)
\ No newline at end of file
+        "ok": True,
+        "status": target,
+        "updated": sum(updated.values()),
+        "updated_by_status": updated,
+        "updated_order_ids": [r["order_id"] for r in moved],
+        "skipped": skipped,
+        "not_found": not_found,
+        "refunded_total": float(summary["refunded"]),
+        "restocked_medicines": len(summary["restocked"]),
+    }, status=200)
+
+@require_http_methods(["GET"])
+@login_required
+def profiles_api(request):
+    if not request.user.is_staff:
+        return JsonResponse({"error": "Forbidden: staff only"}, status=403)
+
+    limit = max(1, min(_to_int(request.GET.get("limit"), 50), 500))
+    return JsonResponse(profiling.list_profiles(profiling.get_config(), limit=limit), safe=False, status=200)
+
+@require_http_methods(["GET"])
+@login_required
+def profile_download_api(request, name):
+    if not request.user.is_staff:
+        return JsonResponse({"error": "Forbidden: staff only"}, status=403)
+
+    path = profiling.profile_path(profiling.get_config(), name)
+    if path is None:
+        return JsonResponse({"error": "Profile not found"}, status=404)
+    return FileResponse(open(path, "rb"), as_attachment=True, filename=name)
+
+class _BootstrapContext:
+    # lookups shared between dashboard sections, each done at most once
+    def __init__(self, user, profile):
+        self.user = user
+        self.profile = profile
+
+    @cached_property
+    def wallet(self):
+        return Wallet.objects.filter(user=self.user).first()
+
+    @cached_property
+    def active_prescriptions(self):
+        return _with_current_stock(_active_patient_prescriptions(self.profile.national_id))
+
+    @cached_property
+    def medicines(self):
+        return stock_shards.overlay(list(Medicine.objects.all().order_by("-id")))
+
+def _bootstrap_wallet(ctx):
+    balance = ctx.wallet.balance if ctx.wallet else Decimal("0.00")
+    return {"balance": float(balance), "currency": "USD"}
+
+def _bootstrap_patient_prescriptions(ctx):
+    return [_patient_prescription_row(p) for p in ctx.active_prescriptions]
+
+def _bootstrap_patient_stats(ctx):
+    summary = patient_summary.get(ctx.user)
+    balance = ctx.wallet.balance if ctx.wallet else Decimal("0.00")
+    return {
+        "wallet_balance": float(balance),
+        "active_prescriptions": summary.active_prescriptions,
+        "total_orders": summary.total_orders,
+        "pending_orders": summary.pending_orders,
+        "total_spent": float(summary.total_spent),
+        "currency": "USD",
+    }
+
+def _bootstrap_order_history(ctx):
+    return [_order_history_row(o) for o in _patient_history_orders(ctx.user)]
+
+def _bootstrap_transactions(ctx):
+    if ctx.wallet is None:
+        return []
+    transactions = Transaction.objects.filter(wallet=ctx.wallet).order_by('-created_at')[:50]
+    return [_transaction_row(txn) for txn in transactions]
+
+def _bootstrap_all_orders(ctx):
+    orders = Order.objects.select_related(
+        "patient", "prescription__medicine", "prescription__doctor"
+    ).order_by('-created_at')
+    return [_pharmacist_order_row(o, ctx.profile.role) for o in orders]
+
+def _bootstrap_medicines(ctx):
+    return [_medicine_to_json(m) for m in ctx.medicines]
+
+def _bootstrap_users(ctx):
+    return [_user_row(u) for u in User.objects.select_related("profile").order_by("date_joined")]
+
+def _bootstrap_doctor_prescriptions(ctx):
+    prescriptions = Prescription.objects.filter(doctor=ctx.user).select_related(
+        "doctor", "medicine"
+    ).order_by("-created_at")
+    return [_prescription_row(p) for p in prescriptions]
+
+# sections each dashboard can request from /api/bootstrap/; every section
+# has the same payload as the endpoint the dashboard used to call for it
+BOOTSTRAP_SECTIONS = {
+    "patient": {
+        "prescriptions": _bootstrap_patient_prescriptions,
+        "wallet": _bootstrap_wallet,
+        "stats": _bootstrap_patient_stats,
+        "order_history": _bootstrap_order_history,
+        "transactions": _bootstrap_transactions,
+    },
+    "pharmacist": {
+        "orders": _bootstrap_all_orders,
+        "medicines": _bootstrap_medicines,
+        "users": _bootstrap_users,
+    },
+    "doctor": {
+        "medicines": _bootstrap_medicines,
+        "prescriptions": _bootstrap_doctor_prescriptions,
+    },
+}
+BOOTSTRAP_SECTIONS["admin"] = BOOTSTRAP_SECTIONS["pharmacist"]
+
+@require_http_methods(["GET"])
+@login_required
+def bootstrap_api(request):
+    prof = getattr(request.user, "profile", None)
+    role = getattr(prof, "role", None) if prof else None
+    sections = BOOTSTRAP_SECTIONS.get(role)
+    if sections is None:
+        return JsonResponse({"error": "No dashboard for this account"}, status=403)
+
+    fields = [f.strip() for f in request.GET.get("fields", "").split(",") if f.strip()]
+    unknown = [f for f in fields if f not in sections]
+    if unknown:
+        return JsonResponse({
+            "error": f"Unknown fields: {', '.join(unknown)}",
+            "available": list(sections),
+        }, status=400)
+    return timed_json_response(dashboard_data(request.user, prof, fields), status=200)
+
+
+def dashboard_data(user, prof, fields=None):
+    role = prof.role
+    sections = BOOTSTRAP_SECTIONS[role]
+    wanted = [name for name in sections if not fields or name in fields]
+
+    ctx = _BootstrapContext(user, prof)
+    # one transaction, so every section is read from the same snapshot
+    with db_transaction.atomic():
+        data = {name: sections[name](ctx) for name in wanted}
+    return {"role": role, "user": _user_payload(user), **data}
+
+
+def _end_of_day(d):
+    return timezone.make_aware(datetime.combine(d, datetime.max.time()))
+
+
+def _stock_report_params(request):
+    # (medicine ids or None, error response or None)
+    raw = request.GET.get("medicine_id")
+    if not raw:
+        return None, None
+    ids = [_to_int(v, None) for v in raw.split(",")]
+    if None in ids:
+        return None, JsonResponse({"error": "medicine_id must be a comma-separated list of ids"}, status=400)
+    return ids, None
+
+
+@require_http_methods(["GET"])
+@login_required
+def stock_at_api(request):
+    prof = getattr(request.user, "profile", None)
+    role = getattr(prof, "role", "patient") if prof else "patient"
+    if role not in ["pharmacist", "admin"]:
+        return JsonResponse({"error": "Forbidden"}, status=403)
+
+    day = _parse_date(request.GET.get("date")) if request.GET.get("date") else timezone.localdate()
+    if day is None:
+        return JsonResponse({"error": "Invalid date"}, status=400)
+    medicine_ids, error = _stock_report_params(request)
+    if error:
+        return error
+
+    balances = ledger.stock_at(_end_of_day(day), medicine_ids)
+    names = dict(Medicine.objects.filter(id__in=balances).values_list("id", "name"))
+    return timed_json_response({
+        "date": day.isoformat(),
+        "items": [{"medicine_id": mid, "name": names.get(mid, ""), "stock": stock} for mid, stock in balances.items()],
+    }, status=200)
+
+
+@require_http_methods(["GET"])
+@login_required
+def stock_movements_api(request):
+    prof = getattr(request.user, "profile", None)
+    role = getattr(prof, "role", "patient") if prof else "patient"
+    if role not in ["pharmacist", "admin"]:
+        return JsonResponse({"error": "Forbidden"}, status=403)
+
+    end = _parse_date(request.GET.get("to")) if request.GET.get("to") else timezone.localdate()
+    start = _parse_date(request.GET.get("from")) if request.GET.get("from") else end
+    if start is None or end is None:
+        return JsonResponse({"error": "Invalid date"}, status=400)
+    if start > end:
+        return JsonResponse({"error": "'from' must not be after 'to'"}, status=400)
+    medicine_ids, error = _stock_report_params(request)
+    if error:
+        return error
+
+    # movements on the days from..to inclusive
+    rows = ledger.movement_report(_end_of_day(start) - timedelta(days=1), _end_of_day(end), medicine_ids)
+    names = dict(Medicine.objects.filter(id__in=[r["medicine_id"] for r in rows]).values_list("id", "name"))
+    for row in rows:
+        row["name"] = names.get(row["medicine_id"], "")
+    return timed_json_response({"from": start.isoformat(), "to": end.isoformat(), "items": rows}, status=200)
+
+
+def _branch_or_404(code):
+    if code not in branches.get_config():
+        return JsonResponse({"error": f"Unknown branch: {code}"}, status=404)
+    return None
+
+
+@require_http_methods(["GET"])
+@login_required
+def branches_api(request):
+    return JsonResponse(
+        [{"code": code, "name": b.get("NAME", code)} for code, b in branches.get_config().items()],
+        safe=False, status=200,
+    )
+
+
+@require_http_methods(["GET", "PUT"])
+@login_required
+def branch_stock_api(request, code):
+    missing = _branch_or_404(code)
+    if missing:
+        return missing
+
+    if request.method == "PUT":
+        prof = getattr(request.user, "profile", None)
+        role = getattr(prof, "role", "patient") if prof else "patient"
+        if role not in ["pharmacist", "admin"]:
+            return JsonResponse({"error": "Forbidden: Only pharmacists can set branch stock"}, status=403)
+        data = _json(request)
+        if data is None or not isinstance(data.get("items"), list):
+            return JsonResponse({"error": "items must be a list of {medicine_id, stock}"}, status=400)
+        quantities = {}
+        for item in data["items"]:
+            mid = _to_int(item.get("medicine_id"), None) if isinstance(item, dict) else None
+            qty = _to_int(item.get("stock"), None) if isinstance(item, dict) else None
+            if mid is None or qty is None or qty < 0:
+                return JsonResponse({"error": "Each item needs a medicine_id and a stock of 0 or more"}, status=400)
+            quantities[mid] = qty
+        known = set(Medicine.objects.filter(id__in=quantities).values_list("id", flat=True))
+        if known != set(quantities):
+            return JsonResponse({"error": f"Unknown medicines: {sorted(set(quantities) - known)}"}, status=400)
+        branches.set_stock(code, quantities)
+
+    medicine_ids, error = _stock_report_params(request)
+    if error:
+        return error
+    counts = branches.stock(code, medicine_ids)
+    names = dict(Medicine.objects.filter(id__in=counts).values_list("id", "name"))
+    return timed_json_response({
+        "branch": code,
+        "items": [{"medicine_id": mid, "name": names[mid], "stock": counts[mid]} for mid in sorted(names)],
+    }, status=200)
+
+
+@require_http_methods(["GET"])
+@login_required
+def branch_stock_report_api(request):
+    prof = getattr(request.user, "profile", None)
+    role = getattr(prof, "role", "patient") if prof else "patient"
+    if role not in ["pharmacist", "admin"]:
+        return JsonResponse({"error": "Forbidden"}, status=403)
+
+    codes = [c for c in request.GET.get("branch", "").split(",") if c] or None
+    for code in codes or []:
+        missing = _branch_or_404(code)
+        if missing:
+            return missing
+    medicine_ids, error = _stock_report_params(request)
+    if error:
+        return error
+    # each branch database is read in parallel, then merged per medicine
+    return timed_json_response({"items": branches.stock_report(medicine_ids, codes)}, status=200)
+
+
+def _batch_row(b, today):
+    return {
+        "id": b.id,
+        "batch_number": b.batch_number,
+        "expiry_date": b.expiry_date.isoformat(),
+        "quantity": b.quantity,
+        "expired": b.expiry_date < today,
+        "received_at": b.received_at.isoformat(),
+    }
+
+
+@require_http_methods(["GET", "POST"])
+@login_required
+def medicine_batches_api(request, pk):
+    prof = getattr(request.user, "profile", None)
+    role = getattr(prof, "role", "patient") if prof else "patient"
+    if role not in ["pharmacist", "admin"]:
+        return JsonResponse({"error": "Forbidden"}, status=403)
+    try:
+        medicine = Medicine.objects.get(pk=pk)
+    except Medicine.DoesNotExist:
+        return JsonResponse({"error": "Medicine not found"}, status=404)
+
+    today = timezone.localdate()
+    if request.method == "POST":
+        data = _json(request)
+        if data is None:
+            return JsonResponse({"error": "Invalid JSON"}, status=400)
+        quantity = _to_int(data.get("quantity"), 0)
+        expiry = _parse_date(data.get("expiry_date") or data.get("expiry"))
+        if quantity <= 0:
+            return JsonResponse({"error": "quantity must be positive"}, status=400)
+        if expiry is None:
+            return JsonResponse({"error": "A valid expiry_date is required"}, status=400)
+        batch = fefo.receive(medicine, quantity, expiry, (data.get("batch_number") or data.get("batch") or "").strip(),
+                             user=request.user)
+        # the stock update skips the signals that invalidate cached dashboards
+        dashboard_cache.invalidate(roles=dashboard_cache.ROLES)
+        return JsonResponse(_batch_row(batch, today), status=201)
+
+    # non-empty batches in the order checkouts draw from them
+    batches = medicine.batches.filter(quantity__gt=0).order_by("expiry_date", "id")
+    return timed_json_response({
+        "medicine_id": medicine.id,
+        "stock": stock_shards.available(medicine),
+        **fefo.totals([medicine.id], today).get(medicine.id, {}),
+        "batches": [_batch_row(b, today) for b in batches],
+    }, status=200)
+
+
+def _forecast_row(f):
+    return {
+        "medicine_id": f.medicine_id,
+        "name": f.medicine.name,
+        "method": f.method,
+        "daily_demand": f.daily_demand,
+        "demand_std": f.demand_std,
+        "safety_stock": f.safety_stock,
+        "reorder_point": f.reorder_point,
+        "suggested_order": f.suggested_order,
+        "stock": f.stock,
+        "computed_at": f.computed_at.isoformat(),
+    }
+
+
+@require_http_methods(["GET"])
+@login_required
+def forecasts_api(request):
+    prof = getattr(request.user, "profile", None)
+    role = getattr(prof, "role", "patient") if prof else "patient"
+    if role not in ["pharmacist", "admin"]:
+        return JsonResponse({"error": "Forbidden"}, status=403)
+
+    # the last `manage.py forecast_demand` run, a page of medicines at a time
+    limit = max(1, min(_to_int(request.GET.get("limit"), 100), 1000))
+    forecasts = DemandForecast.objects.select_related("medicine").filter(
+        medicine_id__gt=_to_int(request.GET.get("after"), 0)
+    ).order_by("medicine_id")
+    if request.GET.get("reorder") in ("1", "true"):
+        forecasts = forecasts.filter(suggested_order__gt=0)
+    rows = [_forecast_row(f) for f in forecasts[:limit]]
+    return timed_json_response({
+        "items": rows,
+        "next_after": rows[-1]["medicine_id"] if len(rows) == limit else None,
+    }, status=200)
+
+
+EXPORT_CONTENT_TYPES = {"csv": "text/csv; charset=utf-8", "jsonl": "application/x-ndjson; charset=utf-8"}
+
+
+@require_http_methods(["GET"])
+@login_required
+def export_api(request, name):
+    prof = getattr(request.user, "profile", None)
+    role = getattr(prof, "role", "patient") if prof else "patient"
+    if role not in ["pharmacist", "admin"]:
+        return JsonResponse({"error": "Forbidden"}, status=403)
+    if name not in exports.EXPORTS:
+        return JsonResponse({"error": f"Unknown export: {name}"}, status=404)
+
+    fmt = request.GET.get("format", "csv")
+    if fmt not in exports.FORMATS:
+        return JsonResponse({"error": f"format must be one of {', '.join(exports.FORMATS)}"}, status=400)
+    try:
+        columns = exports.parse_columns(name, request.GET.get("columns"))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    start = _parse_date(request.GET.get("from")) if request.GET.get("from") else None
+    end = _parse_date(request.GET.get("to")) if request.GET.get("to") else None
+    if (request.GET.get("from") and start is None) or (request.GET.get("to") and end is None):
+        return JsonResponse({"error": "Invalid date"}, status=400)
+    # resume with ?after=<id of the last row received>
+    after = _to_int(request.GET.get("after"), 0)
+    limit = _to_int(request.GET.get("limit"), 0) or None
+
+    rows = exports.rows(
+        name, columns,
+        start=timezone.make_aware(datetime.combine(start, datetime.min.time())) if start else None,
+        end=_end_of_day(end) if end else None,
+        after=after, limit=limit,
+    )
+    response = StreamingHttpResponse(exports.lines(fmt, columns, rows), content_type=EXPORT_CONTENT_TYPES[fmt])
+    response["Content-Disposition"] = f'attachment; filename="{name}-{timezone.localdate().isoformat()}.{fmt}"'
+    return response
+
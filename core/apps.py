@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from . import dashboard_cache, patient_summary
+        dashboard_cache.connect_signals()
+        patient_summary.connect_signals()
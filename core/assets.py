@@ -0,0 +1,298 @@
+import os
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.finders import BaseFinder
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.storage import FileSystemStorage
+
+from . import compression
+
+
+# bundle path (as used in {% static %}) -> source files, concatenated in order.
+# Every page loads exactly one JS bundle: utils plus the page's role module.
+BUNDLES = {
+    "core/dist/main.js": ["core/app/script.js"],
+    "core/dist/utils.js": ["core/app/utils.js"],
+    "core/dist/auth.js": ["core/app/utils.js", "core/app/auth.js"],
+    "core/dist/doctor.js": ["core/app/utils.js", "core/app/doctor.js"],
+    "core/dist/pharmacist.js": ["core/app/utils.js", "core/app/pharmacist.js"],
+    "core/dist/patient.js": ["core/app/utils.js", "core/app/patient.js"],
+    "core/dist/style.css": ["core/styles/style.css"],
+}
+
+DEFAULTS = {
+    "BUILD_DIR": None,
+    "MINIFY": True,
+    "PRECOMPRESS_EXTENSIONS": [".js", ".css", ".svg", ".json", ".txt", ".html"],
+    "PRECOMPRESS_MIN_SIZE": 512,
+    "GZIP_LEVEL": 9,
+    "BROTLI_QUALITY": 11,
+}
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, "ASSETS", {}) or {})
+    if not config["BUILD_DIR"]:
+        config["BUILD_DIR"] = Path(settings.BASE_DIR) / "build" / "assets"
+    return config
+
+
+# -- minification ----------------------------------------------------------
+# Conservative on purpose: comments go and whitespace collapses, but line
+# breaks survive (automatic semicolon insertion) and strings, template
+# literals and regex literals are copied untouched.
+
+# after these a "/" starts a regex literal rather than a division
+_REGEX_PRECEDERS = set("(,=:[!&|?{};+-*%<>~^")
+_REGEX_KEYWORDS = ("return", "typeof", "case", "do", "else", "in", "of", "new", "delete", "void", "throw")
+
+
+class _JsMinifier:
+    def __init__(self, source):
+        self.src = source
+        self.i = 0
+        self.out = []
+
+    def run(self):
+        self.code(top_level=True)
+        return "".join(self.out).strip() + "\n"
+
+    def last_significant(self):
+        for chunk in reversed(self.out):
+            stripped = chunk.rstrip()
+            if stripped:
+                return stripped
+        return ""
+
+    def regex_allowed(self):
+        prev = self.last_significant()
+        if not prev:
+            return True
+        if prev[-1] in _REGEX_PRECEDERS:
+            return True
+        word = re.search(r"[A-Za-z_$][\w$]*$", prev)
+        return bool(word) and word.group() in _REGEX_KEYWORDS
+
+    def code(self, top_level=False):
+        # until the "}" that closes a template literal's ${...} when nested
+        src, depth = self.src, 0
+        while self.i < len(src):
+            c = src[self.i]
+            nxt = src[self.i + 1] if self.i + 1 < len(src) else ""
+            if c in "\"'":
+                self.string(c)
+            elif c == "`":
+                self.template()
+            elif c == "/" and nxt == "/":
+                end = src.find("\n", self.i)
+                self.i = len(src) if end == -1 else end
+            elif c == "/" and nxt == "*":
+                end = src.find("*/", self.i + 2)
+                self.i = len(src) if end == -1 else end + 2
+                self.space(" ")
+            elif c == "/" and self.regex_allowed():
+                self.regex()
+            elif c.isspace():
+                start = self.i
+                while self.i < len(src) and src[self.i].isspace():
+                    self.i += 1
+                self.space("\n" if "\n" in src[start:self.i] else " ")
+                continue
+            else:
+                if c == "{":
+                    depth += 1
+                elif c == "}":
+                    if depth == 0 and not top_level:
+                        self.out.append(c)
+                        self.i += 1
+                        return
+                    depth -= 1
+                self.out.append(c)
+                self.i += 1
+
+    def space(self, ch):
+        # one space or line break between tokens, none at the start of a line
+        if self.out and self.out[-1] in (" ", "\n"):
+            if ch == "\n":
+                self.out[-1] = ch
+            return
+        self.out.append(ch)
+
+    def string(self, quote):
+        src, start = self.src, self.i
+        self.i += 1
+        while self.i < len(src) and src[self.i] != quote:
+            self.i += 2 if src[self.i] == "\\" else 1
+        self.i += 1
+        self.out.append(src[start:self.i])
+
+    def template(self):
+        src, start = self.src, self.i
+        self.i += 1
+        while self.i < len(src):
+            c = src[self.i]
+            if c == "\\":
+                self.i += 2
+            elif c == "`":
+                self.i += 1
+                break
+            elif c == "$" and src[self.i + 1:self.i + 2] == "{":
+                self.out.append(src[start:self.i + 2])
+                self.i += 2
+                self.code()
+                start = self.i
+            else:
+                self.i += 1
+        self.out.append(src[start:self.i])
+
+    def regex(self):
+        src, start = self.src, self.i
+        self.i += 1
+        in_class = False
+        while self.i < len(src) and src[self.i] != "\n":
+            c = src[self.i]
+            if c == "\\":
+                self.i += 2
+                continue
+            if c == "[":
+                in_class = True
+            elif c == "]":
+                in_class = False
+            elif c == "/" and not in_class:
+                self.i += 1
+                break
+            self.i += 1
+        while self.i < len(src) and src[self.i].isalnum():
+            self.i += 1
+        self.out.append(src[start:self.i])
+
+
+def minify_js(source):
+    return _JsMinifier(source).run()
+
+
+_CSS_TOKENS = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|/\*.*?\*/|\s+', re.S)
+
+
+def minify_css(source):
+    def replace(match):
+        if match.group(1):
+            return match.group(1)
+        return "" if match.group().startswith("/*") else " "
+    css = _CSS_TOKENS.sub(replace, source)
+    # spaces around punctuation that never needs them (":" does in selectors)
+    css = re.sub(r' ?([{};,>]) ?', r"\1", css)
+    return css.replace(";}", "}").strip() + "\n"
+
+
+def minify(path, source):
+    if path.endswith(".js"):
+        return minify_js(source)
+    if path.endswith(".css"):
+        return minify_css(source)
+    return source
+
+
+# -- bundles ---------------------------------------------------------------
+
+_USE_STRICT = re.compile(r"""^\s*(["'])use strict\1;?""")
+
+
+def source_path(name):
+    path = finders.find(name)
+    if path is None:
+        raise FileNotFoundError(f"Bundle source {name} not found by the staticfiles finders")
+    return Path(path)
+
+
+def build_bundle(name, config=None, force=False):
+    config = config or get_config()
+    target = Path(config["BUILD_DIR"]) / name
+    sources = [source_path(s) for s in BUNDLES[name]]
+    if not force and target.exists():
+        built = target.stat().st_mtime
+        if all(s.stat().st_mtime <= built for s in sources):
+            return target
+    texts = [s.read_text(encoding="utf-8") for s in sources]
+    if name.endswith(".js"):
+        # a leading "use strict" applies to the whole bundle, so it only
+        # stays when every file in it was strict already
+        if not all(_USE_STRICT.match(t) for t in texts):
+            texts = [_USE_STRICT.sub("", t, count=1) for t in texts]
+        # ";" keeps one file's last statement from running into the next
+        text = "\n;\n".join(texts)
+    else:
+        text = "\n".join(texts)
+    if config["MINIFY"]:
+        text = minify(name, text)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(target.name + ".tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, target)
+    return target
+
+
+def build_bundles(config=None, force=False):
+    config = config or get_config()
+    return {name: build_bundle(name, config, force) for name in BUNDLES}
+
+
+class BundleFinder(BaseFinder):
+    # serves the bundles to runserver and hands them to collectstatic, which
+    # hashes them like any other static file; built on demand when stale
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.config = get_config()
+        self.storage = FileSystemStorage(location=str(self.config["BUILD_DIR"]))
+
+    def find(self, path, find_all=False, **kwargs):
+        if path not in BUNDLES:
+            return [] if find_all else None
+        target = str(build_bundle(path, self.config))
+        return [target] if find_all else target
+
+    def list(self, ignore_patterns):
+        build_bundles(self.config)
+        for name in BUNDLES:
+            yield name, self.storage
+
+
+class AssetStorage(ManifestStaticFilesStorage):
+    # content-hashed names once `manage.py build_assets` has run; before
+    # that (development, tests) {% static %} falls back to the plain name
+    # instead of failing on the missing manifest
+    manifest_strict = False
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
+
+
+# -- precompression --------------------------------------------------------
+
+def precompress(root, config=None):
+    # writes name.gz / name.br next to each collected file for web servers
+    # that serve precompressed variants (nginx gzip_static, brotli_static)
+    config = config or get_config()
+    levels = {"GZIP_LEVEL": config["GZIP_LEVEL"], "BROTLI_QUALITY": config["BROTLI_QUALITY"]}
+    written = []
+    for path in sorted(Path(root).rglob("*")):
+        if not path.is_file() or path.suffix not in config["PRECOMPRESS_EXTENSIONS"]:
+            continue
+        body = path.read_bytes()
+        if len(body) < config["PRECOMPRESS_MIN_SIZE"]:
+            continue
+        for encoding in compression.encodings():
+            data = compression.compress(body, encoding, levels)
+            if len(data) >= len(body):
+                continue
+            target = path.with_name(path.name + (".br" if encoding == "br" else ".gz"))
+            target.write_bytes(data)
+            written.append((target, len(body), len(data)))
+    return written
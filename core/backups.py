@@ -0,0 +1,215 @@
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+
+
+# Online snapshots of the SQLite database through SQLite's backup API. The
+# copy advances PAGES pages per step and sleeps between steps, so writers
+# (checkouts) only ever wait for one step's read lock. A write from another
+# connection makes SQLite restart the copy. In WAL mode, after MAX_RESTARTS
+# of those the rest is copied in one step, which readers there do not block
+# writers with; in rollback-journal mode (the default for db.sqlite3) that
+# step would lock checkouts out for the whole copy, so the backup gives up
+# instead. Each snapshot gets a JSON manifest with its checksum and row
+# counts, which `verify` checks against a restored copy.
+
+DEFAULTS = {
+    "DIR": None,
+    "PAGES": 256,
+    "SLEEP_MS": 50,
+    "MAX_RESTARTS": 5,
+    "KEEP": 7,
+    "COMPRESS": True,
+}
+
+SUFFIX = ".sqlite3"
+MANIFEST_SUFFIX = ".json"
+
+
+class BackupError(Exception):
+    pass
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, "BACKUPS", {}) or {})
+    if not config["DIR"]:
+        config["DIR"] = Path(settings.BASE_DIR) / "backups"
+    config["DIR"] = Path(config["DIR"])
+    return config
+
+
+def copy_online(source_path, target_path, pages, sleep_ms, max_restarts=DEFAULTS["MAX_RESTARTS"], progress=None):
+    # SQLite's online backup; returns {"steps", "restarts", "pages", "one_shot"}
+    # and raises BackupError when writes keep restarting it outside WAL mode
+    stats = {"steps": 0, "restarts": 0, "pages": 0, "one_shot": False}
+    last_remaining = None
+
+    def step(status, remaining, total):
+        nonlocal last_remaining
+        stats["steps"] += 1
+        stats["pages"] = total
+        # the source changed under the copy and it started over (a step that
+        # went through always leaves fewer pages to copy)
+        if last_remaining is not None and remaining >= last_remaining:
+            stats["restarts"] += 1
+            if stats["restarts"] > max_restarts:
+                raise _TooManyRestarts()
+        last_remaining = remaining
+        if progress is not None:
+            progress(total - remaining, total)
+
+    source = sqlite3.connect(source_path, uri=str(source_path).startswith("file:"))
+    try:
+        target = sqlite3.connect(target_path)
+        try:
+            try:
+                source.backup(target, pages=pages, progress=step, sleep=sleep_ms / 1000)
+            except _TooManyRestarts:
+                journal_mode = source.execute("PRAGMA journal_mode").fetchone()[0]
+                if journal_mode.lower() != "wal":
+                    raise BackupError(
+                        f"Writes restarted the copy {stats['restarts']} times; not copying the rest in one "
+                        f"step because in journal_mode={journal_mode} that would block writers until it "
+                        f"ends. Retry when it is quieter, raise MAX_RESTARTS or switch the database to WAL."
+                    )
+                source.backup(target, pages=-1)
+                stats["one_shot"] = True
+        finally:
+            target.close()
+    finally:
+        source.close()
+    return stats
+
+
+def row_counts(path):
+    # {table: rows} of a database file, opened read-only
+    db = sqlite3.connect(f"file:{Path(path).resolve()}?mode=ro", uri=True)
+    try:
+        tables = [r[0] for r in db.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+        )]
+        return {t: db.execute(f'SELECT COUNT(*) FROM "{t}"').fetchone()[0] for t in tables}
+    finally:
+        db.close()
+
+
+def quick_check(path):
+    db = sqlite3.connect(f"file:{Path(path).resolve()}?mode=ro", uri=True)
+    try:
+        return [r[0] for r in db.execute("PRAGMA quick_check")]
+    finally:
+        db.close()
+
+
+def sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def manifest_path(snapshot):
+    return Path(str(snapshot) + MANIFEST_SUFFIX)
+
+
+def snapshot(source_path, directory, prefix="db", pages=DEFAULTS["PAGES"], sleep_ms=DEFAULTS["SLEEP_MS"],
+             compress=True, max_restarts=DEFAULTS["MAX_RESTARTS"], progress=None):
+    # copies the database into directory/<prefix>-<timestamp>.sqlite3[.gz]
+    # and writes its manifest next to it; returns the snapshot path
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    name = f"{prefix}-{datetime.now():%Y%m%d-%H%M%S-%f}{SUFFIX}" + (".gz" if compress else "")
+    final = directory / name
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        copy = Path(tmp) / ("copy" + SUFFIX)
+        started = time.time()
+        stats = copy_online(source_path, copy, pages, sleep_ms, max_restarts, progress)
+        problems = [r for r in quick_check(copy) if r != "ok"]
+        if problems:
+            raise BackupError(f"The copy failed its integrity check: {problems[:5]}")
+        counts = row_counts(copy)
+        written = Path(tmp) / name
+        if compress:
+            with open(copy, "rb") as src, gzip.open(written, "wb", compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+        else:
+            written = copy
+        manifest = {
+            "snapshot": name,
+            "source": str(source_path),
+            "created_at": started,
+            "seconds": round(time.time() - started, 3),
+            "compressed": compress,
+            "bytes": written.stat().st_size,
+            "database_bytes": copy.stat().st_size,
+            "sha256": sha256(written),
+            "tables": counts,
+            **stats,
+        }
+        os.replace(written, final)
+    manifest_path(final).write_text(json.dumps(manifest, indent=2))
+    return final
+
+
+def snapshots(directory, prefix="db"):
+    # oldest first (the names sort by their timestamp)
+    found = [p for p in Path(directory).glob(f"{prefix}-*") if p.name.endswith((SUFFIX, SUFFIX + ".gz"))]
+    return sorted(found, key=lambda p: p.name)
+
+
+def rotate(directory, keep, prefix="db"):
+    # deletes all but the newest `keep` snapshots and their manifests
+    removed = snapshots(directory, prefix)[:-keep] if keep > 0 else []
+    for path in removed:
+        path.unlink()
+        manifest_path(path).unlink(missing_ok=True)
+    return removed
+
+
+def load_manifest(snapshot_path):
+    try:
+        return json.loads(manifest_path(snapshot_path).read_text())
+    except (OSError, ValueError) as e:
+        raise BackupError(f"No readable manifest for {Path(snapshot_path).name}: {e}")
+
+
+def verify(snapshot_path):
+    # restores the snapshot into a scratch file and checks it against its
+    # manifest: checksum, integrity and every table's row count. Returns
+    # the manifest; raises BackupError on any difference
+    snapshot_path = Path(snapshot_path)
+    manifest = load_manifest(snapshot_path)
+    if sha256(snapshot_path) != manifest["sha256"]:
+        raise BackupError(f"{snapshot_path.name} does not match its checksum")
+    with tempfile.TemporaryDirectory() as tmp:
+        restored = Path(tmp) / ("restored" + SUFFIX)
+        if manifest.get("compressed"):
+            with gzip.open(snapshot_path, "rb") as src, open(restored, "wb") as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+        else:
+            shutil.copyfile(snapshot_path, restored)
+        problems = [r for r in quick_check(restored) if r != "ok"]
+        if problems:
+            raise BackupError(f"{snapshot_path.name} failed its integrity check: {problems[:5]}")
+        counts = row_counts(restored)
+    expected = manifest["tables"]
+    wrong = {t: (expected.get(t), counts.get(t)) for t in set(expected) | set(counts) if expected.get(t) != counts.get(t)}
+    if wrong:
+        details = ", ".join(f"{t}: {want} != {got}" for t, (want, got) in sorted(wrong.items()))
+        raise BackupError(f"{snapshot_path.name} row counts differ from its manifest: {details}")
+    return manifest
@@ -0,0 +1,340 @@
+import json
+import os
+import platform
+import subprocess
+import time
+from contextlib import ExitStack, redirect_stdout
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import Client
+from django.urls import URLPattern, URLResolver
+
+from .middleware import QueryTimer, wrap_connections
+from .models import Profile, Medicine, Prescription, Order, OrderItem, Wallet
+from .synthetic import SYNTHETIC_PASSWORD
+
+
+# end-to-end API benchmark: drives every route in core/urls.py through the
+# Django test client against a (large) synthetic dataset and records
+# latency percentiles, throughput, query counts and response sizes.
+
+SCALES = {
+    "small": {"users": 500, "medicines": 1000, "orders": 5000},
+    "medium": {"users": 5000, "medicines": 10000, "orders": 100000},
+    "large": {"users": 50000, "medicines": 100000, "orders": 2000000},
+}
+
+BULK_CANCEL_BATCH = 50
+
+
+class BenchContext:
+    # dedicated users and rows the mutating cases consume, one set per iteration
+    def __init__(self, iterations):
+        self.iterations = iterations
+        self.run_tag = datetime.now().strftime("%H%M%S")
+        self.users = {}
+        self.clients = {}
+
+    def setup(self):
+        password = SYNTHETIC_PASSWORD
+        specs = {
+            "patient": {"role": "patient", "national_id": "8000000001"},
+            "doctor": {"role": "doctor", "practice_code": "A-800001"},
+            "pharmacist": {"role": "pharmacist", "practice_code": "A-800002", "is_staff": True},
+        }
+        for key, spec in specs.items():
+            user, created = User.objects.get_or_create(
+                username=f"bench_{key}",
+                defaults={"email": f"bench_{key}@example.com", "first_name": f"Bench {key.title()}",
+                          "is_staff": spec.get("is_staff", False)},
+            )
+            if created:
+                user.set_password(password)
+                user.save()
+                Profile.objects.create(
+                    user=user, role=spec["role"],
+                    national_id=spec.get("national_id", ""), practice_code=spec.get("practice_code", ""),
+                )
+            self.users[key] = user
+
+        patient = self.users["patient"]
+        Wallet.objects.update_or_create(user=patient, defaults={"balance": Decimal("5000000.00")})
+
+        self.medicine = Medicine.objects.create(
+            name="Bench Medicine", category="Benchmark", price=Decimal("1.00"), stock=10 ** 9,
+        )
+        self.prescriptions = [
+            Prescription.objects.create(
+                doctor=self.users["doctor"], patient_national_id="8000000001",
+                medicine=self.medicine, quantity=1, status="active",
+            ).prescription_id
+            for _ in range(self.iterations)
+        ]
+
+        self.cancel_batches = []
+        for _ in range(self.iterations):
+            orders = Order.objects.bulk_create([
+                Order(order_id=f"ORD-B{os.urandom(4).hex().upper()}", patient=patient,
+                      total_amount=Decimal("1.00"), status="completed")
+                for _ in range(BULK_CANCEL_BATCH)
+            ])
+            OrderItem.objects.bulk_create([
+                OrderItem(order=o, medicine=self.medicine, quantity=1, price_at_time=Decimal("1.00"))
+                for o in orders
+            ])
+            self.cancel_batches.append([o.order_id for o in orders])
+
+        # receiving batches turns on FEFO for a medicine, so those cases get
+        # their own and checkouts keep drawing from plain stock
+        self.batch_medicine = Medicine.objects.create(
+            name="Bench Batched Medicine", category="Benchmark", price=Decimal("1.00"), stock=0,
+        )
+
+        # "login"/"logout" get their own clients so they never change the
+        # session of the role clients
+        for key in ["anon", "login", "logout", "patient", "doctor", "pharmacist"]:
+            client = Client()
+            if key in self.users:
+                client.force_login(self.users[key])
+            self.clients[key] = client
+
+        # one saved profile for the download case (None when profiling is off)
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            response = self.clients["pharmacist"].get("/api/medicines/?_profile")
+        self.profile_name = response.get("X-Profile-Id")
+
+
+def _cases():
+    # (url name, label, role, method, path(ctx), body(ctx, i), expected statuses, per-iteration prepare)
+    def relogin(ctx, client, i):
+        client.force_login(ctx.users["patient"])
+
+    return [
+        ("home", "home", "anon", "GET", lambda c: "/", None, (200,), None),
+        ("signin", "signin", "anon", "GET", lambda c: "/signin/", None, (200,), None),
+        ("contact", "contact", "anon", "GET", lambda c: "/contact/", None, (200,), None),
+        ("pharmacist", "dashboard_pharmacist", "pharmacist", "GET", lambda c: "/dashboard/pharmacist/", None, (200,), None),
+        ("doctor", "dashboard_doctor", "doctor", "GET", lambda c: "/dashboard/doctor/", None, (200,), None),
+        ("patient", "dashboard_patient", "patient", "GET", lambda c: "/dashboard/patient/", None, (200,), None),
+        ("api_signup", "signup", "anon", "POST", lambda c: "/api/signup/",
+         lambda c, i: {"name": "Bench Signup", "email": f"bench_signup_{c.run_tag}_{i}@example.com",
+                       "password": "bench-pass-123", "role": "patient", "national_id": f"7{c.run_tag}{i % 1000:03d}"},
+         (201, 400), None),
+        ("api_login", "login", "login", "POST", lambda c: "/api/login/",
+         lambda c, i: {"email": "bench_patient@example.com", "password": SYNTHETIC_PASSWORD}, (200,), None),
+        ("api_logout", "logout_api", "login", "POST", lambda c: "/api/logout/", None, (200,), None),
+        ("logout", "logout", "logout", "GET", lambda c: "/logout/", None, (302,), relogin),
+        ("api_orders", "orders", "patient", "GET", lambda c: "/api/orders/", None, (200,), None),
+        ("api_patient_prescriptions", "patient_prescriptions", "patient", "GET",
+         lambda c: "/api/prescriptions/patient/", None, (200,), None),
+        ("api_prescriptions", "prescriptions_doctor", "doctor", "GET", lambda c: "/api/prescriptions/", None, (200,), None),
+        ("api_prescriptions", "prescriptions_pharmacist", "pharmacist", "GET", lambda c: "/api/prescriptions/", None, (200,), None),
+        ("api_prescriptions", "prescriptions_create", "doctor", "POST", lambda c: "/api/prescriptions/",
+         lambda c, i: {"patient_national_id": "8000000001", "medicine_id": c.medicine.id, "quantity": 1}, (201,), None),
+        ("api_create_order", "create_order", "patient", "POST", lambda c: "/api/orders/create/",
+         lambda c, i: {"prescription_id": c.prescriptions[i]}, (201,), None),
+        ("api_bulk_order_status", "bulk_cancel", "pharmacist", "POST", lambda c: "/api/orders/bulk-status/",
+         lambda c, i: {"order_ids": c.cancel_batches[i], "status": "cancelled"}, (200,), None),
+        ("api_users", "users", "pharmacist", "GET", lambda c: "/api/users/", None, (200,), None),
+        ("api_medicines", "medicines", "pharmacist", "GET", lambda c: "/api/medicines/", None, (200,), None),
+        ("api_medicines", "medicines_create", "pharmacist", "POST", lambda c: "/api/medicines/",
+         lambda c, i: {"name": f"Bench Created {i}", "price": "2.50", "stock": 10}, (201,), None),
+        ("api_medicine_detail", "medicine_update", "pharmacist", "PUT", lambda c: f"/api/medicines/{c.medicine.id}/",
+         lambda c, i: {"notes": f"bench {i}"}, (200,), None),
+        ("api_wallet_balance", "wallet_balance", "patient", "GET", lambda c: "/api/wallet/balance/", None, (200,), None),
+        ("api_wallet_deposit", "wallet_deposit", "patient", "POST", lambda c: "/api/wallet/deposit/",
+         lambda c, i: {"amount": "10.00"}, (200,), None),
+        ("api_wallet_transactions", "wallet_transactions", "patient", "GET",
+         lambda c: "/api/wallet/transactions/", None, (200,), None),
+        ("api_total_revenue", "total_revenue", "pharmacist", "GET", lambda c: "/api/revenue/total/", None, (200,), None),
+        ("api_patient_stats", "patient_stats", "patient", "GET", lambda c: "/api/patient/stats/", None, (200,), None),
+        ("api_diagnostics", "diagnostics", "pharmacist", "GET",
+         lambda c: "/api/debug/diagnostics/", None, (200,), None),
+        ("api_pharmacist_all_orders", "pharmacist_all_orders", "pharmacist", "GET",
+         lambda c: "/api/pharmacist/all-orders/", None, (200,), None),
+        ("api_patient_order_history", "patient_order_history", "patient", "GET",
+         lambda c: "/api/patient/order-history/", None, (200,), None),
+        ("metrics", "metrics", "anon", "GET", lambda c: "/metrics", None, (200,), None),
+        ("api_profiles", "profiles", "pharmacist", "GET", lambda c: "/api/debug/profiles/", None, (200,), None),
+        ("api_bootstrap", "bootstrap_patient", "patient", "GET", lambda c: "/api/bootstrap/", None, (200,), None),
+        ("api_bootstrap", "bootstrap_pharmacist", "pharmacist", "GET", lambda c: "/api/bootstrap/", None, (200,), None),
+        ("api_profile_download", "profile_download", "pharmacist", "GET",
+         lambda c: f"/api/debug/profiles/{c.profile_name or 'missing.prof'}/", None, (200, 404), None),
+        ("api_stock_at", "stock_at", "pharmacist", "GET", lambda c: "/api/stock/at/", None, (200,), None),
+        ("api_stock_movements", "stock_movements", "pharmacist", "GET",
+         lambda c: f"/api/stock/movements/?from={date.today() - timedelta(days=30)}", None, (200,), None),
+        ("api_medicine_batches", "batches_receive", "pharmacist", "POST",
+         lambda c: f"/api/medicines/{c.batch_medicine.id}/batches/",
+         lambda c, i: {"quantity": 10, "expiry_date": str(date.today() + timedelta(days=365 + i)),
+                       "batch_number": f"BENCH-{c.run_tag}-{i}"}, (201,), None),
+        ("api_medicine_batches", "batches", "pharmacist", "GET",
+         lambda c: f"/api/medicines/{c.batch_medicine.id}/batches/", None, (200,), None),
+        ("api_branches", "branches", "pharmacist", "GET", lambda c: "/api/branches/", None, (200,), None),
+        ("api_branch_stock", "branch_stock", "pharmacist", "GET",
+         lambda c: f"/api/branches/{next(iter(settings.BRANCHES))}/stock/", None, (200,), None),
+        ("api_branch_stock_report", "branch_stock_report", "pharmacist", "GET",
+         lambda c: "/api/branches/stock-report/", None, (200,), None),
+        ("api_forecasts", "forecasts", "pharmacist", "GET", lambda c: "/api/forecasts/", None, (200,), None),
+        ("api_export", "export_orders", "pharmacist", "GET",
+         lambda c: "/api/exports/orders/?limit=1000", None, (200,), None),
+    ]
+
+
+def url_names(patterns=None):
+    if patterns is None:
+        from . import urls
+        patterns = urls.urlpatterns
+    names = []
+    for p in patterns:
+        if isinstance(p, URLResolver):
+            names.extend(url_names(p.url_patterns))
+        elif isinstance(p, URLPattern) and p.name:
+            names.append(p.name)
+    return names
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    k = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+
+def summarize(samples, wall_time):
+    latencies = sorted(s["ms"] for s in samples)
+    queries = [s["queries"] for s in samples]
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for s in samples if not s["ok"]),
+        "statuses": sorted({s["status"] for s in samples}),
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "mean_ms": sum(latencies) / len(latencies) if latencies else None,
+        "max_ms": latencies[-1] if latencies else None,
+        "throughput_rps": len(samples) / wall_time if wall_time else None,
+        "queries_mean": sum(queries) / len(queries) if queries else None,
+        "queries_max": max(queries) if queries else None,
+        "db_ms_mean": sum(s["db_ms"] for s in samples) / len(samples) if samples else None,
+        "bytes_mean": sum(s["bytes"] for s in samples) / len(samples) if samples else None,
+    }
+
+
+def _request(client, method, path, body):
+    kwargs = {}
+    if body is not None:
+        kwargs = {"data": json.dumps(body), "content_type": "application/json"}
+    return getattr(client, method.lower())(path, **kwargs)
+
+
+def run_cases(ctx, iterations, warmup=2, only=None, stdout=None):
+    results = {}
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        for url_name, label, role, method, path_fn, body_fn, expected, prepare in _cases():
+            if only and label not in only and url_name not in only:
+                continue
+            client = ctx.clients[role]
+            path = path_fn(ctx)
+            samples = []
+            # mutating cases consume one fixture per iteration, so warmup
+            # only repeats read-only requests
+            n_warmup = warmup if method == "GET" else 0
+            for _ in range(n_warmup):
+                if prepare:
+                    prepare(ctx, client, 0)
+                _request(client, method, path, None)
+
+            wall_start = time.perf_counter()
+            for i in range(iterations):
+                if prepare:
+                    prepare(ctx, client, i)
+                body = body_fn(ctx, i) if body_fn else None
+                timer = QueryTimer()
+                start = time.perf_counter()
+                with ExitStack() as stack:
+                    wrap_connections(stack, timer)
+                    response = _request(client, method, path, body)
+                    # streamed responses query while their body is read
+                    content = b"".join(response.streaming_content) if response.streaming else response.content
+                elapsed = time.perf_counter() - start
+                samples.append({
+                    "ms": elapsed * 1000,
+                    "queries": timer.count,
+                    "db_ms": timer.duration * 1000,
+                    "status": response.status_code,
+                    "ok": response.status_code in expected,
+                    "bytes": len(content),
+                })
+            wall_time = time.perf_counter() - wall_start
+
+            results[label] = dict(summarize(samples, wall_time), url_name=url_name, method=method, role=role)
+            if stdout is not None:
+                r = results[label]
+                stdout.write(
+                    f"{label:<26} p50={r['p50_ms']:8.2f}ms p95={r['p95_ms']:8.2f}ms "
+                    f"p99={r['p99_ms']:8.2f}ms q={r['queries_mean']:7.1f} "
+                    f"rps={r['throughput_rps']:8.1f} err={r['errors']}"
+                )
+    return results
+
+
+def covered_url_names(only=None):
+    return {c[0] for c in _cases() if not only or c[1] in only or c[0] in only}
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, timeout=5,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def build_report(results, scale, counts, iterations):
+    core_names = set(url_names())
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(dt_timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": settings.DATABASES["default"]["ENGINE"],
+            "scale": scale,
+            "counts": counts,
+            "iterations": iterations,
+            "uncovered_urls": sorted(core_names - covered_url_names()),
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline, max_regression=0.2):
+    # latency regressions beyond max_regression (fraction) and any growth in
+    # the mean query count are reported per case
+    regressions = []
+    rows = []
+    for label, cur in current["results"].items():
+        base = baseline.get("results", {}).get(label)
+        if not base:
+            continue
+        row = {"case": label}
+        for key in ("p50_ms", "p95_ms"):
+            if base.get(key) and cur.get(key) is not None:
+                change = cur[key] / base[key] - 1
+                row[key] = change
+                if change > max_regression:
+                    regressions.append(f"{label}: {key} {base[key]:.2f} -> {cur[key]:.2f} ms ({change:+.0%})")
+        if base.get("queries_mean") is not None and cur.get("queries_mean") is not None:
+            row["queries"] = cur["queries_mean"] - base["queries_mean"]
+            if cur["queries_mean"] > base["queries_mean"] + 0.5:
+                regressions.append(
+                    f"{label}: queries {base['queries_mean']:.1f} -> {cur['queries_mean']:.1f}"
+                )
+        rows.append(row)
+    return rows, regressions
@@ -0,0 +1,139 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.db import connections, models, transaction
+
+from .models import BranchStock, Medicine
+from .stock_shards import InsufficientStock
+
+
+# Each pharmacy branch keeps its inventory (BranchStock) in its own database
+# alias so branches do not queue behind one another's writes; the catalog,
+# users, prescriptions and orders stay in "default". Several branches may
+# share an alias (rows carry the branch code), which is the default setup.
+
+DEFAULTS = {
+    "main": {"NAME": "Main branch", "DATABASE": "default"},
+}
+
+# models whose rows live in the branch databases
+BRANCH_MODELS = {"core.BranchStock"}
+
+MAX_WORKERS = 8
+
+
+def get_config():
+    return dict(getattr(settings, "BRANCHES", None) or DEFAULTS)
+
+
+def alias_for(code):
+    branch = get_config().get(code)
+    return branch.get("DATABASE", "default") if branch else None
+
+
+def aliases():
+    return {branch.get("DATABASE", "default") for branch in get_config().values()}
+
+
+class BranchRouter:
+    # rows go to their branch's database when the instance says which
+    # branch; querysets pick it explicitly with .using(alias_for(code))
+    def _db(self, model, **hints):
+        if model._meta.label not in BRANCH_MODELS:
+            return None
+        instance = hints.get("instance")
+        return alias_for(instance.branch) if instance is not None and instance.branch else None
+
+    db_for_read = _db
+    db_for_write = _db
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # branch rows point at the shared catalog across databases
+        if {obj1._meta.label, obj2._meta.label} & BRANCH_MODELS:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        branch_model = f"{app_label}.{model_name}".lower() in {m.lower() for m in BRANCH_MODELS}
+        if branch_model:
+            return db in aliases()
+        # a branch-only database holds nothing but branch rows
+        if db != "default" and db in aliases():
+            return False
+        return None
+
+
+def atomic(code):
+    # a transaction on the branch database, for use around the "default" one;
+    # without two-phase commit the inner (default) transaction commits first
+    alias = alias_for(code) if code else None
+    if alias is None or alias == "default":
+        return nullcontext()
+    return transaction.atomic(using=alias)
+
+
+def _stock(code):
+    return BranchStock.objects.using(alias_for(code)).filter(branch=code)
+
+
+def stock(code, medicine_ids=None):
+    qs = _stock(code)
+    if medicine_ids is not None:
+        qs = qs.filter(medicine_id__in=medicine_ids)
+    return dict(qs.values_list("medicine_id", "quantity"))
+
+
+def set_stock(code, quantities):
+    # {medicine id: absolute quantity}, one upsert
+    BranchStock.objects.using(alias_for(code)).bulk_create(
+        [BranchStock(branch=code, medicine_id=mid, quantity=qty) for mid, qty in quantities.items()],
+        update_conflicts=True, unique_fields=["branch", "medicine"], update_fields=["quantity", "updated_at"],
+    )
+
+
+def take(code, medicine_id, quantity):
+    if not _stock(code).filter(medicine_id=medicine_id, quantity__gte=quantity).update(
+        quantity=models.F("quantity") - quantity
+    ):
+        raise InsufficientStock(stock(code, [medicine_id]).get(medicine_id, 0))
+
+
+def put_back(code, quantities):
+    qs = _stock(code).filter(medicine_id__in=quantities)
+    qs.update(quantity=models.Case(
+        *[models.When(medicine_id=mid, then=models.F("quantity") + qty) for mid, qty in quantities.items()],
+        default=models.F("quantity"),
+        output_field=models.IntegerField(),
+    ))
+
+
+def fan_out(fn, codes=None):
+    # {code: fn(code)} with each branch database queried in its own thread.
+    # Inside a transaction (requests under ATOMIC_REQUESTS, tests) other
+    # connections could not see its writes, so it runs inline instead
+    codes = list(codes or get_config())
+    if len(codes) < 2 or any(connections[alias_for(c)].in_atomic_block for c in codes):
+        return {code: fn(code) for code in codes}
+
+    def run(code):
+        try:
+            return fn(code)
+        finally:
+            connections[alias_for(code)].close()
+
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(codes))) as pool:
+        return dict(zip(codes, pool.map(run, codes)))
+
+
+def stock_report(medicine_ids=None, codes=None):
+    # every branch's stock per medicine, merged; medicines no longer in the
+    # catalog are skipped
+    per_branch = fan_out(lambda code: stock(code, medicine_ids), codes)
+    found = set().union(*per_branch.values()) if per_branch else set()
+    names = dict(Medicine.objects.filter(id__in=found).values_list("id", "name"))
+    rows = []
+    for mid in sorted(names):
+        counts = {code: per_branch[code].get(mid, 0) for code in per_branch}
+        rows.append({"medicine_id": mid, "name": names[mid], "branches": counts, "total": sum(counts.values())})
+    return rows
@@ -0,0 +1,126 @@
+import gzip
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_vary_headers
+
+from .metrics import CACHE_LOOKUPS
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+DEFAULTS = {
+    "ENABLED": True,
+    "MIN_SIZE": 1024,
+    "GZIP_LEVEL": 6,
+    "BROTLI_QUALITY": 5,
+    "PATH_PREFIXES": ["/api/"],
+    "CONTENT_TYPES": ["application/json"],
+    # how long compressed copies of cacheable payloads are kept
+    "CACHE_TIMEOUT": 600,
+}
+
+CACHE_PREFIX = "compressed"
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, "RESPONSE_COMPRESSION", {}) or {})
+    return config
+
+
+def encodings():
+    # in order of preference when the client accepts several equally
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate(accept_encoding, available=None):
+    weights = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip().replace(" ", "")
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name] = q
+
+    best, best_q = None, 0.0
+    for encoding in available or encodings():
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress(body, encoding, config):
+    if encoding == "br":
+        return brotli.compress(body, quality=config["BROTLI_QUALITY"])
+    # mtime=0 keeps the output identical for identical input
+    return gzip.compress(body, compresslevel=config["GZIP_LEVEL"], mtime=0)
+
+
+def compress_cached(body, encoding, config):
+    # keyed on a digest of the uncompressed body, so an unchanged payload is
+    # compressed once and a changed one can never be served stale
+    level = config["BROTLI_QUALITY"] if encoding == "br" else config["GZIP_LEVEL"]
+    key = f"{CACHE_PREFIX}:{encoding}:{level}:{hashlib.blake2b(body, digest_size=20).hexdigest()}"
+    compressed = cache.get(key)
+    CACHE_LOOKUPS.inc(cache="compressed_responses", result="miss" if compressed is None else "hit")
+    if compressed is None:
+        compressed = compress(body, encoding, config)
+        cache.set(key, compressed, config["CACHE_TIMEOUT"])
+    return compressed
+
+
+def cacheable(response):
+    # for views whose payload repeats across requests and users (the
+    # catalog, dashboard polls): keep its compressed copy around
+    response.compress_cacheable = True
+    return response
+
+
+def should_compress(request, response, config):
+    if not request.path.startswith(tuple(config["PATH_PREFIXES"])):
+        return False
+    if getattr(response, "streaming", False) or response.has_header("Content-Encoding"):
+        return False
+    if response.status_code != 200:
+        return False
+    content_type = response.get("Content-Type", "").split(";")[0].strip().lower()
+    return content_type in config["CONTENT_TYPES"] and len(response.content) >= config["MIN_SIZE"]
+
+
+def compress_response(request, response, config):
+    if not should_compress(request, response, config):
+        return response
+    # the response differs per Accept-Encoding even if this client gets it plain
+    patch_vary_headers(response, ("Accept-Encoding",))
+    encoding = negotiate(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+    if encoding is None:
+        return response
+
+    body = response.content
+    if getattr(response, "compress_cacheable", False):
+        compressed = compress_cached(body, encoding, config)
+    else:
+        compressed = compress(body, encoding, config)
+    if len(compressed) >= len(body):
+        return response
+
+    response.content = compressed
+    response["Content-Length"] = str(len(compressed))
+    response["Content-Encoding"] = encoding
+    etag = response.get("ETag")
+    if etag and etag.startswith('"'):
+        response["ETag"] = "W/" + etag
+    return response
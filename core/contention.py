@@ -0,0 +1,107 @@
+import json
+import os
+import threading
+import time
+from contextlib import redirect_stdout
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+
+from . import stock_shards
+from .benchmark import percentile
+from .models import Medicine, Prescription, Profile, Wallet
+
+
+# checkout contention benchmark: several patients check out the same hot
+# medicine at once, first with the single Medicine.stock counter and then
+# with the medicine's stock spread over shards.
+
+
+class CheckoutContext:
+    def __init__(self, threads, orders, run_tag):
+        self.threads = threads
+        self.orders = orders
+        self.run_tag = run_tag
+        self.patients = []
+
+    def setup(self):
+        self.doctor = User.objects.create(username=f"contention_doctor_{self.run_tag}")
+        self.medicine = Medicine.objects.create(
+            name=f"Contention Medicine {self.run_tag}", category="Benchmark", price=Decimal("1.00"), stock=10 ** 6,
+        )
+        for t in range(self.threads):
+            national_id = f"9{self.run_tag[-5:]}{t:04d}"
+            user = User.objects.create(username=f"contention_{self.run_tag}_{t}")
+            Profile.objects.create(user=user, role="patient", national_id=national_id)
+            Wallet.objects.create(user=user, balance=Decimal("1000000.00"))
+            self.patients.append(user)
+        return self
+
+    def prescriptions(self, patient):
+        national_id = patient.profile.national_id
+        Prescription.objects.bulk_create([
+            Prescription(prescription_id=f"RX-C{os.urandom(4).hex().upper()}", doctor=self.doctor,
+                         patient_national_id=national_id, medicine=self.medicine, quantity=1, status="active")
+            for _ in range(self.orders)
+        ])
+        return list(Prescription.objects.filter(
+            patient_national_id=national_id, medicine=self.medicine, status="active",
+        ).values_list("prescription_id", flat=True))
+
+
+def _worker(patient, prescription_ids, samples, barrier):
+    client = Client()
+    client.force_login(patient)
+    barrier.wait()
+    try:
+        for prescription_id in prescription_ids:
+            start = time.perf_counter()
+            response = client.post("/api/orders/create/", data=json.dumps({"prescription_id": prescription_id}),
+                                   content_type="application/json")
+            samples.append({"ms": (time.perf_counter() - start) * 1000, "status": response.status_code,
+                            "ok": response.status_code == 201})
+    finally:
+        connection.close()
+
+
+def run(ctx, shards):
+    # one round of threads x orders checkouts; shards=0 is the unsharded baseline
+    if shards:
+        stock_shards.enable(ctx.medicine, shards)
+    else:
+        stock_shards.disable(ctx.medicine)
+    ctx.medicine.refresh_from_db()
+    start_stock = stock_shards.available(ctx.medicine)
+
+    work = [(patient, ctx.prescriptions(patient)) for patient in ctx.patients]
+    samples = []
+    barrier = threading.Barrier(len(work) + 1)
+    threads = [threading.Thread(target=_worker, args=(p, ids, samples, barrier)) for p, ids in work]
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        for t in threads:
+            t.start()
+        barrier.wait()
+        wall_start = time.perf_counter()
+        for t in threads:
+            t.join()
+        wall_time = time.perf_counter() - wall_start
+
+    ctx.medicine.refresh_from_db()
+    latencies = sorted(s["ms"] for s in samples)
+    ok = sum(1 for s in samples if s["ok"])
+    return {
+        "shards": shards,
+        "threads": len(work),
+        "checkouts": len(samples),
+        "ok": ok,
+        "failed": len(samples) - ok,
+        "statuses": sorted({s["status"] for s in samples}),
+        "checkouts_per_s": ok / wall_time if wall_time else None,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "max_ms": latencies[-1] if latencies else None,
+        # every successful checkout must have taken exactly one unit
+        "stock_consistent": start_stock - stock_shards.available(ctx.medicine) == ok,
+    }
@@ -0,0 +1,127 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+
+from .metrics import CACHE_LOOKUPS
+from .models import Profile, Medicine, Prescription, Order, Wallet, Transaction
+
+
+# Cached dashboard fragments are keyed on two version counters: one for the
+# role (data every user of that role sees, e.g. the medicine list) and one
+# for the user. Writes bump the counters instead of deleting fragments, so
+# stale fragments are never read again and simply expire.
+
+ROLES = ("patient", "doctor", "pharmacist")
+KEY_PREFIX = "dashboard:version"
+
+
+def _role_key(role):
+    return f"{KEY_PREFIX}:role:{role}"
+
+
+def _user_key(user_id):
+    return f"{KEY_PREFIX}:user:{user_id}"
+
+
+def _fresh_version():
+    # never reuse a number after a counter was evicted from the cache
+    return time.time_ns()
+
+
+def enabled():
+    return getattr(settings, "DASHBOARD_SSR", False)
+
+
+def timeout():
+    return getattr(settings, "DASHBOARD_CACHE_TIMEOUT", 300)
+
+
+def versions(role, user_id):
+    keys = [_role_key(role), _user_key(user_id)]
+    found = cache.get_many(keys)
+    CACHE_LOOKUPS.inc(len(found), cache="dashboard_versions", result="hit")
+    CACHE_LOOKUPS.inc(len(keys) - len(found), cache="dashboard_versions", result="miss")
+    for key in keys:
+        if key not in found:
+            cache.add(key, _fresh_version(), None)
+            found[key] = cache.get(key)
+    return f"{found[keys[0]]}.{found[keys[1]]}"
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _fresh_version(), None)
+
+
+def invalidate(roles=(), user_ids=()):
+    # after commit, so a request that reads in between cannot cache the old
+    # data under the new version
+    roles, user_ids = tuple(roles), tuple(u for u in user_ids if u)
+    if not enabled() or not (roles or user_ids):
+        return
+
+    def bump():
+        for role in roles:
+            _bump(_role_key(role))
+        for user_id in user_ids:
+            _bump(_user_key(user_id))
+    transaction.on_commit(bump)
+
+
+def _patients_with_national_id(national_id):
+    return list(Profile.objects.filter(national_id=national_id).values_list("user_id", flat=True))
+
+
+def _medicine_changed(sender, instance, **kwargs):
+    # stock and price show up on every dashboard
+    invalidate(roles=ROLES)
+
+
+def _order_changed(sender, instance, **kwargs):
+    invalidate(roles=("pharmacist",), user_ids=(instance.patient_id,))
+
+
+def _prescription_changed(sender, instance, **kwargs):
+    if not enabled():
+        return
+    invalidate(user_ids=[instance.doctor_id, *_patients_with_national_id(instance.patient_national_id)])
+
+
+def _wallet_changed(sender, instance, **kwargs):
+    invalidate(user_ids=(instance.user_id,))
+
+
+def _transaction_changed(sender, instance, **kwargs):
+    if not enabled():
+        return
+    invalidate(user_ids=Wallet.objects.filter(id=instance.wallet_id).values_list("user_id", flat=True))
+
+
+def _user_changed(sender, instance, **kwargs):
+    # the pharmacist dashboard lists every user
+    user_id = instance.id if sender is User else instance.user_id
+    invalidate(roles=("pharmacist",), user_ids=(user_id,))
+
+
+HANDLERS = [
+    (Medicine, _medicine_changed),
+    (Order, _order_changed),
+    (Prescription, _prescription_changed),
+    (Wallet, _wallet_changed),
+    (Transaction, _transaction_changed),
+    (User, _user_changed),
+    (Profile, _user_changed),
+]
+
+
+def connect_signals():
+    for model, handler in HANDLERS:
+        uid = f"dashboard_cache:{model._meta.label}"
+        post_save.connect(handler, sender=model, dispatch_uid=uid + ":save")
+        post_delete.connect(handler, sender=model, dispatch_uid=uid + ":delete")
@@ -0,0 +1,208 @@
+import json
+import os
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+
+from . import slow_queries
+from .metrics import CACHE_LOOKUPS
+
+
+# What /api/debug/diagnostics/ reports. Every part is bounded: row counts
+# come from one query over all tables (MAX(rowid) estimates, exact COUNT(*)
+# only for tables estimated below EXACT_COUNT_LIMIT), the schema and sizes
+# from SQLite's own catalog, and slow queries from the tail of the log file.
+
+DEFAULTS = {
+    "EXACT_COUNT_LIMIT": 50_000,
+    "SLOW_QUERIES": 20,
+    "MAX_SLOW_QUERIES": 100,
+    # how much of the end of the slow query log is read
+    "SLOW_LOG_TAIL_BYTES": 1024 * 1024,
+    "MAX_SQL_CHARS": 500,
+}
+
+_INDEX_RE = re.compile(r"USING (?:COVERING )?INDEX (\w+)")
+_SCAN_RE = re.compile(r"\bSCAN (?:TABLE )?(\w+)")
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, "DIAGNOSTICS", {}) or {})
+    return config
+
+
+def _union(queries):
+    return " UNION ALL ".join(queries)
+
+
+def table_counts(connection, tables, exact_limit):
+    # {table: {"rows", "exact"}}: the largest rowid is a B-tree seek, and only
+    # tables it puts under the limit are counted exactly
+    if not tables:
+        return {}
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(_union(f"SELECT %s, (SELECT MAX(rowid) FROM {qn(t)})" for t in tables), tables)
+        estimates = {t: n or 0 for t, n in cursor.fetchall()}
+        small = [t for t in tables if estimates[t] <= exact_limit]
+        exact = {}
+        if small:
+            cursor.execute(_union(f"SELECT %s, (SELECT COUNT(*) FROM {qn(t)})" for t in small), small)
+            exact = dict(cursor.fetchall())
+    return {
+        t: {"rows": exact[t], "exact": True} if t in exact else {"rows": estimates[t], "exact": False}
+        for t in tables
+    }
+
+
+def indexes(connection, stats=False):
+    # {table: [index]} in one query over the pragma table-valued functions;
+    # "stat" is the sqlite_stat1 row left by the last ANALYZE, if any
+    stat_join = "LEFT JOIN sqlite_stat1 s ON s.tbl = m.name AND s.idx = il.name" if stats else ""
+    stat_col = "s.stat" if stats else "NULL"
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT m.name, il.name, il."unique", il.origin, il.partial, ii.name, {stat_col}
+            FROM sqlite_master m
+            JOIN pragma_index_list(m.name) il
+            JOIN pragma_index_info(il.name) ii
+            {stat_join}
+            WHERE m.type = 'table' AND m.name NOT LIKE 'sqlite_%'
+            ORDER BY m.name, il.name, ii.seqno
+        """)
+        rows = cursor.fetchall()
+    result = {}
+    for table, name, unique, origin, partial, column, stat in rows:
+        found = result.setdefault(table, {})
+        index = found.get(name)
+        if index is None:
+            index = found[name] = {
+                "name": name, "columns": [], "unique": bool(unique), "partial": bool(partial),
+                # c: CREATE INDEX, u: UNIQUE constraint, pk: primary key
+                "origin": origin, "stat": stat,
+            }
+        index["columns"].append(column)
+    return {table: list(found.values()) for table, found in result.items()}
+
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return None
+
+
+def storage(connection):
+    # bytes on disk (None for in-memory databases) and page accounting
+    name = str(connection.settings_dict["NAME"])
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT page_count, page_size, freelist_count, journal_mode"
+            " FROM pragma_page_count(), pragma_page_size(), pragma_freelist_count(), pragma_journal_mode()"
+        )
+        page_count, page_size, freelist_count, journal_mode = cursor.fetchone()
+    return {
+        "file_bytes": _file_size(name),
+        "wal_bytes": _file_size(name + "-wal"),
+        "shm_bytes": _file_size(name + "-shm"),
+        "page_size": page_size,
+        "page_count": page_count,
+        "free_pages": freelist_count,
+        "journal_mode": journal_mode,
+    }
+
+
+def database(alias, exact_limit):
+    connection = connections[alias]
+    if connection.vendor != "sqlite":
+        return {"vendor": connection.vendor, "error": "Only SQLite databases are inspected"}
+    with connection.cursor() as cursor:
+        tables = connection.introspection.get_table_list(cursor)
+    names = sorted(t.name for t in tables if t.type == "t" and not t.name.startswith("sqlite_"))
+    analyzed = any(t.name == "sqlite_stat1" for t in tables)
+    return {
+        "vendor": connection.vendor,
+        "storage": storage(connection),
+        "tables": table_counts(connection, names, exact_limit),
+        "indexes": indexes(connection, stats=analyzed),
+        "analyzed": analyzed,
+    }
+
+
+def cache_hit_rates():
+    # per cache since this worker started; every worker counts on its own
+    caches = {}
+    for (cache, result), n in CACHE_LOOKUPS.items():
+        counts = caches.setdefault(cache, {"hits": 0, "misses": 0})
+        counts["hits" if result == "hit" else "misses"] += n
+    for counts in caches.values():
+        total = counts["hits"] + counts["misses"]
+        counts["hit_rate"] = round(counts["hits"] / total, 4) if total else None
+    return caches
+
+
+def _tail_lines(path, max_bytes):
+    # the complete lines within the last max_bytes of the file
+    with open(path, "rb") as f:
+        size = f.seek(0, 2)
+        start = max(0, size - max_bytes)
+        f.seek(start)
+        data = f.read()
+    lines = data.splitlines()
+    if start and lines:
+        # began mid-line
+        lines = lines[1:]
+    return lines
+
+
+def recent_slow_queries(limit, config=None):
+    # the newest `limit` entries of the slow query log, and how often each
+    # index (or a full scan of each table) shows up in the plans read
+    config = config or get_config()
+    path = Path(slow_queries.get_config()["PATH"])
+    entries = []
+    if path.is_file():
+        for line in _tail_lines(path, config["SLOW_LOG_TAIL_BYTES"]):
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+    index_uses, table_scans = {}, {}
+    for entry in entries:
+        for step in entry.get("plan") or ():
+            for name in _INDEX_RE.findall(step):
+                index_uses[name] = index_uses.get(name, 0) + 1
+            for name in _SCAN_RE.findall(step):
+                table_scans[name] = table_scans.get(name, 0) + 1
+    max_chars = config["MAX_SQL_CHARS"]
+    recent = [
+        {
+            "ts": entry.get("ts"),
+            "duration_ms": entry.get("duration_ms"),
+            "db": entry.get("db"),
+            "view": entry.get("view"),
+            "method": entry.get("method"),
+            "shape": (entry.get("shape") or slow_queries.normalize_sql(entry.get("sql", "")))[:max_chars],
+            "plan": entry.get("plan"),
+        }
+        for entry in reversed(entries[-limit:])
+    ]
+    return {
+        "entries_read": len(entries),
+        "recent": recent,
+        "index_uses": dict(sorted(index_uses.items(), key=lambda kv: -kv[1])),
+        "table_scans": dict(sorted(table_scans.items(), key=lambda kv: -kv[1])),
+    }
+
+
+def report(slow_limit=None, config=None):
+    config = config or get_config()
+    slow_limit = slow_limit or config["SLOW_QUERIES"]
+    return {
+        "databases": {alias: database(alias, config["EXACT_COUNT_LIMIT"]) for alias in settings.DATABASES},
+        "caches": cache_hit_rates(),
+        "slow_queries": recent_slow_queries(slow_limit, config),
+    }
@@ -0,0 +1,162 @@
+import csv
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from .models import Order, Prescription, Transaction
+
+
+# Full-history exports streamed in keyset chunks (id > cursor, ordered by
+# id), so memory stays flat however many rows there are and an interrupted
+# export resumes from the last id it wrote. "id" is always the first column
+# for that reason.
+
+CHUNK_SIZE = 1000
+
+FORMATS = ("csv", "jsonl")
+
+# export name -> model and column name -> ORM lookup
+EXPORTS = {
+    "orders": {
+        "model": Order,
+        "columns": {
+            "id": "id",
+            "order_id": "order_id",
+            "patient": "patient__username",
+            "patient_email": "patient__email",
+            "prescription_id": "prescription__prescription_id",
+            "medicine": "prescription__medicine__name",
+            "quantity": "prescription__quantity",
+            "total_amount": "total_amount",
+            "status": "status",
+            "branch": "branch",
+            "created_at": "created_at",
+            "updated_at": "updated_at",
+        },
+    },
+    "transactions": {
+        "model": Transaction,
+        "columns": {
+            "id": "id",
+            "transaction_id": "transaction_id",
+            "user": "wallet__user__username",
+            "type": "type",
+            "amount": "amount",
+            "status": "status",
+            "reference_id": "reference_id",
+            "description": "description",
+            "created_at": "created_at",
+        },
+    },
+    "prescriptions": {
+        "model": Prescription,
+        "columns": {
+            "id": "id",
+            "prescription_id": "prescription_id",
+            "doctor": "doctor__username",
+            "patient_national_id": "patient_national_id",
+            "medicine": "medicine__name",
+            "quantity": "quantity",
+            "dosage": "dosage",
+            "duration": "duration",
+            "status": "status",
+            "created_at": "created_at",
+        },
+    },
+}
+
+
+def parse_columns(name, raw=None):
+    # "a,b" -> ["id", "a", "b"]; every column when raw is empty
+    available = EXPORTS[name]["columns"]
+    if not raw:
+        return list(available)
+    columns = [c.strip() for c in raw.split(",") if c.strip()]
+    unknown = [c for c in columns if c not in available]
+    if unknown:
+        raise ValueError(f"Unknown columns for {name}: {', '.join(unknown)} (available: {', '.join(available)})")
+    return ["id"] + [c for c in dict.fromkeys(columns) if c != "id"]
+
+
+def rows(name, columns, start=None, end=None, after=0, limit=None, chunk_size=None):
+    # tuples in id order, one query per chunk; start/end bound created_at
+    chunk_size = chunk_size or CHUNK_SIZE
+    spec = EXPORTS[name]
+    qs = spec["model"].objects.all()
+    if start is not None:
+        qs = qs.filter(created_at__gte=start)
+    if end is not None:
+        qs = qs.filter(created_at__lte=end)
+    lookups = [spec["columns"][c] for c in columns]
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = chunk_size if remaining is None else min(chunk_size, remaining)
+        chunk = list(qs.filter(id__gt=after).order_by("id").values_list(*lookups)[:size])
+        yield from chunk
+        if len(chunk) < size:
+            return
+        after = chunk[-1][0]
+        if remaining is not None:
+            remaining -= len(chunk)
+
+
+def _plain(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+class _Line:
+    # csv.writer target that hands each formatted line back
+    def write(self, value):
+        return value
+
+
+def _one_line(value):
+    # one record per line keeps CSV exports resumable line by line
+    value = _plain(value)
+    return " ".join(value.splitlines()) if isinstance(value, str) else value
+
+
+def csv_lines(columns, row_iter):
+    writer = csv.writer(_Line(), lineterminator="\n")
+    yield writer.writerow(columns)
+    for row in row_iter:
+        yield writer.writerow([_one_line(v) for v in row])
+
+
+def jsonl_lines(columns, row_iter):
+    for row in row_iter:
+        yield json.dumps(dict(zip(columns, map(_plain, row))), ensure_ascii=False) + "\n"
+
+
+def lines(fmt, columns, row_iter):
+    return csv_lines(columns, row_iter) if fmt == "csv" else jsonl_lines(columns, row_iter)
+
+
+def resume_point(path, fmt):
+    # drops a partly written last line from an interrupted export file and
+    # returns the id it now ends at: (cursor, whether it has a CSV header)
+    with open(path, "rb+") as f:
+        start, tail = f.seek(0, 2), b""
+        # back far enough to hold the last complete line whole
+        while start and tail.count(b"\n") < 2:
+            step = min(start, 64 * 1024)
+            start -= step
+            f.seek(start)
+            tail = f.read(step) + tail
+        cut = tail.rfind(b"\n") + 1
+        if cut < len(tail):
+            f.truncate(start + cut)
+            tail = tail[:cut]
+    lines = tail.splitlines()
+    if not lines:
+        return 0, False
+    last = lines[-1].decode("utf-8", "replace")
+    if fmt == "jsonl":
+        return int(json.loads(last)["id"]), False
+    first = next(csv.reader([last]))[0]
+    # only the header so far
+    return (int(first), True) if first.isdigit() else (0, True)
@@ -0,0 +1,146 @@
+from datetime import date
+
+from django.db import models, transaction
+from django.utils import timezone
+
+from . import ledger, stock_shards
+from .models import BatchAllocation, Medicine, MedicineBatch
+from .stock_shards import InsufficientStock
+
+
+# First-expiry-first-out allocation for batch-tracked medicines. The
+# medicine's stock (Medicine.stock or its shards) stays the number checkouts
+# are checked against; batches record which lot each unit leaves from, and
+# an expired batch is never dispensed.
+
+# the lot holding units whose batch is unknown: the stock on hand when a
+# medicine starts being tracked and units a pharmacist adds by hand. Without
+# an expiry date on the medicine it is drawn from last
+OPENING_BATCH = "OPENING"
+UNKNOWN_EXPIRY = date(9999, 12, 31)
+
+# re-scans after a concurrent checkout emptied a batch between the scan and
+# its decrement
+MAX_ATTEMPTS = 3
+
+
+def sellable(medicine_id, today=None):
+    # the allocator's range scan, served by batch_fefo_idx
+    today = today or timezone.localdate()
+    return MedicineBatch.objects.filter(
+        medicine_id=medicine_id, quantity__gt=0, expiry_date__gte=today,
+    ).order_by("expiry_date", "id")
+
+
+def plan(batches, quantity):
+    # [(batch id, units)] taking from the earliest-expiring batches first
+    taken, remaining = [], quantity
+    for batch_id, available in batches:
+        if not remaining:
+            break
+        part = min(available, remaining)
+        taken.append((batch_id, part))
+        remaining -= part
+    return taken, remaining
+
+
+def allocate(order_item, quantity, today=None):
+    # must run inside a transaction; raises InsufficientStock (rolling back
+    # what was taken) when the sellable batches cannot cover the quantity
+    taken = {}
+    remaining = quantity
+    for _ in range(MAX_ATTEMPTS):
+        rows = list(sellable(order_item.medicine_id, today).values_list("id", "quantity"))
+        steps, short = plan(rows, remaining)
+        if short:
+            raise InsufficientStock(quantity - short)
+        for batch_id, part in steps:
+            # conditional: a concurrent checkout may have emptied it meanwhile
+            if MedicineBatch.objects.filter(id=batch_id, quantity__gte=part).update(
+                quantity=models.F("quantity") - part
+            ):
+                taken[batch_id] = taken.get(batch_id, 0) + part
+                remaining -= part
+        if not remaining:
+            break
+    if remaining:
+        raise InsufficientStock(quantity - remaining)
+    return BatchAllocation.objects.bulk_create([
+        BatchAllocation(order_item=order_item, batch_id=batch_id, quantity=part) for batch_id, part in taken.items()
+    ])
+
+
+def release(order_item_ids):
+    # puts the batch units of these order items back; returns them per batch
+    returned = {}
+    for batch_id, qty in BatchAllocation.objects.filter(order_item_id__in=order_item_ids).values_list("batch_id", "quantity"):
+        returned[batch_id] = returned.get(batch_id, 0) + qty
+    if returned:
+        MedicineBatch.objects.filter(id__in=returned).update(quantity=models.Case(
+            *[models.When(id=bid, then=models.F("quantity") + qty) for bid, qty in returned.items()],
+            default=models.F("quantity"),
+            output_field=models.IntegerField(),
+        ))
+    return returned
+
+
+def _add_to_opening_lot(medicine, quantity):
+    updated = MedicineBatch.objects.filter(medicine_id=medicine.id, batch_number=OPENING_BATCH).update(
+        quantity=models.F("quantity") + quantity
+    )
+    if not updated:
+        MedicineBatch.objects.create(medicine_id=medicine.id, batch_number=OPENING_BATCH, quantity=quantity,
+                                     expiry_date=medicine.expiry_date or UNKNOWN_EXPIRY)
+
+
+def adjust(medicine, delta):
+    # keeps the batches in step with a stock change made by hand (inside the
+    # same transaction): added units go to the opening lot, removed ones
+    # leave the earliest-expiring batches first, expired ones included
+    if delta > 0:
+        _add_to_opening_lot(medicine, delta)
+        return
+    remaining = -delta
+    batches = list(MedicineBatch.objects.select_for_update().filter(
+        medicine_id=medicine.id, quantity__gt=0,
+    ).order_by("expiry_date", "id").values_list("id", "quantity"))
+    for batch_id, available in batches:
+        if not remaining:
+            break
+        part = min(available, remaining)
+        MedicineBatch.objects.filter(id=batch_id).update(quantity=models.F("quantity") - part)
+        remaining -= part
+
+
+def receive(medicine, quantity, expiry_date, batch_number="", user=None):
+    # a new lot: the batch, the medicine's stock and the ledger in one go.
+    # The first one books the stock already on hand as the opening lot, so
+    # checkouts can keep drawing it
+    with transaction.atomic():
+        if Medicine.objects.filter(id=medicine.id, batch_tracked=False).update(batch_tracked=True):
+            # read after the update, which holds the row until the commit
+            on_hand = stock_shards.available(Medicine.objects.get(id=medicine.id))
+            if on_hand > 0:
+                _add_to_opening_lot(medicine, on_hand)
+        medicine.batch_tracked = True
+        batch = MedicineBatch.objects.create(
+            medicine=medicine, batch_number=batch_number, expiry_date=expiry_date, quantity=quantity,
+        )
+        stock_shards.put_back({medicine.id: quantity})
+        ledger.record(medicine.id, "receipt", quantity, reference_id=batch_number, user=user,
+                      note=f"Batch expiring {expiry_date}")
+    return batch
+
+
+def totals(medicine_ids, today=None):
+    # {medicine id: batch counts} aggregated per medicine in one query
+    today = today or timezone.localdate()
+    live = models.Q(batches__quantity__gt=0)
+    rows = Medicine.objects.filter(id__in=medicine_ids).values("id").annotate(
+        batch_count=models.Count("batches", filter=live),
+        in_batches=models.Sum("batches__quantity", filter=live, default=0),
+        sellable=models.Sum("batches__quantity", filter=live & models.Q(batches__expiry_date__gte=today), default=0),
+        expired=models.Sum("batches__quantity", filter=live & models.Q(batches__expiry_date__lt=today), default=0),
+        next_expiry=models.Min("batches__expiry_date", filter=live & models.Q(batches__expiry_date__gte=today)),
+    )
+    return {row.pop("id"): row for row in rows}
@@ -0,0 +1,178 @@
+import math
+from datetime import datetime, time, timedelta
+from statistics import NormalDist
+
+from django.conf import settings
+from django.db import models
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from . import stock_shards
+from .models import DemandForecast, Medicine, OrderItem
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# Demand forecasts and reorder points for the whole catalog. Daily sales come
+# from one aggregated OrderItem query as flat (medicine, day, quantity)
+# arrays; every per-medicine sum is a weighted np.bincount over them, so
+# medicines and days without sales cost nothing and the catalog is never
+# looped over in Python.
+
+DEFAULTS = {
+    # "sma": mean of the last WINDOW_DAYS, "ema": exponential smoothing
+    "METHOD": "ema",
+    "WINDOW_DAYS": 28,
+    "ALPHA": 0.1,
+    "HISTORY_DAYS": 730,
+    "LEAD_TIME_DAYS": 7,
+    # days of demand ordered on top of the reorder point
+    "REVIEW_DAYS": 14,
+    "SERVICE_LEVEL": 0.95,
+    "BATCH_SIZE": 1000,
+}
+
+METHODS = ("sma", "ema")
+
+# orders that took stock
+SOLD_STATUSES = ("pending", "processing", "completed")
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, "FORECASTING", {}) or {})
+    return config
+
+
+def available():
+    return np is not None
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def daily_sales(end, history_days):
+    # (medicine ids, age in days before `end`, units) of every medicine-day
+    # with sales in the history_days up to and including `end`
+    start = end - timedelta(days=history_days - 1)
+    rows = (
+        OrderItem.objects.filter(
+            order__created_at__gte=_day_start(start),
+            order__created_at__lt=_day_start(end + timedelta(days=1)),
+            order__status__in=SOLD_STATUSES,
+        )
+        .annotate(day=TruncDate("order__created_at")).order_by()
+        .values("medicine_id", "day").annotate(units=models.Sum("quantity"))
+        .values_list("medicine_id", "day", "units")
+    )
+    medicine_ids, days, units = [], [], []
+    end_ordinal = end.toordinal()
+    for medicine_id, day, qty in rows.iterator(chunk_size=10000):
+        medicine_ids.append(medicine_id)
+        days.append(end_ordinal - day.toordinal())
+        units.append(qty)
+    return np.array(medicine_ids, dtype=np.int64), np.array(days, dtype=np.int64), np.array(units, dtype=np.float64)
+
+
+def catalog_stock():
+    # (medicine ids ascending, stock), shard totals for sharded medicines
+    rows = list(Medicine.objects.order_by("id").values_list("id", "stock", "stock_shards"))
+    ids = np.array([r[0] for r in rows], dtype=np.int64)
+    stock = np.array([r[1] for r in rows], dtype=np.float64)
+    sharded = [r[0] for r in rows if r[2]]
+    if sharded:
+        totals = stock_shards.totals(sharded)
+        positions = np.searchsorted(ids, sharded)
+        stock[positions] = [totals.get(mid, 0) for mid in sharded]
+    return ids, stock
+
+
+def compute(ids, stock, sales, config=None):
+    # per-medicine arrays, aligned with ids (ascending), from the flat sales
+    # arrays of daily_sales()
+    config = config or get_config()
+    if config["METHOD"] not in METHODS:
+        raise ValueError(f"Unknown forecasting method: {config['METHOD']} (use one of {', '.join(METHODS)})")
+    sale_ids, age, units = sales
+    n = len(ids)
+    pos = np.searchsorted(ids, sale_ids)
+    # sales of medicines no longer in the catalog
+    known = pos < n
+    known[known] = ids[pos[known]] == sale_ids[known]
+    pos, age, units = pos[known], age[known], units[known]
+
+    window = config["WINDOW_DAYS"]
+    recent = age < window
+    mean = np.bincount(pos[recent], weights=units[recent], minlength=n) / window
+    mean_sq = np.bincount(pos[recent], weights=units[recent] ** 2, minlength=n) / window
+    std = np.sqrt(np.maximum(mean_sq - mean ** 2, 0.0))
+
+    if config["METHOD"] == "ema":
+        # smoothing a zero-filled daily series is a sum of decaying weights
+        # over the days that had sales
+        alpha = config["ALPHA"]
+        weights = alpha * (1.0 - alpha) ** age
+        daily = np.bincount(pos, weights=units * weights, minlength=n)
+    else:
+        daily = mean
+
+    lead = config["LEAD_TIME_DAYS"]
+    z = NormalDist().inv_cdf(config["SERVICE_LEVEL"])
+    safety = np.ceil(z * std * math.sqrt(lead))
+    reorder_point = np.ceil(daily * lead + safety)
+    order_up_to = reorder_point + daily * config["REVIEW_DAYS"]
+    suggested = np.where(stock <= reorder_point, np.ceil(np.maximum(order_up_to - stock, 0.0)), 0.0)
+    return {
+        "daily_demand": daily,
+        "demand_std": std,
+        "safety_stock": safety,
+        "reorder_point": reorder_point,
+        "suggested_order": suggested,
+    }
+
+
+def forecast(end=None, config=None):
+    # (ids, stock, results) for the whole catalog, from the days up to and
+    # including `end` (yesterday by default: today's sales are not complete)
+    if np is None:
+        raise RuntimeError("Demand forecasting needs NumPy: pip install numpy")
+    config = config or get_config()
+    end = end or timezone.localdate() - timedelta(days=1)
+    ids, stock = catalog_stock()
+    sales = daily_sales(end, config["HISTORY_DAYS"])
+    return ids, stock, compute(ids, stock, sales, config)
+
+
+def save(ids, stock, results, config=None):
+    # upserts one DemandForecast per medicine in batches
+    config = config or get_config()
+    now = timezone.now()
+    size = config["BATCH_SIZE"]
+    columns = {name: values.tolist() for name, values in results.items()}
+    stock = stock.tolist()
+    ids = ids.tolist()
+    for start in range(0, len(ids), size):
+        DemandForecast.objects.bulk_create(
+            [
+                DemandForecast(
+                    medicine_id=mid,
+                    method=config["METHOD"],
+                    daily_demand=round(columns["daily_demand"][i], 4),
+                    demand_std=round(columns["demand_std"][i], 4),
+                    safety_stock=int(columns["safety_stock"][i]),
+                    reorder_point=int(columns["reorder_point"][i]),
+                    suggested_order=int(columns["suggested_order"][i]),
+                    stock=int(stock[i]),
+                    computed_at=now,
+                )
+                for i, mid in enumerate(ids[start:start + size], start)
+            ],
+            update_conflicts=True, unique_fields=["medicine"],
+            update_fields=["method", "daily_demand", "demand_std", "safety_stock", "reorder_point",
+                           "suggested_order", "stock", "computed_at"],
+        )
+    return len(ids)
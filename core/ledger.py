@@ -0,0 +1,95 @@
+from django.db import models, transaction
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import stock_shards
+from .models import Medicine, StockMovement, StockSnapshot
+
+
+KINDS = [kind for kind, _ in StockMovement.KIND_CHOICES]
+
+
+def record(medicine_id, kind, quantity, reference_id="", user=None, note=""):
+    if not quantity:
+        return None
+    return StockMovement.objects.create(
+        medicine_id=medicine_id, kind=kind, quantity=quantity,
+        reference_id=reference_id, user=user, note=note,
+    )
+
+
+def record_many(movements, user=None):
+    # movements: (medicine_id, kind, quantity, reference_id) tuples
+    rows = [
+        StockMovement(medicine_id=mid, kind=kind, quantity=qty, reference_id=ref, user=user)
+        for mid, kind, qty, ref in movements if qty
+    ]
+    return StockMovement.objects.bulk_create(rows, batch_size=500)
+
+
+def _latest_snapshot(when):
+    return StockSnapshot.objects.filter(medicine=models.OuterRef("pk"), taken_at__lte=when).order_by("-taken_at", "-id")
+
+
+def _tail_sum(when):
+    # movements the snapshot did not count: recorded after it (higher id, even
+    # if backdated) or dated after it
+    not_in_snapshot = models.Q(id__gt=models.OuterRef("snap_last")) | models.Q(created_at__gt=models.OuterRef("snap_taken"))
+    return Coalesce(models.Subquery(
+        StockMovement.objects.filter(not_in_snapshot, medicine=models.OuterRef("pk"), created_at__lte=when)
+        .order_by().values("medicine").annotate(total=models.Sum("quantity")).values("total")
+    ), 0)
+
+
+def stock_at(when, medicine_ids=None):
+    # {medicine id: stock at `when`}: the latest snapshot taken by then plus
+    # the movements recorded after it, for every medicine in one query
+    snapshot = _latest_snapshot(when)
+    qs = Medicine.objects.annotate(
+        snap_stock=Coalesce(models.Subquery(snapshot.values("stock")[:1]), 0),
+        snap_last=Coalesce(models.Subquery(snapshot.values("last_movement_id")[:1]), 0),
+        snap_taken=models.Subquery(snapshot.values("taken_at")[:1]),
+    ).annotate(tail=_tail_sum(when))
+    if medicine_ids is not None:
+        qs = qs.filter(id__in=medicine_ids)
+    return {mid: snap + tail for mid, snap, tail in qs.values_list("id", "snap_stock", "tail")}
+
+
+def movement_report(start, end, medicine_ids=None):
+    # per medicine: stock at `start`, what moved in (start, end] by kind, and
+    # stock at `end`
+    opening = stock_at(start, medicine_ids)
+    movements = StockMovement.objects.filter(created_at__gt=start, created_at__lte=end)
+    if medicine_ids is not None:
+        movements = movements.filter(medicine_id__in=medicine_ids)
+    totals = {}
+    for mid, kind, qty in movements.order_by().values("medicine_id", "kind").annotate(
+        qty=models.Sum("quantity")
+    ).values_list("medicine_id", "kind", "qty"):
+        totals.setdefault(mid, {})[kind] = qty
+
+    rows = []
+    for mid, start_stock in opening.items():
+        moved = totals.get(mid, {})
+        row = {"medicine_id": mid, "opening": start_stock}
+        row.update({kind: moved.get(kind, 0) for kind in KINDS})
+        row["closing"] = start_stock + sum(moved.values())
+        rows.append(row)
+    return rows
+
+
+def take_snapshots(when=None):
+    # snapshots every medicine at the current end of the ledger; returns them
+    # together with the medicines whose Medicine.stock disagrees with it
+    when = when or timezone.now()
+    with transaction.atomic():
+        boundary = StockMovement.objects.aggregate(last=models.Max("id"))["last"] or 0
+        balances = stock_at(when)
+        snapshots = StockSnapshot.objects.bulk_create([
+            StockSnapshot(medicine_id=mid, stock=balance, last_movement_id=boundary, taken_at=when)
+            for mid, balance in balances.items()
+        ], batch_size=500)
+    # sharded medicines count their shards, not the Medicine.stock column
+    current = {m.id: m.stock for m in stock_shards.overlay(list(Medicine.objects.filter(id__in=balances)))}
+    drift = {mid: (balances[mid], current[mid]) for mid in balances if current.get(mid, balances[mid]) != balances[mid]}
+    return snapshots, drift
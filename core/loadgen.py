@@ -0,0 +1,206 @@
+import json
+import multiprocessing
+import socket
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+from urllib.parse import parse_qsl, urlencode
+
+from .benchmark import percentile
+from .traffic import REDACTED
+
+
+UNSAFE_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+LOCK_MARKERS = (b"database is locked", b"database table is locked")
+LOGIN_PATH = "/api/login/"
+# ensure_csrf_cookie view, used to obtain a csrftoken before the first POST
+CSRF_PATH = "/signin/"
+
+
+class Session:
+    # one replayed browser: its own cookie jar and CSRF token
+    def __init__(self, base_url, timeout):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.cookies = CookieJar()
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(self.cookies), _NoRedirect(),
+        )
+
+    def cookie(self, name):
+        for c in self.cookies:
+            if c.name == name:
+                return c.value
+        return None
+
+    def request(self, method, path, query="", body=None, content_type=None):
+        url = self.base_url + path + (f"?{query}" if query else "")
+        headers = {"Referer": self.base_url + "/", "Accept": "application/json"}
+        data = None
+        if method in UNSAFE_METHODS:
+            if self.cookie("csrftoken") is None:
+                self.request("GET", CSRF_PATH)
+            # login rotates the token, so read it again for every request
+            headers["X-CSRFToken"] = self.cookie("csrftoken") or ""
+            if body is not None:
+                data = body.encode("utf-8")
+                headers["Content-Type"] = content_type or "application/json"
+        req = urllib.request.Request(url, data=data, headers=headers, method=method)
+
+        start = time.perf_counter()
+        try:
+            with self.opener.open(req, timeout=self.timeout) as resp:
+                payload = resp.read()
+                status = resp.status
+        except urllib.error.HTTPError as e:
+            payload = e.read()
+            status = e.code
+        except socket.timeout:
+            return time.perf_counter() - start, None, "timeout"
+        except (urllib.error.URLError, OSError):
+            return time.perf_counter() - start, None, "connection_error"
+        elapsed = time.perf_counter() - start
+
+        lowered = payload.lower()
+        if any(marker in lowered for marker in LOCK_MARKERS):
+            return elapsed, status, "sqlite_locked"
+        if status >= 500:
+            return elapsed, status, "server_error"
+        if status == 429:
+            # replaying from one address runs into the per-IP RATE_LIMITS
+            return elapsed, status, "rate_limited"
+        return elapsed, status, None
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    # replay what was recorded; a redirect is a response, not a new request
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+def _rewrite_body(record, password):
+    body = record.get("body")
+    if body is None or password is None:
+        return body
+    content_type = record.get("content_type") or ""
+    if content_type.startswith("application/x-www-form-urlencoded"):
+        pairs = parse_qsl(body, keep_blank_values=True)
+        if ("password", REDACTED) in pairs:
+            return urlencode([(f, password if (f, v) == ("password", REDACTED) else v) for f, v in pairs])
+        return body
+    if not content_type.startswith("application/json"):
+        return body
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return body
+    if isinstance(data, dict) and data.get("password") == REDACTED:
+        data["password"] = password
+        return json.dumps(data)
+    return body
+
+
+def replay_flow(flow, options):
+    session = Session(options["url"], options["timeout"])
+    samples = []
+
+    if flow["user"]:
+        # the flow was already logged in when recording started
+        elapsed, status, kind = session.request(
+            "POST", LOGIN_PATH,
+            body=json.dumps({"email": flow["user"], "password": options["password"]}),
+        )
+        if kind is None and status != 200:
+            kind = "login_failed"
+        if kind:
+            samples.append(("(setup login)", "POST", elapsed * 1000, status, kind))
+            return samples
+
+    speed = options["speed"]
+    started = time.perf_counter()
+    first_ts = flow["requests"][0]["ts"]
+    for r in flow["requests"]:
+        if speed:
+            wait = (r["ts"] - first_ts) / speed - (time.perf_counter() - started)
+            if wait > 0:
+                time.sleep(wait)
+        elapsed, status, kind = session.request(
+            r["method"], r["path"], r.get("query", ""),
+            body=_rewrite_body(r, options["password"]), content_type=r.get("content_type"),
+        )
+        # a 4xx that was recorded as a 4xx is the traffic, not an error
+        if kind is None and status is not None and status >= 400 and r.get("status", 0) < 400:
+            kind = "unexpected_status"
+        samples.append((r.get("route") or r["path"], r["method"], elapsed * 1000, status, kind))
+    return samples
+
+
+def _run_process(flows, options):
+    samples = []
+    with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+        for result in pool.map(lambda f: replay_flow(f, options), flows):
+            samples.extend(result)
+    return samples
+
+
+def run(flows, options):
+    # options: url, processes, concurrency, speed, password, timeout
+    processes = max(1, options["processes"])
+    shards = [flows[i::processes] for i in range(processes)]
+    start = time.perf_counter()
+    if processes == 1:
+        results = [_run_process(shards[0], options)]
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.starmap(_run_process, [(shard, options) for shard in shards])
+    wall_time = time.perf_counter() - start
+    samples = [s for result in results for s in result]
+    return samples, wall_time
+
+
+def summarize(samples, wall_time):
+    endpoints = {}
+    for route, method, ms, status, kind in samples:
+        stats = endpoints.setdefault((method, route), {"latencies": [], "errors": {}, "statuses": {}})
+        stats["latencies"].append(ms)
+        stats["statuses"][str(status)] = stats["statuses"].get(str(status), 0) + 1
+        if kind:
+            stats["errors"][kind] = stats["errors"].get(kind, 0) + 1
+
+    rows = []
+    for (method, route), stats in endpoints.items():
+        latencies = sorted(stats["latencies"])
+        errors = sum(stats["errors"].values())
+        rows.append({
+            "endpoint": f"{method} {route}",
+            "requests": len(latencies),
+            "throughput_rps": len(latencies) / wall_time if wall_time else None,
+            "p50_ms": percentile(latencies, 50),
+            "p90_ms": percentile(latencies, 90),
+            "p95_ms": percentile(latencies, 95),
+            "p99_ms": percentile(latencies, 99),
+            "max_ms": latencies[-1],
+            "error_rate": errors / len(latencies),
+            "errors": stats["errors"],
+            "statuses": stats["statuses"],
+        })
+    rows.sort(key=lambda r: r["requests"], reverse=True)
+
+    total_errors = {}
+    for row in rows:
+        for kind, count in row["errors"].items():
+            total_errors[kind] = total_errors.get(kind, 0) + count
+    latencies = sorted(s[2] for s in samples)
+    return {
+        "requests": len(samples),
+        "wall_time_s": wall_time,
+        "throughput_rps": len(samples) / wall_time if wall_time else None,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "error_rate": sum(total_errors.values()) / len(samples) if samples else 0.0,
+        "errors": total_errors,
+        "endpoints": rows,
+    }
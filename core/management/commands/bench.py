@@ -0,0 +1,121 @@
+import json
+import logging
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import (
+    override_settings, setup_databases, teardown_databases, setup_test_environment, teardown_test_environment,
+)
+
+from core import benchmark
+from core.synthetic import SyntheticDataGenerator
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the end-to-end API benchmark against a synthetic dataset in a separate "
+        "test database and write JSON results (optionally compared to a baseline)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scale", choices=sorted(benchmark.SCALES), default="small")
+        parser.add_argument("--users", type=int)
+        parser.add_argument("--medicines", type=int)
+        parser.add_argument("--orders", type=int)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--iterations", type=int, default=20, help="Timed requests per case.")
+        parser.add_argument("--warmup", type=int, default=2)
+        parser.add_argument("--only", nargs="*", help="Case labels or URL names to run.")
+        parser.add_argument("--db-name", help="SQLite file for the benchmark database (default: in memory).")
+        parser.add_argument("--keepdb", action="store_true", help="Reuse the benchmark database and its data.")
+        parser.add_argument("--output", help="Results file (default: benchmarks/<timestamp>-<commit>.json).")
+        parser.add_argument("--baseline", help="Baseline results to compare against.")
+        parser.add_argument("--save-baseline", action="store_true", help="Also write results to benchmarks/baseline.json.")
+        parser.add_argument("--max-regression", type=float, default=0.2,
+                            help="Allowed latency growth vs. baseline as a fraction (default 0.2).")
+        parser.add_argument("--fail-on-regression", action="store_true")
+
+    def handle(self, *args, **options):
+        scale = dict(benchmark.SCALES[options["scale"]])
+        for key in ("users", "medicines", "orders"):
+            if options[key] is not None:
+                scale[key] = options[key]
+
+        if options["db_name"]:
+            settings.DATABASES["default"].setdefault("TEST", {})["NAME"] = options["db_name"]
+
+        # budget warnings are expected on the N+1 endpoints and would drown the report
+        logging.getLogger("core.timing").setLevel(logging.ERROR)
+        setup_test_environment()
+        old_config = setup_databases(verbosity=1, interactive=False, keepdb=options["keepdb"])
+        try:
+            report = self.run(scale, options)
+        finally:
+            teardown_databases(old_config, verbosity=1, keepdb=options["keepdb"])
+            teardown_test_environment()
+
+        output = Path(options["output"]) if options["output"] else (
+            Path(settings.BASE_DIR) / "benchmarks"
+            / f"{time.strftime('%Y%m%d-%H%M%S')}-{report['meta']['commit'] or 'nocommit'}.json"
+        )
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, indent=2))
+        self.stdout.write(f"Results written to {output}")
+        if options["save_baseline"]:
+            baseline_path = Path(settings.BASE_DIR) / "benchmarks" / "baseline.json"
+            baseline_path.write_text(json.dumps(report, indent=2))
+            self.stdout.write(f"Baseline written to {baseline_path}")
+
+        if options["baseline"]:
+            self.compare(report, options)
+
+        # every route must have a case (see core.benchmark._cases)
+        if report["meta"]["uncovered_urls"]:
+            raise CommandError(f"Not benchmarked: {', '.join(report['meta']['uncovered_urls'])}")
+
+    def run(self, scale, options):
+        from django.contrib.auth.models import User
+
+        if User.objects.filter(username__startswith="bench_synth_").exists():
+            self.stdout.write("Reusing existing benchmark dataset")
+            counts = {"reused": True}
+        else:
+            self.stdout.write(f"Seeding {scale} ...")
+            start = time.perf_counter()
+            counts = SyntheticDataGenerator(
+                seed=options["seed"], prefix="bench_synth", stdout=self.stdout, **scale
+            ).generate()
+            self.stdout.write(f"Seeded in {time.perf_counter() - start:.1f}s")
+
+        ctx = benchmark.BenchContext(options["iterations"])
+        ctx.setup()
+        # every case repeats far more often than RATE_LIMITS allow, and must
+        # not drain the buckets real clients share
+        with override_settings(RATE_LIMITS={**getattr(settings, "RATE_LIMITS", {}), "ENABLED": False}):
+            results = benchmark.run_cases(
+                ctx, options["iterations"], warmup=options["warmup"], only=options["only"], stdout=self.stdout,
+            )
+        report = benchmark.build_report(results, scale, counts, options["iterations"])
+        return report
+
+    def compare(self, report, options):
+        try:
+            baseline = json.loads(Path(options["baseline"]).read_text())
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Cannot read baseline: {e}")
+
+        rows, regressions = benchmark.compare(report, baseline, options["max_regression"])
+        self.stdout.write(f"\nCompared with {baseline['meta'].get('commit')} ({baseline['meta'].get('timestamp')})")
+        for row in rows:
+            self.stdout.write(
+                f"{row['case']:<26} p50 {row.get('p50_ms', 0):+7.1%}  p95 {row.get('p95_ms', 0):+7.1%}  "
+                f"queries {row.get('queries', 0):+.1f}"
+            )
+        if regressions:
+            self.stdout.write(self.style.WARNING("\nRegressions:\n  " + "\n  ".join(regressions)))
+            if options["fail_on_regression"]:
+                raise CommandError(f"{len(regressions)} benchmark regression(s)")
+        else:
+            self.stdout.write(self.style.SUCCESS("No regressions"))
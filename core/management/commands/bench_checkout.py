@@ -0,0 +1,48 @@
+import logging
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test.utils import (
+    setup_databases, teardown_databases, setup_test_environment, teardown_test_environment,
+)
+
+from core import contention
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark concurrent checkouts of one hot medicine in a separate test database, "
+        "with a single stock counter and with the stock spread over shards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8, help="Concurrent patients.")
+        parser.add_argument("--orders", type=int, default=25, help="Checkouts per patient and round.")
+        parser.add_argument("--shards", type=int, nargs="*", default=[8],
+                            help="Shard counts to compare with the unsharded baseline.")
+        parser.add_argument("--db-name", help="SQLite file for the benchmark database (default: a temporary file; "
+                                              "threads cannot share an in-memory database).")
+
+    def handle(self, *args, **options):
+        db_name = options["db_name"] or os.path.join(tempfile.gettempdir(), "pharmacy_bench_checkout.sqlite3")
+        settings.DATABASES["default"].setdefault("TEST", {})["NAME"] = db_name
+
+        logging.getLogger("core.timing").setLevel(logging.ERROR)
+        setup_test_environment()
+        old_config = setup_databases(verbosity=1, interactive=False)
+        try:
+            ctx = contention.CheckoutContext(options["threads"], options["orders"], time.strftime("%H%M%S")).setup()
+            for shards in [0] + [s for s in options["shards"] if s]:
+                r = contention.run(ctx, shards)
+                self.stdout.write(
+                    f"shards={r['shards']:<3} ok={r['ok']:<5} failed={r['failed']:<4} "
+                    f"rate={r['checkouts_per_s']:8.1f}/s p50={r['p50_ms']:8.2f}ms p95={r['p95_ms']:8.2f}ms "
+                    f"max={r['max_ms']:8.2f}ms statuses={r['statuses']} "
+                    f"stock {'consistent' if r['stock_consistent'] else 'INCONSISTENT'}"
+                )
+        finally:
+            teardown_databases(old_config, verbosity=1)
+            teardown_test_environment()
@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from core import assets
+
+
+class Command(BaseCommand):
+    help = (
+        "Bundle and minify the per-role JS and the CSS, collect static files under "
+        "content-hashed names and write gzip/brotli copies next to them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--no-minify", action="store_true", help="Concatenate the bundles without minifying.")
+        parser.add_argument("--no-collect", action="store_true", help="Only build the bundles.")
+        parser.add_argument("--no-precompress", action="store_true", help="Skip writing .gz/.br files.")
+
+    def handle(self, *args, **options):
+        config = assets.get_config()
+        if options["no_minify"]:
+            config["MINIFY"] = False
+
+        for name, target in assets.build_bundles(config, force=True).items():
+            size = sum(assets.source_path(s).stat().st_size for s in assets.BUNDLES[name])
+            self.stdout.write(f"{name:<28} {size:>8} -> {target.stat().st_size:>8} bytes")
+        if options["no_collect"]:
+            return
+
+        call_command("collectstatic", interactive=False, verbosity=0)
+        self.stdout.write(f"Collected static files into {settings.STATIC_ROOT} (staticfiles.json has the hashed names)")
+        if options["no_precompress"]:
+            return
+
+        written = assets.precompress(settings.STATIC_ROOT, config)
+        before = sum(original for _, original, _ in written)
+        after = sum(size for _, _, size in written)
+        self.stdout.write(f"Precompressed {len(written)} files ({before} -> {after} bytes)")
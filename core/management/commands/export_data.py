@@ -0,0 +1,73 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core import exports
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream orders, transactions or prescriptions as CSV or JSONL in id order, "
+        "in constant memory; --resume continues an interrupted --output file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("name", choices=sorted(exports.EXPORTS))
+        parser.add_argument("--format", choices=exports.FORMATS, default="csv")
+        parser.add_argument("--columns", help="Comma-separated columns (id is always included). Default: all.")
+        parser.add_argument("--from", dest="start", help="First creation date, YYYY-MM-DD.")
+        parser.add_argument("--to", dest="end", help="Last creation date, YYYY-MM-DD.")
+        parser.add_argument("--after", type=int, default=0, help="Only rows with a greater id (the resume cursor).")
+        parser.add_argument("--limit", type=int, help="Stop after this many rows.")
+        parser.add_argument("--chunk-size", type=int, help=f"Rows per query (default {exports.CHUNK_SIZE}).")
+        parser.add_argument("--output", help="File to write (default: stdout).")
+        parser.add_argument("--resume", action="store_true",
+                            help="Append to --output after the last complete row it holds.")
+
+    def _date(self, value, end_of_day=False):
+        if not value:
+            return None
+        try:
+            day = datetime.strptime(value, "%Y-%m-%d").date()
+        except ValueError:
+            raise CommandError(f"Invalid date {value!r}, expected YYYY-MM-DD")
+        return timezone.make_aware(datetime.combine(day, datetime.max.time() if end_of_day else datetime.min.time()))
+
+    def handle(self, *args, **options):
+        try:
+            columns = exports.parse_columns(options["name"], options["columns"])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        after, header_written = options["after"], False
+        if options["resume"]:
+            if not options["output"]:
+                raise CommandError("--resume needs --output")
+            try:
+                after, header_written = exports.resume_point(options["output"], options["format"])
+            except FileNotFoundError:
+                pass
+            self.stderr.write(f"Resuming after id {after}")
+
+        rows = exports.rows(
+            options["name"], columns, start=self._date(options["start"]), end=self._date(options["end"], True),
+            after=after, limit=options["limit"], chunk_size=options["chunk_size"],
+        )
+        lines = exports.lines(options["format"], columns, rows)
+        if header_written:
+            next(lines)
+
+        written = 0
+        if options["output"]:
+            with open(options["output"], "a" if options["resume"] else "w", encoding="utf-8", newline="") as out:
+                for line in lines:
+                    out.write(line)
+                    written += 1
+        else:
+            for line in lines:
+                self.stdout.write(line, ending="")
+                written += 1
+        if options["format"] == "csv" and not header_written:
+            written -= 1
+        self.stderr.write(f"Wrote {max(written, 0)} {options['name']} rows")
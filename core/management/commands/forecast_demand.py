@@ -0,0 +1,66 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import forecasting
+from core.models import Medicine
+
+
+class Command(BaseCommand):
+    help = (
+        "Forecast every medicine's daily demand from its order history and store its safety "
+        "stock, reorder point and suggested order quantity (run nightly; needs NumPy)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--method", choices=forecasting.METHODS)
+        parser.add_argument("--window", type=int, help="Days averaged by sma and used for the demand spread.")
+        parser.add_argument("--alpha", type=float, help="Smoothing factor of ema, between 0 and 1.")
+        parser.add_argument("--history", type=int, help="Days of order history read.")
+        parser.add_argument("--lead-time", type=int, help="Days between ordering and receiving stock.")
+        parser.add_argument("--service-level", type=float, help="Chance of not running out during the lead time.")
+        parser.add_argument("--date", help="Last day of history, YYYY-MM-DD (default yesterday).")
+        parser.add_argument("--dry-run", action="store_true", help="Print the medicines to reorder without saving.")
+        parser.add_argument("--top", type=int, default=20, help="Reorder suggestions printed (default 20).")
+
+    def handle(self, *args, **options):
+        if not forecasting.available():
+            raise CommandError("Demand forecasting needs NumPy: pip install numpy")
+        config = forecasting.get_config()
+        for option, key in [("method", "METHOD"), ("window", "WINDOW_DAYS"), ("alpha", "ALPHA"),
+                            ("history", "HISTORY_DAYS"), ("lead_time", "LEAD_TIME_DAYS"),
+                            ("service_level", "SERVICE_LEVEL")]:
+            if options[option] is not None:
+                config[key] = options[option]
+        if not 0 < config["ALPHA"] <= 1:
+            raise CommandError("--alpha must be in (0, 1].")
+        if not 0 < config["SERVICE_LEVEL"] < 1:
+            raise CommandError("--service-level must be between 0 and 1.")
+        if config["WINDOW_DAYS"] < 1 or config["HISTORY_DAYS"] < config["WINDOW_DAYS"]:
+            raise CommandError("--window must be at least 1 and no longer than --history.")
+        try:
+            end = date.fromisoformat(options["date"]) if options["date"] else None
+        except ValueError:
+            raise CommandError("--date must be YYYY-MM-DD.")
+
+        start = time.perf_counter()
+        ids, stock, results = forecasting.forecast(end, config)
+        elapsed = time.perf_counter() - start
+        reorder = results["suggested_order"] > 0
+        self.stdout.write(
+            f"Forecast {len(ids)} medicines ({config['METHOD']}) in {elapsed:.2f}s; {int(reorder.sum())} to reorder."
+        )
+
+        largest = forecasting.np.argsort(-results["suggested_order"], kind="stable")[:options["top"]]
+        order = [i for i in largest if reorder[i]]
+        names = dict(Medicine.objects.filter(id__in=[int(ids[i]) for i in order]).values_list("id", "name"))
+        for i in order:
+            self.stdout.write(
+                f"  {names.get(int(ids[i]), ids[i])}: stock {int(stock[i])}, reorder point "
+                f"{int(results['reorder_point'][i])}, order {int(results['suggested_order'][i])}"
+            )
+
+        if not options["dry_run"]:
+            saved = forecasting.save(ids, stock, results, config)
+            self.stdout.write(self.style.SUCCESS(f"Saved {saved} forecasts."))
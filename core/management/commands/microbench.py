@@ -0,0 +1,39 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import microbench
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the request helpers and per-row serializers in core.api_views against "
+        "their reference implementations, after checking both return identical output."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--number", type=int, default=2000, help="Loops over the inputs per timing run.")
+        parser.add_argument("--only", nargs="*", help="Helper names to run (e.g. _parse_date).")
+        parser.add_argument("--output", help="Also write the results as JSON.")
+
+    def handle(self, *args, **options):
+        mismatches = microbench.check()
+        if mismatches:
+            for name, value, expected, actual in mismatches:
+                self.stderr.write(f"{name}({value!r}): expected {expected}, got {actual}")
+            raise CommandError(f"{len(mismatches)} fast path(s) differ from the reference implementation")
+        self.stdout.write("Fast paths match the reference implementations.\n")
+
+        results = microbench.run(number=options["number"], only=options["only"])
+        self.stdout.write(f"{'helper':<28} {'fast ns/call':>13} {'reference':>11} {'speedup':>8}")
+        for row in results:
+            reference = f"{row['reference_ns']:>11.0f}" if "reference_ns" in row else f"{'-':>11}"
+            speedup = f"{row['speedup']:>7.2f}x" if row.get("speedup") else f"{'-':>8}"
+            self.stdout.write(f"{row['name']:<28} {row['fast_ns']:>13.0f} {reference} {speedup}")
+
+        if options["output"]:
+            output = Path(options["output"])
+            output.parent.mkdir(parents=True, exist_ok=True)
+            output.write_text(json.dumps(results, indent=2))
+            self.stdout.write(f"Results written to {output}")
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from core.profiling import get_config, make_token
+
+
+class Command(BaseCommand):
+    help = "Print a signed X-Profile-Request header value for profiling single requests."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--label", default="profile", help="Free-form label embedded in the token.")
+
+    def handle(self, *args, **options):
+        token = make_token(options["label"])
+        max_age = get_config()["TOKEN_MAX_AGE"]
+        self.stdout.write(token)
+        self.stderr.write(f"Send it as 'X-Profile-Request: {token}' (valid for {max_age} seconds).")
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from core import patient_summary
+from core.models import PatientSummary
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the per-patient stats counters from orders and prescriptions in "
+        "batches, e.g. after bulk imports or admin edits; --check only reports drift."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--check", action="store_true", help="Report rows that disagree without changing them.")
+
+    def handle(self, *args, **options):
+        if options["check"]:
+            user_ids = list(PatientSummary.objects.order_by("user_id").values_list("user_id", flat=True))
+            found = 0
+            for start in range(0, len(user_ids), options["batch_size"]):
+                for uid, diff in patient_summary.drift(user_ids[start:start + options["batch_size"]]).items():
+                    found += 1
+                    changes = ", ".join(f"{field} {stored} != {actual}" for field, (stored, actual) in diff.items())
+                    self.stdout.write(f"  user {uid}: {changes}")
+            self.stdout.write(f"{found} of {len(user_ids)} summaries drifted.")
+            return
+
+        done = patient_summary.rebuild_all(options["batch_size"], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {done} patient summaries."))
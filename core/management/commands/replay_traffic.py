@@ -0,0 +1,92 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import loadgen
+from core.synthetic import SYNTHETIC_PASSWORD
+from core.traffic import build_flows, get_config, load_records, log_files
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay traffic recorded by TrafficRecorderMiddleware against a running server "
+        "and report throughput, latency percentiles and error rates per endpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", help="Traffic log (defaults to TRAFFIC_RECORDING['PATH']).")
+        parser.add_argument("--url", default="http://127.0.0.1:8000", help="Server to replay against.")
+        parser.add_argument("--processes", type=int, default=4)
+        parser.add_argument("--concurrency", type=int, default=8, help="Concurrent sessions per process.")
+        parser.add_argument("--speed", type=float, default=0,
+                            help="Keep recorded gaps within a session, sped up by this factor (0: no waiting).")
+        parser.add_argument("--loops", type=int, default=1, help="Replay the recorded sessions this many times.")
+        parser.add_argument("--limit", type=int, help="Only replay the first N sessions.")
+        parser.add_argument("--password", default=SYNTHETIC_PASSWORD,
+                            help="Password sent for redacted login bodies (default: the seed password).")
+        parser.add_argument("--timeout", type=float, default=30)
+        parser.add_argument("--output", help="Also write the report as JSON.")
+
+    def handle(self, *args, **options):
+        path = options["path"] or get_config()["PATH"]
+        files = log_files(path)
+        if not files:
+            raise CommandError(f"No traffic log found at {path}")
+        flows = build_flows(load_records(files))[:options["limit"]]
+        if not flows:
+            raise CommandError("Traffic log is empty.")
+        flows = flows * max(1, options["loops"])
+
+        self.stdout.write(
+            f"Replaying {sum(len(f['requests']) for f in flows)} requests in {len(flows)} sessions "
+            f"against {options['url']} ({options['processes']} processes x {options['concurrency']} sessions)"
+        )
+        samples, wall_time = loadgen.run(flows, {
+            "url": options["url"],
+            "processes": options["processes"],
+            "concurrency": options["concurrency"],
+            "speed": options["speed"],
+            "password": options["password"],
+            "timeout": options["timeout"],
+        })
+        report = loadgen.summarize(samples, wall_time)
+
+        self.stdout.write(
+            f"\n{report['requests']} requests in {wall_time:.1f}s, {report['throughput_rps']:.1f} req/s, "
+            f"p50 {report['p50_ms']:.1f}ms, p95 {report['p95_ms']:.1f}ms, p99 {report['p99_ms']:.1f}ms, "
+            f"errors {report['error_rate']:.2%}\n"
+        )
+        self.stdout.write(
+            f"{'endpoint':<44} {'reqs':>6} {'req/s':>7} {'p50':>8} {'p90':>8} {'p95':>8} {'p99':>8} {'err':>7}"
+        )
+        for row in report["endpoints"]:
+            self.stdout.write(
+                f"{row['endpoint'][:44]:<44} {row['requests']:>6} {row['throughput_rps']:>7.1f} "
+                f"{row['p50_ms']:>8.1f} {row['p90_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} "
+                f"{row['error_rate']:>7.1%}"
+            )
+        if report["errors"]:
+            self.stdout.write(self.style.WARNING(
+                "\nErrors: " + ", ".join(f"{kind}={count}" for kind, count in sorted(report["errors"].items()))
+            ))
+            locked = report["errors"].get("sqlite_locked", 0)
+            if locked:
+                self.stdout.write(self.style.WARNING(
+                    f"{locked} requests failed with 'database is locked' "
+                    f"({locked / report['requests']:.2%} of all requests)"
+                ))
+            limited = report["errors"].get("rate_limited", 0)
+            if limited:
+                # the server's own settings apply; a replay comes from one
+                # address and shares the buckets of real clients
+                self.stdout.write(self.style.WARNING(
+                    f"{limited} requests were rate limited (429): replay against a server running "
+                    f"with RATE_LIMITS['ENABLED'] = False (the default under DEBUG)"
+                ))
+
+        if options["output"]:
+            output = Path(options["output"])
+            output.parent.mkdir(parents=True, exist_ok=True)
+            output.write_text(json.dumps(report, indent=2))
+            self.stdout.write(f"Report written to {output}")
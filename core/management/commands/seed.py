@@ -0,0 +1,90 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core.synthetic import SyntheticDataGenerator, SYNTHETIC_PASSWORD
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a large, consistent synthetic dataset (users with profiles and wallets, "
+        "medicines, prescriptions, orders, order items and transactions)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--medicines", type=int, default=2000)
+        parser.add_argument("--orders", type=int, default=10000)
+        parser.add_argument("--prescriptions", type=int, help="Defaults to 1.2 x orders (the extra ones stay active).")
+        parser.add_argument("--days", type=int, default=730, help="Spread timestamps over this many past days.")
+        parser.add_argument("--doctor-ratio", type=float, default=0.08)
+        parser.add_argument("--pharmacist-ratio", type=float, default=0.02)
+        parser.add_argument("--hot-medicines", type=float, default=0.02,
+                            help="Fraction of medicines that are 'hot' (default 0.02).")
+        parser.add_argument("--hot-medicine-share", type=float, default=0.5,
+                            help="Share of prescriptions going to hot medicines (default 0.5).")
+        parser.add_argument("--heavy-patients", type=float, default=0.05,
+                            help="Fraction of patients that are heavy buyers (default 0.05).")
+        parser.add_argument("--heavy-patient-share", type=float, default=0.4,
+                            help="Share of prescriptions going to heavy patients (default 0.4).")
+        parser.add_argument("--seed", type=int, default=42, help="Random seed; same seed, same data.")
+        parser.add_argument("--prefix", default="synth", help="Username prefix for generated users.")
+        parser.add_argument("--chunk-size", type=int, default=5000)
+        parser.add_argument("--database", default="default")
+        parser.add_argument("--fast", action="store_true",
+                            help="SQLite only: PRAGMA synchronous=OFF while seeding (not crash safe).")
+
+    def handle(self, *args, **options):
+        using = options["database"]
+        if User.objects.using(using).filter(username__startswith=f"{options['prefix']}_").exists():
+            raise CommandError(
+                f"Users with prefix '{options['prefix']}_' already exist; use another --prefix."
+            )
+        for key in ("users", "medicines", "orders", "chunk_size"):
+            if options[key] < 1:
+                raise CommandError(f"--{key.replace('_', '-')} must be positive")
+
+        connection = connections[using]
+        fast = options["fast"] and connection.vendor == "sqlite"
+        if fast:
+            with connection.cursor() as cursor:
+                # put back whatever the connection used before, not a fixed level
+                cursor.execute("PRAGMA synchronous")
+                synchronous = cursor.fetchone()[0]
+                cursor.execute("PRAGMA synchronous = OFF")
+
+        generator = SyntheticDataGenerator(
+            users=options["users"],
+            medicines=options["medicines"],
+            orders=options["orders"],
+            prescriptions=options["prescriptions"],
+            doctor_ratio=options["doctor_ratio"],
+            pharmacist_ratio=options["pharmacist_ratio"],
+            days=options["days"],
+            seed=options["seed"],
+            hot_medicine_ratio=options["hot_medicines"],
+            hot_medicine_share=options["hot_medicine_share"],
+            heavy_patient_ratio=options["heavy_patients"],
+            heavy_patient_share=options["heavy_patient_share"],
+            prefix=options["prefix"],
+            chunk_size=options["chunk_size"],
+            using=using,
+            stdout=self.stdout,
+        )
+        start = time.perf_counter()
+        try:
+            counts = generator.generate()
+        finally:
+            if fast:
+                with connection.cursor() as cursor:
+                    cursor.execute(f"PRAGMA synchronous = {int(synchronous)}")
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {counts['users']} users, {counts['medicines']} medicines, "
+            f"{counts['prescriptions']} prescriptions, {counts['orders']} orders and "
+            f"{counts['transactions']} transactions in {elapsed:.1f}s"
+        ))
+        self.stdout.write(f"All generated users log in with password '{SYNTHETIC_PASSWORD}'.")
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core import stock_shards
+from core.models import Medicine
+
+
+class Command(BaseCommand):
+    help = (
+        "Spread a hot medicine's stock over N sub-counters so concurrent checkouts do not "
+        "all update the same row, undo it with --shards 0, or copy shard totals back into "
+        "Medicine.stock with --sync."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("medicine_ids", nargs="*", type=int)
+        parser.add_argument("--shards", type=int, default=stock_shards.DEFAULT_SHARDS,
+                            help=f"Sub-counters per medicine, 0 to merge them back (default {stock_shards.DEFAULT_SHARDS}).")
+        parser.add_argument("--sync", action="store_true",
+                            help="Only refresh Medicine.stock of sharded medicines (all when no ids are given).")
+
+    def handle(self, *args, **options):
+        if options["sync"]:
+            synced = stock_shards.sync(options["medicine_ids"] or None)
+            self.stdout.write(f"Synced {len(synced)} sharded medicines.")
+            return
+        if not options["medicine_ids"]:
+            raise CommandError("Give the ids of the medicines to shard.")
+        if options["shards"] < 0:
+            raise CommandError("--shards must be 0 or more.")
+
+        for medicine in Medicine.objects.filter(id__in=options["medicine_ids"]):
+            if options["shards"]:
+                stock_shards.enable(medicine, options["shards"])
+            else:
+                stock_shards.disable(medicine)
+            medicine.refresh_from_db()
+            self.stdout.write(f"{medicine.name}: {options['shards'] or 'no'} shards, stock {stock_shards.available(medicine)}")
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.slow_queries import get_config, log_files, summarize
+
+
+class Command(BaseCommand):
+    help = "Summarise the slow query log by query shape (worst total time first)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", help="Slow query log file (defaults to SLOW_QUERY_LOG['PATH']).")
+        parser.add_argument("--top", type=int, default=20, help="Number of shapes to show.")
+        parser.add_argument("--sort", choices=["total", "count", "max"], default="total")
+        parser.add_argument("--plans", action="store_true", help="Print the EXPLAIN plan of the slowest sample.")
+
+    def handle(self, *args, **options):
+        path = options["path"] or get_config()["PATH"]
+        files = log_files(path)
+        if not files:
+            raise CommandError(f"No slow query log found at {path}")
+
+        shapes = summarize(files, sort=options["sort"])
+        if not shapes:
+            self.stdout.write("Slow query log is empty.")
+            return
+
+        total = sum(s["total_ms"] for s in shapes)
+        self.stdout.write(
+            f"{sum(s['count'] for s in shapes)} slow queries, {len(shapes)} shapes, {total:.1f} ms total\n"
+        )
+        for rank, s in enumerate(shapes[:options["top"]], 1):
+            self.stdout.write(
+                f"#{rank}  total={s['total_ms']:.1f}ms  count={s['count']}  "
+                f"mean={s['mean_ms']:.1f}ms  max={s['max_ms']:.1f}ms  "
+                f"share={100 * s['total_ms'] / total if total else 0:.1f}%"
+            )
+            if s["views"]:
+                self.stdout.write(f"    views: {', '.join(s['views'])}")
+            self.stdout.write(f"    {s['shape'][:500]}")
+            if options["plans"] and s["plan"]:
+                for row in s["plan"]:
+                    self.stdout.write(f"      plan: {row}")
+            self.stdout.write("")
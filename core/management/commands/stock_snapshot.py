@@ -0,0 +1,38 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import models
+from django.utils import timezone
+
+from core import ledger
+from core.models import StockSnapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Snapshot every medicine's ledger balance (run periodically, e.g. nightly) so "
+        "point-in-time stock reads one snapshot plus the movements after it, and report "
+        "medicines whose Medicine.stock disagrees with the ledger."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--keep-days", type=int,
+                            help="Also delete snapshots older than this, keeping each medicine's latest one before it.")
+
+    def handle(self, *args, **options):
+        snapshots, drift = ledger.take_snapshots()
+        self.stdout.write(f"Snapshotted {len(snapshots)} medicines.")
+
+        if drift:
+            self.stdout.write(self.style.WARNING(f"{len(drift)} medicines differ from their ledger balance:"))
+            for mid, (balance, stock) in sorted(drift.items()):
+                self.stdout.write(f"  medicine {mid}: ledger {balance}, Medicine.stock {stock} ({stock - balance:+d})")
+
+        if options["keep_days"] is not None:
+            cutoff = timezone.now() - timedelta(days=options["keep_days"])
+            # the newest snapshot before the cutoff still anchors queries for dates before it
+            anchors = StockSnapshot.objects.filter(taken_at__lt=cutoff).values("medicine_id").annotate(
+                last=models.Max("id")
+            ).values("last")
+            deleted, _ = StockSnapshot.objects.filter(taken_at__lt=cutoff).exclude(id__in=anchors).delete()
+            self.stdout.write(f"Deleted {deleted} snapshots older than {options['keep_days']} days.")
@@ -0,0 +1,224 @@
+import bisect
+import threading
+
+
+# in-process metric registry rendered in the Prometheus text format (v0.0.4).
+# every gunicorn/uwsgi worker keeps its own registry; Prometheus sums them
+# when each worker is scraped, or scrape a single-process runserver.
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        with self._lock:
+            items = list(self._values.items())
+        if not items and not self.labelnames and self.type != "histogram":
+            items = [((), 0)]
+        for key, value in sorted(items):
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = self._key(labels)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def items(self):
+        # [(label values, count)]
+        with self._lock:
+            return list(self._values.items())
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels):
+        key = self._key(labels)
+        with self._lock:
+            return self._values.get(key, 0)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [per-bucket counts (+Inf last), sum, count]
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][idx] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _render_sample(self, key, state):
+        counts, total, count = state
+        lines = []
+        cumulative = 0
+        for bound, n in zip(self.buckets + (float("inf"),), counts):
+            cumulative += n
+            labels = _format_labels(self.labelnames, key, ("le", _format_value(float(bound))))
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(float(total))}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _get_or_create(self, cls, name, documentation, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} already registered as {metric.type}")
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def clear(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.clear()
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# HTTP
+REQUESTS_TOTAL = REGISTRY.counter(
+    "pharmacy_http_requests_total", "HTTP requests by route, method and status.", ["route", "method", "status"]
+)
+REQUEST_LATENCY = REGISTRY.histogram(
+    "pharmacy_http_request_duration_seconds", "Request latency in seconds.", ["route", "method"]
+)
+REQUEST_DB_QUERIES = REGISTRY.histogram(
+    "pharmacy_http_request_db_queries", "Database queries per request.", ["route"], buckets=QUERY_COUNT_BUCKETS
+)
+REQUEST_DB_TIME = REGISTRY.histogram(
+    "pharmacy_http_request_db_duration_seconds", "Database time per request in seconds.", ["route"]
+)
+RESPONSE_SIZE = REGISTRY.histogram(
+    "pharmacy_http_response_size_bytes", "Response body size in bytes.", ["route"], buckets=SIZE_BUCKETS
+)
+REQUESTS_IN_FLIGHT = REGISTRY.gauge(
+    "pharmacy_http_requests_in_flight", "Requests currently being served."
+)
+RATE_LIMITED = REGISTRY.counter(
+    "pharmacy_http_rate_limited_total", "Requests rejected with 429 by route.", ["route"]
+)
+
+CACHE_LOOKUPS = REGISTRY.counter(
+    "pharmacy_cache_lookups_total", "Cache reads by cache and result (hit or miss).", ["cache", "result"]
+)
+
+# business
+ORDERS_CREATED = REGISTRY.counter(
+    "pharmacy_orders_created_total", "Orders created through checkout."
+)
+CHECKOUT_FAILURES = REGISTRY.counter(
+    "pharmacy_checkout_failures_total", "Failed checkout attempts by reason.", ["reason"]
+)
+WALLET_DEPOSITS = REGISTRY.counter(
+    "pharmacy_wallet_deposits_total", "Wallet deposits."
+)
+WALLET_DEPOSIT_AMOUNT = REGISTRY.counter(
+    "pharmacy_wallet_deposit_amount_total", "Total amount deposited into wallets (USD)."
+)
@@ -0,0 +1,240 @@
+import timeit
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.forms.models import model_to_dict
+from django.test import RequestFactory
+from django.utils import timezone
+
+from . import api_views
+from .models import Profile, Medicine, Prescription, Order, Transaction
+
+
+# the implementations the fast paths in api_views replaced, kept verbatim so
+# every run checks that the replacements still return identical output
+
+def reference_parse_date(v):
+    if v is None:
+        return None
+    s = str(v).strip()
+    if not s:
+        return None
+    for fmt in ("%Y-%m-%d", "%m/%d/%Y", "%d/%m/%Y"):
+        try:
+            return datetime.strptime(s, fmt).date()
+        except ValueError:
+            pass
+    return None
+
+
+def reference_to_int(v, default=0):
+    try:
+        if v is None or str(v).strip() == "":
+            return default
+        return int(v)
+    except Exception:
+        return default
+
+
+def reference_to_decimal(v, default=Decimal("0")):
+    try:
+        if v is None or str(v).strip() == "":
+            return default
+        return Decimal(str(v))
+    except Exception:
+        return default
+
+
+def reference_medicine_to_json(m):
+    d = model_to_dict(m)
+    for k, v in list(d.items()):
+        if isinstance(v, (datetime, date)):
+            d[k] = v.isoformat()
+        elif isinstance(v, Decimal):
+            d[k] = float(v)
+    if "id" not in d:
+        d["id"] = m.id
+    return d
+
+
+def reference_set_if_exists(obj, field_name, value):
+    if field_name in {f.name for f in obj.__class__._meta.fields}:
+        setattr(obj, field_name, value)
+        return True
+    return False
+
+
+def reference_transaction_row(txn):
+    created_at_str = ""
+    if txn.created_at:
+        from django.utils.timezone import localtime
+        local_created = localtime(txn.created_at)
+        created_at_str = local_created.strftime("%Y-%m-%d %H:%M")
+    return {
+        "id": txn.id,
+        "transaction_id": txn.transaction_id,
+        "type": txn.type,
+        "amount": float(txn.amount),
+        "description": txn.description,
+        "reference_id": txn.reference_id,
+        "status": txn.status,
+        "created_at": txn.created_at.isoformat() if txn.created_at else None,
+        "created_at_display": created_at_str,
+        "metadata": txn.metadata,
+        "icon": "" if txn.type == 'deposit' else "" if txn.type == 'withdrawal' else ""
+    }
+
+
+def reference_pharmacist_order_row(order, role):
+    order_data = {
+        "id": order.id,
+        "order_id": order.order_id,
+        "patient_id": order.patient.id if order.patient else None,
+        "patient_name": order.patient.first_name or order.patient.username if order.patient else "Unknown",
+        "patient_email": order.patient.email if order.patient else None,
+        "total_amount": float(order.total_amount) if order.total_amount else 0.0,
+        "status": order.status,
+        "created_at": order.created_at.isoformat() if order.created_at else None,
+        "updated_at": order.updated_at.isoformat() if order.updated_at else None,
+        "debug_info": {
+            "api": "pharmacist_all_orders",
+            "user_role": role,
+            "has_prescription": order.prescription is not None
+        }
+    }
+    if order.prescription:
+        order_data["prescription"] = {
+            "prescription_id": order.prescription.prescription_id,
+            "medicine_name": order.prescription.medicine.name,
+            "quantity": order.prescription.quantity,
+            "doctor_name": order.prescription.doctor.first_name or order.prescription.doctor.username,
+        }
+        order_data["medicine_info"] = {
+            "name": order.prescription.medicine.name,
+            "category": order.prescription.medicine.category,
+        }
+    return order_data
+
+
+class Fixtures:
+    # unsaved model instances with their relations cached, so the row
+    # builders run without touching the database
+    def __init__(self):
+        now = timezone.now()
+        self.doctor = User(id=1, username="dr_house", first_name="Gregory", email="house@example.com",
+                           date_joined=now, last_login=now)
+        Profile(user=self.doctor, role="doctor", practice_code="A-000001")
+        self.patient = User(id=2, username="patient_1", email="p1@example.com", date_joined=now)
+        Profile(user=self.patient, role="patient", national_id="1234567890")
+        self.medicines = [
+            Medicine(id=1, name="Amoxicillin", category="Antibiotic", batch_number="B-1",
+                     expiry_date=date(2027, 1, 31), price=Decimal("12.50"), stock=40, notes="with food"),
+            Medicine(id=2, name="Ibuprofen", price=Decimal("0"), stock=0),
+        ]
+        self.prescriptions = [
+            Prescription(id=i, prescription_id=f"RX-{i:08d}", doctor=self.doctor, medicine=m,
+                         patient_national_id="1234567890", quantity=i + 1, dosage="1x daily",
+                         created_at=now - timedelta(days=i))
+            for i, m in enumerate(self.medicines, 1)
+        ]
+        self.orders = [
+            Order(id=1, order_id="ORD-00000001", patient=self.patient, prescription=self.prescriptions[0],
+                  total_amount=Decimal("25.00"), status="completed", created_at=now, updated_at=now),
+            Order(id=2, order_id="ORD-00000002", patient=self.patient, prescription=None,
+                  total_amount=Decimal("0"), status="cancelled", created_at=now, updated_at=now),
+        ]
+        self.transactions = [
+            Transaction(id=1, transaction_id="TXN-1", type="deposit", amount=Decimal("100.00"),
+                        created_at=now, metadata={"method": "card"}),
+            Transaction(id=2, transaction_id="TXN-2", type="withdrawal", amount=Decimal("25.00"),
+                        created_at=now, reference_id="ORD-00000001"),
+            Transaction(id=3, transaction_id="TXN-3", type="refund", amount=Decimal("5.00"), created_at=None),
+        ]
+        factory = RequestFactory()
+        self.requests = [
+            factory.post("/", data='{"name": "Aspirin", "price": "3.20", "stock": 5}',
+                         content_type="application/json"),
+            factory.post("/", data="", content_type="application/json"),
+            factory.post("/", data="{not json", content_type="application/json"),
+        ]
+
+
+DATE_INPUTS = [
+    "2025-03-14", " 2025-03-14 ", "2025-3-4", "2025-02-30", "03/14/2025", "14/03/2025",
+    "2024-W01-1", "2024-W1-01", "+024-01-01", "20250314", "", None, "garbage", date(2025, 3, 14), "0000-01-01",
+]
+INT_INPUTS = [None, "", "  ", "7", " 7 ", 7, 7.9, True, "x", "1e3", Decimal("3")]
+DECIMAL_INPUTS = [None, "", " ", "12.50", " 12.50 ", 12, 12.5, Decimal("1.10"), "abc", "1e2", True]
+
+
+def _call_with_default(fn, default):
+    return lambda v: fn(v, default)
+
+
+def _set_if_exists_result(fn):
+    def run(args):
+        obj = Medicine()
+        return fn(obj, args[0], args[1]), getattr(obj, args[0], None)
+    return run
+
+
+def cases(fixtures=None):
+    # (name, reference or None, fast implementation, inputs)
+    fx = fixtures or Fixtures()
+    return [
+        ("_json", None, api_views._json, fx.requests),
+        ("_parse_date", reference_parse_date, api_views._parse_date, DATE_INPUTS),
+        ("_to_int", _call_with_default(reference_to_int, 0), _call_with_default(api_views._to_int, 0), INT_INPUTS),
+        ("_to_decimal", _call_with_default(reference_to_decimal, Decimal("0")),
+         _call_with_default(api_views._to_decimal, Decimal("0")), DECIMAL_INPUTS),
+        ("_medicine_to_json", reference_medicine_to_json, api_views._medicine_to_json, fx.medicines),
+        ("_set_if_exists", _set_if_exists_result(reference_set_if_exists),
+         _set_if_exists_result(api_views._set_if_exists), [("stock", 3), ("notes", "x"), ("missing", 1)]),
+        ("_user_payload", None, api_views._user_payload, [fx.doctor, fx.patient]),
+        ("_user_row", None, api_views._user_row, [fx.doctor, fx.patient]),
+        ("_prescription_row", None, api_views._prescription_row, fx.prescriptions),
+        ("_patient_prescription_row", None, api_views._patient_prescription_row, fx.prescriptions),
+        ("_pharmacist_order_row", lambda o: reference_pharmacist_order_row(o, "pharmacist"),
+         lambda o: api_views._pharmacist_order_row(o, "pharmacist"), fx.orders),
+        ("_transaction_row", reference_transaction_row, api_views._transaction_row, fx.transactions),
+    ]
+
+
+def _signature(value):
+    # repr keeps types and Decimal exponents apart (Decimal("1.1") vs "1.10")
+    return type(value), repr(value)
+
+
+def check(case_list=None):
+    mismatches = []
+    for name, reference, fast, inputs in case_list or cases():
+        if reference is None:
+            continue
+        for value in inputs:
+            expected, actual = _signature(reference(value)), _signature(fast(value))
+            if expected != actual:
+                mismatches.append((name, value, expected[1], actual[1]))
+    return mismatches
+
+
+def _time(fn, inputs, number):
+    def loop():
+        for value in inputs:
+            fn(value)
+    # best of five runs, per call
+    best = min(timeit.repeat(loop, number=number, repeat=5))
+    return best / (number * len(inputs)) * 1e9
+
+
+def run(number=2000, only=None):
+    results = []
+    for name, reference, fast, inputs in cases():
+        if only and name not in only:
+            continue
+        row = {"name": name, "fast_ns": _time(fast, inputs, number)}
+        if reference is not None:
+            row["reference_ns"] = _time(reference, inputs, number)
+            row["speedup"] = row["reference_ns"] / row["fast_ns"] if row["fast_ns"] else None
+        results.append(row)
+    return results
@@ -0,0 +1,241 @@
+import logging
+import math
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import JsonResponse
+
+from .metrics import (
+    REQUESTS_TOTAL,
+    REQUEST_LATENCY,
+    REQUEST_DB_QUERIES,
+    REQUEST_DB_TIME,
+    RESPONSE_SIZE,
+    REQUESTS_IN_FLIGHT,
+    RATE_LIMITED,
+)
+from . import compression, profiling, ratelimit, traffic
+from .slow_queries import SlowQueryRecorder, get_config as slow_query_config
+from .timing import start_phases, stop_phases
+
+timing_logger = logging.getLogger("core.timing")
+
+
+class QueryTimer:
+    # used as a connection.execute_wrapper; counts statements and their time
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+def wrap_connections(stack, wrapper):
+    for conn in connections.all():
+        stack.enter_context(conn.execute_wrapper(wrapper))
+
+
+def route_name(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unmatched"
+    return match.route or match.view_name or "unmatched"
+
+
+def response_size(response):
+    if getattr(response, "streaming", False):
+        return None
+    return len(response.content)
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timer = QueryTimer()
+        REQUESTS_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                wrap_connections(stack, timer)
+                response = self.get_response(request)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+        elapsed = time.perf_counter() - start
+
+        route = route_name(request)
+        REQUESTS_TOTAL.inc(route=route, method=request.method, status=response.status_code)
+        REQUEST_LATENCY.observe(elapsed, route=route, method=request.method)
+        REQUEST_DB_QUERIES.observe(timer.count, route=route)
+        REQUEST_DB_TIME.observe(timer.duration, route=route)
+        size = response_size(response)
+        if size is not None:
+            RESPONSE_SIZE.observe(size, route=route)
+        return response
+
+
+def query_budget(route):
+    budgets = getattr(settings, "QUERY_BUDGETS", {})
+    return budgets.get(route, getattr(settings, "QUERY_BUDGET", None))
+
+
+class ServerTimingMiddleware:
+    # emits a Server-Timing header (db, view, serialize, total) and flags
+    # requests that run more queries than the route's budget
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timer = QueryTimer()
+        phases, token = start_phases()
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                wrap_connections(stack, timer)
+                response = self.get_response(request)
+        finally:
+            stop_phases(token)
+        total = time.perf_counter() - start
+
+        view_start = getattr(request, "_timing_view_start", None)
+        view = time.perf_counter() - view_start if view_start is not None else None
+
+        entries = [f'db;dur={timer.duration * 1000:.1f};desc="{timer.count} queries"']
+        if view is not None:
+            entries.append(f"view;dur={view * 1000:.1f}")
+        for name, duration in phases.items():
+            entries.append(f"{name};dur={duration * 1000:.1f}")
+        entries.append(f"total;dur={total * 1000:.1f}")
+
+        route = route_name(request)
+        budget = query_budget(route)
+        over_budget = budget is not None and timer.count > budget
+        if over_budget:
+            entries.append(f'budget;desc="{timer.count}/{budget} queries"')
+            response["X-Query-Budget-Exceeded"] = f"{timer.count}/{budget}"
+            timing_logger.warning(
+                "Query budget exceeded on %s: %s queries (budget %s)", route, timer.count, budget
+            )
+
+        response["Server-Timing"] = ", ".join(entries)
+
+        if getattr(settings, "SERVER_TIMING_LOG", False):
+            fields = {
+                "route": route,
+                "method": request.method,
+                "status": response.status_code,
+                "db_queries": timer.count,
+                "db_ms": round(timer.duration * 1000, 2),
+                "view_ms": round(view * 1000, 2) if view is not None else None,
+                "total_ms": round(total * 1000, 2),
+                "over_query_budget": over_budget,
+            }
+            for name, duration in phases.items():
+                fields[f"{name}_ms"] = round(duration * 1000, 2)
+            timing_logger.info("request timing %s", route, extra={"timing": fields})
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._timing_view_start = time.perf_counter()
+        return None
+
+
+class SlowQueryMiddleware:
+    # opt-in through SLOW_QUERY_LOG = {"ENABLED": True, ...}
+    def __init__(self, get_response):
+        self.config = slow_query_config()
+        if not self.config["ENABLED"]:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with ExitStack() as stack:
+            for conn in connections.all():
+                stack.enter_context(conn.execute_wrapper(SlowQueryRecorder(conn, request, self.config)))
+            return self.get_response(request)
+
+
+class ProfilerMiddleware:
+    # profiles a single request when it carries a signed X-Profile-Request
+    # header (see `manage.py profile_token`) or a staff user adds ?_profile
+    def __init__(self, get_response):
+        self.config = profiling.get_config()
+        if not self.config["ENABLED"]:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if profiling.should_profile(request, self.config):
+            return profiling.profile_request(self.get_response, request, self.config)
+        return self.get_response(request)
+
+
+class TrafficRecorderMiddleware:
+    # opt-in through TRAFFIC_RECORDING = {"ENABLED": True, ...}; writes one
+    # JSONL line per request for `manage.py replay_traffic`
+    def __init__(self, get_response):
+        self.config = traffic.get_config()
+        if not self.config["ENABLED"]:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.path.startswith(tuple(self.config["SKIP_PREFIXES"])):
+            return self.get_response(request)
+        body, content_type = traffic.request_body(request, self.config)
+        start = time.perf_counter()
+        response = self.get_response(request)
+        try:
+            traffic.record(
+                request, response, time.perf_counter() - start, route_name(request),
+                body, content_type, self.config,
+            )
+        except Exception:
+            timing_logger.debug("Could not record request", exc_info=True)
+        return response
+
+
+class CompressionMiddleware:
+    # gzip/brotli for API responses above RESPONSE_COMPRESSION["MIN_SIZE"];
+    # sits right below MetricsMiddleware so response sizes are on-the-wire
+    def __init__(self, get_response):
+        self.config = compression.get_config()
+        if not self.config["ENABLED"]:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return compression.compress_response(request, self.get_response(request), self.config)
+
+
+class RateLimitMiddleware:
+    # opt-in through RATE_LIMITS = {"ENABLED": True, "ROUTES": {...}}; per-user
+    # and per-IP token buckets checked once the route is resolved
+    def __init__(self, get_response):
+        self.config = ratelimit.get_config()
+        if not self.config["ENABLED"] or not self.config["ROUTES"]:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        route = route_name(request)
+        retry_after = ratelimit.check(request, route, self.config)
+        if not retry_after:
+            return None
+        RATE_LIMITED.inc(route=route)
+        response = JsonResponse({"error": "Too many requests", "retry_after": math.ceil(retry_after)}, status=429)
+        response["Retry-After"] = str(math.ceil(retry_after))
+        return response
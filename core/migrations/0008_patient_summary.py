@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:59
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill(apps, schema_editor):
+    # stats read the summary row, so every existing patient gets one
+    Profile = apps.get_model('core', 'Profile')
+    Order = apps.get_model('core', 'Order')
+    Prescription = apps.get_model('core', 'Prescription')
+    PatientSummary = apps.get_model('core', 'PatientSummary')
+    orders = {
+        row['patient_id']: row
+        for row in Order.objects.order_by().values('patient_id').annotate(
+            total_orders=models.Count('id'),
+            pending_orders=models.Count('id', filter=models.Q(status__in=['pending', 'processing'])),
+            total_spent=models.Sum('total_amount', filter=models.Q(status='completed')),
+        )
+    }
+    active = dict(
+        Prescription.objects.filter(status='active').order_by().values('patient_national_id')
+        .annotate(n=models.Count('id')).values_list('patient_national_id', 'n')
+    )
+    PatientSummary.objects.bulk_create([
+        PatientSummary(
+            user_id=uid,
+            total_orders=orders.get(uid, {}).get('total_orders', 0),
+            pending_orders=orders.get(uid, {}).get('pending_orders', 0),
+            total_spent=orders.get(uid, {}).get('total_spent') or 0,
+            active_prescriptions=active.get(national_id, 0) if national_id else 0,
+        )
+        for uid, national_id in Profile.objects.filter(role='patient').values_list('user_id', 'national_id').iterator()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('core', '0007_stock_shards'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatientSummary',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='patient_summary', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('total_orders', models.IntegerField(default=0)),
+                ('pending_orders', models.IntegerField(default=0)),
+                ('total_spent', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('active_prescriptions', models.IntegerField(default=0)),
+                ('rebuilt_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
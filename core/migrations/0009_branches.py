@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_patient_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='branch',
+            field=models.CharField(blank=True, default='', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='BranchStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('branch', models.CharField(max_length=20)),
+                ('quantity', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('medicine', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='core.medicine')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('branch', 'medicine'), name='unique_branch_stock')],
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:03
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_branches'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medicine',
+            name='batch_tracked',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='MedicineBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('batch_number', models.CharField(blank=True, default='', max_length=60)),
+                ('expiry_date', models.DateField()),
+                ('quantity', models.IntegerField(default=0)),
+                ('received_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('medicine', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='batches', to='core.medicine')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BatchAllocation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField()),
+                ('order_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='allocations', to='core.orderitem')),
+                ('batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='allocations', to='core.medicinebatch')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='medicinebatch',
+            index=models.Index(condition=models.Q(('quantity__gt', 0)), fields=['medicine', 'expiry_date', 'id'], name='batch_fefo_idx'),
+        ),
+    ]
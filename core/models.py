@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 
 class Profile(models.Model):
@@ -25,6 +26,12 @@ class Medicine(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     stock = models.IntegerField(default=0)
     notes = models.TextField(blank=True, default="")
+    # >0: stock lives in that many StockShard rows (see core/stock_shards.py)
+    # and `stock` is only their total as of the last sync
+    stock_shards = models.PositiveSmallIntegerField(default=0)
+    # set once batches are received: checkouts then draw from MedicineBatch
+    # rows, earliest expiry first (see core/fefo.py)
+    batch_tracked = models.BooleanField(default=False)
     
     def __str__(self):
         return self.name
@@ -49,6 +56,15 @@ class Prescription(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # a patient's prescriptions by status, the status filter and the
+        # date hierarchy of the admin
+        indexes = [
+            models.Index(fields=["patient_national_id", "status"]),
+            models.Index(fields=["status"]),
+            models.Index(fields=["created_at"]),
+        ]
     
     def __str__(self):
         return f"Prescription {self.prescription_id}"
@@ -132,14 +148,28 @@ class Order(models.Model):
         ('cancelled', 'Cancelled'),
         ('failed', 'Failed - Insufficient Balance'),
     ]
-    
+
+    # allowed target statuses for each current status
+    ORDER_TRANSITIONS = {
+        'pending': ['processing', 'cancelled', 'failed'],
+        'processing': ['completed', 'cancelled', 'failed'],
+        'completed': ['cancelled'],
+        'cancelled': [],
+        'failed': [],
+    }
+
     order_id = models.CharField(max_length=20, unique=True, blank=True)
     patient = models.ForeignKey(User, on_delete=models.CASCADE, related_name="orders")
     prescription = models.ForeignKey(Prescription, on_delete=models.SET_NULL, null=True, blank=True, related_name="orders")
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
     status = models.CharField(max_length=20, choices=ORDER_STATUS, default='completed')  
+    # code of the branch (settings.BRANCHES) whose inventory filled it, if any
+    branch = models.CharField(max_length=20, blank=True, default="")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status"]), models.Index(fields=["created_at"])]
     
     def __str__(self):
         return f"Order {self.order_id}"
@@ -184,6 +214,9 @@ class Transaction(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='completed')
     metadata = models.JSONField(default=dict, blank=True)  
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["type"]), models.Index(fields=["created_at"])]
     
     def __str__(self):
         return f"{self.type} - ${self.amount} - {self.status}"
@@ -192,4 +225,143 @@ class Transaction(models.Model):
         if not self.transaction_id:
             import uuid
             self.transaction_id = f"TXN-{uuid.uuid4().hex[:10].upper()}"
-        super().save(*args, **kwargs)
\ No newline at end of file
+        super().save(*args, **kwargs)
+
+class StockMovement(models.Model):
+    # append-only: every change to Medicine.stock adds a row, quantity is
+    # signed (+ into stock, - out of it)
+    KIND_CHOICES = [
+        ('receipt', 'Receipt'),
+        ('sale', 'Sale'),
+        ('adjustment', 'Adjustment'),
+        ('return', 'Return'),
+    ]
+
+    medicine = models.ForeignKey(Medicine, on_delete=models.CASCADE, related_name="movements")
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    quantity = models.IntegerField()
+    reference_id = models.CharField(max_length=50, blank=True, default="")
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="stock_movements")
+    note = models.CharField(max_length=200, blank=True, default="")
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=["medicine", "created_at"])]
+
+    def __str__(self):
+        return f"{self.kind} {self.quantity:+d} {self.medicine_id}"
+
+    def save(self, *args, **kwargs):
+        if self.pk and not self._state.adding:
+            raise ValueError("Stock movements are append-only")
+        super().save(*args, **kwargs)
+
+
+class StockSnapshot(models.Model):
+    # stock of one medicine: the sum of its movements with id up to
+    # last_movement_id and dated up to taken_at; point-in-time queries add the
+    # movements outside that set
+    medicine = models.ForeignKey(Medicine, on_delete=models.CASCADE, related_name="snapshots")
+    stock = models.IntegerField()
+    last_movement_id = models.BigIntegerField(default=0)
+    taken_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=["medicine", "taken_at"])]
+
+    def __str__(self):
+        return f"{self.medicine_id} @ {self.taken_at:%Y-%m-%d %H:%M}: {self.stock}"
+
+
+class StockShard(models.Model):
+    # one of a hot medicine's sub-counters; checkouts decrement a random one
+    # so concurrent orders do not all update the same row
+    medicine = models.ForeignKey(Medicine, on_delete=models.CASCADE, related_name="shards")
+    shard = models.PositiveSmallIntegerField()
+    quantity = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["medicine", "shard"], name="unique_stock_shard")]
+
+    def __str__(self):
+        return f"{self.medicine_id}#{self.shard}: {self.quantity}"
+
+
+class PatientSummary(models.Model):
+    # the patient dashboard's counters, kept up to date in the same
+    # transaction as the change (see core/patient_summary.py); a missing row
+    # is recomputed on read and `manage.py repair_patient_summaries` fixes drift
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name="patient_summary")
+    total_orders = models.IntegerField(default=0)
+    pending_orders = models.IntegerField(default=0)
+    total_spent = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    active_prescriptions = models.IntegerField(default=0)
+    rebuilt_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Summary: {self.user_id}"
+
+
+class BranchStock(models.Model):
+    # one medicine's stock at one branch. Lives in the branch's database
+    # (core.branches.BranchRouter), so the catalog reference has no database
+    # constraint and deleting a medicine leaves the row for reports to skip
+    branch = models.CharField(max_length=20)
+    medicine = models.ForeignKey(Medicine, on_delete=models.DO_NOTHING, db_constraint=False, related_name="+")
+    quantity = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["branch", "medicine"], name="unique_branch_stock")]
+
+    def __str__(self):
+        return f"{self.branch}/{self.medicine_id}: {self.quantity}"
+
+
+class MedicineBatch(models.Model):
+    # one received lot of a batch-tracked medicine; the medicine's stock
+    # still counts it, this says which lot a unit comes from
+    medicine = models.ForeignKey(Medicine, on_delete=models.CASCADE, related_name="batches")
+    batch_number = models.CharField(max_length=60, blank=True, default="")
+    expiry_date = models.DateField()
+    quantity = models.IntegerField(default=0)
+    received_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # the allocator's range scan: a medicine's non-empty batches in expiry order
+            models.Index(fields=["medicine", "expiry_date", "id"], condition=models.Q(quantity__gt=0),
+                         name="batch_fefo_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.medicine_id} {self.batch_number or self.id} (exp {self.expiry_date}): {self.quantity}"
+
+
+class BatchAllocation(models.Model):
+    # units of an order item taken from one batch, put back on cancellation
+    order_item = models.ForeignKey(OrderItem, on_delete=models.CASCADE, related_name="allocations")
+    batch = models.ForeignKey(MedicineBatch, on_delete=models.CASCADE, related_name="allocations")
+    quantity = models.IntegerField()
+
+    def __str__(self):
+        return f"{self.order_item_id} <- {self.batch_id} x {self.quantity}"
+
+
+
+class DemandForecast(models.Model):
+    # a medicine's demand forecast and reorder point from the last
+    # `manage.py forecast_demand` run (see core/forecasting.py)
+    medicine = models.OneToOneField(Medicine, on_delete=models.CASCADE, primary_key=True, related_name="forecast")
+    method = models.CharField(max_length=10)
+    daily_demand = models.FloatField(default=0)
+    demand_std = models.FloatField(default=0)
+    safety_stock = models.IntegerField(default=0)
+    reorder_point = models.IntegerField(default=0)
+    suggested_order = models.IntegerField(default=0)
+    # Medicine stock when it was computed
+    stock = models.IntegerField(default=0)
+    computed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.medicine_id}: {self.daily_demand:.2f}/day, reorder at {self.reorder_point}"
@@ -0,0 +1,191 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from decimal import Decimal
+
+from django.db import models
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.utils import timezone
+
+from .models import Order, PatientSummary, Prescription, Profile
+
+
+# Counters behind the patient stats, maintained with F() updates next to
+# every change that affects them: checkout, prescription creation and order
+# status changes. Any other save or delete of an order or prescription (the
+# admin, scripts, cascades) drops the affected rows instead, and the next
+# read recomputes them from the orders and prescriptions.
+
+FIELDS = ("total_orders", "pending_orders", "total_spent", "active_prescriptions")
+PENDING = ("pending", "processing")
+
+# set while code that updates the counters itself saves orders/prescriptions
+_maintained = ContextVar("patient_summary_maintained", default=False)
+
+
+@contextmanager
+def maintained():
+    token = _maintained.set(True)
+    try:
+        yield
+    finally:
+        _maintained.reset(token)
+
+
+def order_deltas(old_status, new_status, amount):
+    # counter changes for one order moving between statuses (None: created)
+    deltas = {"total_orders": 1 if old_status is None else 0}
+    deltas["pending_orders"] = (new_status in PENDING) - (old_status in PENDING)
+    deltas["total_spent"] = amount * ((new_status == "completed") - (old_status == "completed"))
+    return deltas
+
+
+def _update_kwargs(deltas):
+    return {field: models.F(field) + delta for field, delta in deltas.items() if delta}
+
+
+def add(user_id, **deltas):
+    kwargs = _update_kwargs(deltas)
+    if kwargs:
+        PatientSummary.objects.filter(user_id=user_id).update(**kwargs)
+
+
+def add_for_national_id(national_id, **deltas):
+    # prescriptions only know the patient's national id
+    kwargs = _update_kwargs(deltas)
+    if kwargs and national_id:
+        PatientSummary.objects.filter(user__profile__national_id=national_id).update(**kwargs)
+
+
+def add_many(deltas_by_user):
+    # {user id: {field: delta}} in one UPDATE, however many patients
+    kwargs = {}
+    for field in FIELDS:
+        whens = [
+            models.When(user_id=uid, then=models.F(field) + deltas[field])
+            for uid, deltas in deltas_by_user.items() if deltas.get(field)
+        ]
+        if whens:
+            output = PatientSummary._meta.get_field(field)
+            kwargs[field] = models.Case(*whens, default=models.F(field), output_field=output)
+    if kwargs:
+        PatientSummary.objects.filter(user_id__in=deltas_by_user).update(**kwargs)
+
+
+def compute(user_ids):
+    # {user id: counters} recomputed from scratch, three queries per batch
+    national_ids = dict(Profile.objects.filter(user_id__in=user_ids).values_list("user_id", "national_id"))
+    orders = {
+        row.pop("patient_id"): row
+        for row in Order.objects.filter(patient_id__in=user_ids).order_by().values("patient_id").annotate(
+            total_orders=models.Count("id"),
+            pending_orders=models.Count("id", filter=models.Q(status__in=PENDING)),
+            total_spent=models.Sum("total_amount", filter=models.Q(status="completed")),
+        )
+    }
+    active = dict(
+        Prescription.objects.filter(patient_national_id__in=[n for n in national_ids.values() if n], status="active")
+        .order_by().values("patient_national_id").annotate(n=models.Count("id"))
+        .values_list("patient_national_id", "n")
+    )
+    result = {}
+    for uid in user_ids:
+        row = orders.get(uid, {})
+        result[uid] = {
+            "total_orders": row.get("total_orders", 0),
+            "pending_orders": row.get("pending_orders", 0),
+            "total_spent": row.get("total_spent") or Decimal("0.00"),
+            "active_prescriptions": active.get(national_ids.get(uid), 0) if national_ids.get(uid) else 0,
+        }
+    return result
+
+
+def rebuild(user_ids):
+    now = timezone.now()
+    return PatientSummary.objects.bulk_create(
+        [PatientSummary(user_id=uid, rebuilt_at=now, **counters) for uid, counters in compute(user_ids).items()],
+        update_conflicts=True, unique_fields=["user"], update_fields=[*FIELDS, "rebuilt_at"],
+    )
+
+
+def rebuild_all(batch_size=500, stdout=None):
+    # every patient, in primary-key batches so memory stays flat
+    user_ids = Profile.objects.filter(role="patient").order_by("user_id").values_list("user_id", flat=True)
+    last, done = 0, 0
+    while True:
+        batch = list(user_ids.filter(user_id__gt=last)[:batch_size])
+        if not batch:
+            return done
+        rebuild(batch)
+        done += len(batch)
+        last = batch[-1]
+        if stdout is not None:
+            stdout.write(f"  {done} patients")
+
+
+def drift(user_ids):
+    # {user id: {field: (stored, recomputed)}} for rows that disagree
+    stored = {s.user_id: s for s in PatientSummary.objects.filter(user_id__in=user_ids)}
+    result = {}
+    for uid, counters in compute(list(stored)).items():
+        diff = {f: (getattr(stored[uid], f), v) for f, v in counters.items() if getattr(stored[uid], f) != v}
+        if diff:
+            result[uid] = diff
+    return result
+
+
+def get(user):
+    # a primary-key lookup; computed and stored on first use
+    summary = PatientSummary.objects.filter(user_id=user.pk).first()
+    if summary is None:
+        summary = rebuild([user.pk])[0]
+    return summary
+
+
+def forget(user_ids):
+    PatientSummary.objects.filter(user_id__in=user_ids).delete()
+
+
+def _patients_of(national_ids):
+    return Profile.objects.filter(national_id__in=[n for n in national_ids if n]).values_list("user_id", flat=True)
+
+
+def _order_deleted(sender, instance, **kwargs):
+    forget([instance.patient_id])
+
+
+def _prescription_deleted(sender, instance, **kwargs):
+    forget(_patients_of([instance.patient_national_id]))
+
+
+def _remember_previous(sender, instance, **kwargs):
+    # an edit may move the row to another patient, whose counters change too
+    if _maintained.get() or instance.pk is None:
+        return
+    field = "patient_id" if sender is Order else "patient_national_id"
+    instance._summary_previous = sender.objects.filter(pk=instance.pk).values_list(field, flat=True).first()
+
+
+def _order_saved(sender, instance, **kwargs):
+    if not _maintained.get():
+        forget({instance.patient_id, getattr(instance, "_summary_previous", None)} - {None})
+
+
+def _prescription_saved(sender, instance, **kwargs):
+    if not _maintained.get():
+        forget(_patients_of({instance.patient_national_id, getattr(instance, "_summary_previous", None)}))
+
+
+def _profile_saved(sender, instance, **kwargs):
+    # the national id decides which prescriptions count
+    if not kwargs.get("created"):
+        forget([instance.user_id])
+
+
+def connect_signals():
+    for model in (Order, Prescription):
+        pre_save.connect(_remember_previous, sender=model, dispatch_uid=f"patient_summary:{model.__name__}:pre_save")
+    post_save.connect(_order_saved, sender=Order, dispatch_uid="patient_summary:order:save")
+    post_save.connect(_prescription_saved, sender=Prescription, dispatch_uid="patient_summary:prescription:save")
+    post_delete.connect(_order_deleted, sender=Order, dispatch_uid="patient_summary:order:delete")
+    post_delete.connect(_prescription_deleted, sender=Prescription, dispatch_uid="patient_summary:prescription:delete")
+    post_save.connect(_profile_saved, sender=Profile, dispatch_uid="patient_summary:profile:save")
@@ -0,0 +1,161 @@
+import cProfile
+import json
+import os
+import re
+import time
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.core import signing
+
+try:
+    from pyinstrument import Profiler as SamplingProfiler
+except ImportError:
+    SamplingProfiler = None
+
+
+DEFAULTS = {
+    "ENABLED": True,
+    "DIR": None,
+    "MAX_FILES": 50,
+    "HEADER": "HTTP_X_PROFILE_REQUEST",
+    "QUERY_FLAG": "_profile",
+    "TOKEN_MAX_AGE": 3600,
+    # "auto" uses pyinstrument when it is installed, otherwise cProfile
+    "BACKEND": "auto",
+}
+
+TOKEN_SALT = "core.profiling"
+PROFILE_NAME_RE = re.compile(r"^[\w.-]+\.(prof|html)$")
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, "PROFILER", {}) or {})
+    if not config["DIR"]:
+        config["DIR"] = Path(settings.BASE_DIR) / "logs" / "profiles"
+    config["DIR"] = Path(config["DIR"])
+    return config
+
+
+def make_token(label="profile"):
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign(label)
+
+
+def token_is_valid(token, max_age):
+    try:
+        signing.TimestampSigner(salt=TOKEN_SALT).unsign(token, max_age=max_age)
+        return True
+    except signing.BadSignature:
+        return False
+
+
+def should_profile(request, config):
+    token = request.META.get(config["HEADER"])
+    if token:
+        return token_is_valid(token, config["TOKEN_MAX_AGE"])
+    if config["QUERY_FLAG"] in request.GET:
+        user = getattr(request, "user", None)
+        return bool(user and user.is_authenticated and user.is_staff)
+    return False
+
+
+def _backend(config):
+    if SamplingProfiler is not None and config["BACKEND"] in ("auto", "sampling"):
+        return "sampling"
+    return "cprofile"
+
+
+def profile_request(get_response, request, config):
+    backend = _backend(config)
+    start = time.perf_counter()
+    if backend == "sampling":
+        profiler = SamplingProfiler()
+        profiler.start()
+        try:
+            response = get_response(request)
+        finally:
+            profiler.stop()
+    else:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12+ allows one active profiler per process: while
+            # another request is profiled this one is served unprofiled
+            return get_response(request)
+        try:
+            response = get_response(request)
+        finally:
+            profiler.disable()
+    duration = time.perf_counter() - start
+
+    try:
+        name = save_profile(profiler, backend, request, response, duration, config)
+        response["X-Profile-Id"] = name
+    except OSError:
+        pass
+    return response
+
+
+def save_profile(profiler, backend, request, response, duration, config):
+    directory = config["DIR"]
+    directory.mkdir(parents=True, exist_ok=True)
+
+    slug = re.sub(r"[^\w]+", "-", request.path).strip("-")[:60] or "root"
+    stem = f"{time.strftime('%Y%m%d-%H%M%S')}-{request.method}-{slug}-{uuid.uuid4().hex[:6]}"
+    if backend == "sampling":
+        name = stem + ".html"
+        (directory / name).write_text(profiler.output_html(), encoding="utf-8")
+    else:
+        name = stem + ".prof"
+        profiler.dump_stats(str(directory / name))
+
+    user = getattr(request, "user", None)
+    meta = {
+        "name": name,
+        "backend": backend,
+        "path": request.path,
+        "query": request.META.get("QUERY_STRING", ""),
+        "method": request.method,
+        "status": response.status_code,
+        "duration_ms": round(duration * 1000, 2),
+        "user": user.username if user is not None and user.is_authenticated else None,
+        "created_at": time.time(),
+        "size": (directory / name).stat().st_size,
+    }
+    (directory / (stem + ".json")).write_text(json.dumps(meta), encoding="utf-8")
+
+    rotate(directory, config["MAX_FILES"])
+    return name
+
+
+def rotate(directory, max_files):
+    metas = sorted(directory.glob("*.json"), key=os.path.getmtime, reverse=True)
+    for meta in metas[max_files:]:
+        for path in directory.glob(meta.stem + ".*"):
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+
+def list_profiles(config, limit=None):
+    directory = config["DIR"]
+    if not directory.is_dir():
+        return []
+    result = []
+    for meta in sorted(directory.glob("*.json"), key=os.path.getmtime, reverse=True)[:limit]:
+        try:
+            result.append(json.loads(meta.read_text(encoding="utf-8")))
+        except (OSError, ValueError):
+            continue
+    return result
+
+
+def profile_path(config, name):
+    if not PROFILE_NAME_RE.match(name):
+        return None
+    path = config["DIR"] / name
+    return path if path.is_file() else None
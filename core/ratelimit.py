@@ -0,0 +1,122 @@
+import math
+import re
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+DEFAULTS = {
+    "ENABLED": False,
+    # a backend every worker process shares (file, Redis, Memcached); with
+    # the per-process LocMemCache each worker keeps its own buckets
+    "CACHE": "default",
+    "KEY_PREFIX": "ratelimit",
+    # route (as in QUERY_BUDGETS) -> {"user": "30/min", "ip": "60/min"}
+    "ROUTES": {},
+}
+
+PERIODS = {"s": 1, "sec": 1, "m": 60, "min": 60, "h": 3600, "hour": 3600, "d": 86400, "day": 86400}
+
+# how long a worker waits for another one to finish updating the same bucket
+LOCK_WAIT = 0.05
+
+_RATE = re.compile(r"^\s*(\d+)\s*/\s*(\d*)\s*([a-z]+)\s*$")
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, "RATE_LIMITS", {}) or {})
+    return config
+
+
+def parse_rate(rate):
+    # "30/min" -> (capacity 30, refilled at 0.5 tokens per second); "5/10s" works too
+    match = _RATE.match(str(rate))
+    if not match or match.group(3) not in PERIODS:
+        raise ValueError(f"Invalid rate {rate!r}, expected e.g. '30/min'")
+    count = int(match.group(1))
+    seconds = int(match.group(2) or 1) * PERIODS[match.group(3)]
+    return count, count / seconds
+
+
+def client_ip(request):
+    return request.META.get("REMOTE_ADDR") or "unknown"
+
+
+def bucket_keys(request, route, limits, prefix):
+    # (cache key, rate) per bucket that applies to this request
+    keys = []
+    user = getattr(request, "user", None)
+    if "user" in limits and user is not None and user.is_authenticated:
+        keys.append((f"{prefix}:{route}:user:{user.pk}", limits["user"]))
+    if "ip" in limits:
+        keys.append((f"{prefix}:{route}:ip:{client_ip(request)}", limits["ip"]))
+    return keys
+
+
+class _BucketLock:
+    # cache.add() is atomic on LocMem, Redis and Memcached and close enough
+    # on the file backend; if the lock stays taken the update goes ahead
+    # regardless, so a stuck worker can never block requests
+    def __init__(self, cache, key):
+        self.cache, self.key = cache, key + ":lock"
+        self.acquired = False
+
+    def __enter__(self):
+        deadline = time.monotonic() + LOCK_WAIT
+        while not self.acquired:
+            self.acquired = self.cache.add(self.key, 1, timeout=1)
+            if self.acquired or time.monotonic() >= deadline:
+                break
+            time.sleep(0.002)
+        return self
+
+    def __exit__(self, *exc):
+        if self.acquired:
+            self.cache.delete(self.key)
+
+
+def _refilled(cache, key, rate, now):
+    # (tokens, capacity, refill) of a bucket as of `now`
+    capacity, refill = parse_rate(rate)
+    tokens, stamp = cache.get(key) or (capacity, now)
+    return min(capacity, tokens + max(0.0, now - stamp) * refill), capacity, refill
+
+
+def _spend(cache, key, tokens, capacity, refill, now):
+    # kept until the bucket would be full again anyway
+    cache.set(key, (tokens - 1, now), timeout=math.ceil(capacity / refill) + 1)
+
+
+def take(cache, key, rate, now=None):
+    # token bucket: returns 0 when a token was taken, else seconds until one is
+    now = time.time() if now is None else now
+    with _BucketLock(cache, key):
+        tokens, capacity, refill = _refilled(cache, key, rate, now)
+        if tokens >= 1:
+            _spend(cache, key, tokens, capacity, refill, now)
+            return 0
+        return (1 - tokens) / refill
+
+
+def check(request, route, config, now=None):
+    # a token is taken from every bucket of the request or from none: a
+    # request the ip bucket rejects does not cost the user a token
+    limits = config["ROUTES"].get(route)
+    if not limits:
+        return 0
+    cache = caches[config["CACHE"]]
+    now = time.time() if now is None else now
+    buckets = bucket_keys(request, route, limits, config["KEY_PREFIX"])
+    with ExitStack() as stack:
+        states = []
+        for key, rate in buckets:
+            stack.enter_context(_BucketLock(cache, key))
+            states.append((key, *_refilled(cache, key, rate, now)))
+        retry_after = max(((1 - tokens) / refill for _, tokens, _, refill in states if tokens < 1), default=0)
+        if not retry_after:
+            for key, tokens, capacity, refill in states:
+                _spend(cache, key, tokens, capacity, refill, now)
+    return retry_after
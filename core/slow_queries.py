@@ -0,0 +1,189 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+import traceback
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+from django.conf import settings
+
+
+DEFAULTS = {
+    "ENABLED": False,
+    "THRESHOLD_MS": 100,
+    "PATH": None,
+    "MAX_BYTES": 10 * 1024 * 1024,
+    "BACKUP_COUNT": 5,
+    "EXPLAIN": True,
+    "STACK_DEPTH": 8,
+    "MAX_PARAMS_CHARS": 500,
+}
+
+_logger = logging.getLogger("core.slow_queries")
+_handler_lock = threading.Lock()
+_handler_path = None
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, "SLOW_QUERY_LOG", {}) or {})
+    if not config["PATH"]:
+        config["PATH"] = Path(settings.BASE_DIR) / "logs" / "slow_queries.jsonl"
+    return config
+
+
+def _ensure_handler(config):
+    global _handler_path
+    path = str(config["PATH"])
+    with _handler_lock:
+        if _handler_path == path:
+            return
+        for h in list(_logger.handlers):
+            _logger.removeHandler(h)
+            h.close()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        handler = RotatingFileHandler(
+            path, maxBytes=config["MAX_BYTES"], backupCount=config["BACKUP_COUNT"], encoding="utf-8"
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        _logger.addHandler(handler)
+        _logger.setLevel(logging.INFO)
+        _logger.propagate = False
+        _handler_path = path
+
+
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"(?<![\w\"])-?\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"\bIN\s*\((?:\s*\?\s*,)*\s*\?\s*\)", re.IGNORECASE)
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_sql(sql):
+    # collapses literals, placeholders and IN lists so that statements that
+    # only differ by their parameters share one "shape"
+    shape = _LITERAL_RE.sub("?", sql)
+    shape = shape.replace("%s", "?")
+    shape = _NUMBER_RE.sub("?", shape)
+    shape = _IN_LIST_RE.sub("IN (...)", shape)
+    return _SPACE_RE.sub(" ", shape).strip()
+
+
+def _trimmed_stack(depth):
+    base = str(settings.BASE_DIR)
+    frames = []
+    for frame in traceback.extract_stack()[:-3]:
+        if not frame.filename.startswith(base) or "site-packages" in frame.filename:
+            continue
+        if frame.filename.endswith(("middleware.py", "slow_queries.py")):
+            continue
+        frames.append(f"{os.path.relpath(frame.filename, base)}:{frame.lineno} in {frame.name}")
+    return frames[-depth:]
+
+
+class SlowQueryRecorder:
+    # execute_wrapper that writes statements slower than THRESHOLD_MS to the
+    # slow query log, together with an EXPLAIN QUERY PLAN of SELECTs
+    def __init__(self, connection, request=None, config=None):
+        self.connection = connection
+        self.request = request
+        self.config = config or get_config()
+        self.threshold = self.config["THRESHOLD_MS"] / 1000.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            if duration >= self.threshold:
+                try:
+                    self.record(sql, params, many, duration)
+                except Exception:
+                    _logger.debug("Could not record slow query", exc_info=True)
+
+    def _view_name(self):
+        match = getattr(self.request, "resolver_match", None)
+        if match is None:
+            return getattr(self.request, "path", None)
+        return match.view_name or match.route
+
+    def explain(self, sql, params):
+        if not sql.lstrip().upper().startswith("SELECT"):
+            return None
+        prefix = "EXPLAIN QUERY PLAN " if self.connection.vendor == "sqlite" else "EXPLAIN "
+        # a cursor straight on the DB-API connection (with the backend's
+        # placeholder handling): connection.cursor() would pass the EXPLAIN
+        # through every execute_wrapper, and the metrics and Server-Timing
+        # would count it as one of the request's queries
+        cursor = self.connection.create_cursor()
+        try:
+            cursor.execute(prefix + sql, params)
+            return [" | ".join(str(c) for c in row) for row in cursor.fetchall()]
+        except Exception as e:
+            return [f"EXPLAIN failed: {e}"]
+        finally:
+            cursor.close()
+
+    def record(self, sql, params, many, duration):
+        _ensure_handler(self.config)
+        params_repr = repr(params)
+        limit = self.config["MAX_PARAMS_CHARS"]
+        if len(params_repr) > limit:
+            params_repr = params_repr[:limit] + "..."
+        entry = {
+            "ts": time.time(),
+            "duration_ms": round(duration * 1000, 3),
+            "db": self.connection.alias,
+            "sql": sql,
+            "shape": normalize_sql(sql),
+            "params": params_repr,
+            "many": many,
+            "view": self._view_name(),
+            "method": getattr(self.request, "method", None),
+            "stack": _trimmed_stack(self.config["STACK_DEPTH"]),
+        }
+        if self.config["EXPLAIN"] and not many:
+            entry["plan"] = self.explain(sql, params)
+        _logger.info(json.dumps(entry, default=str))
+
+
+def log_files(path):
+    path = Path(path)
+    files = [path] + sorted(path.parent.glob(path.name + ".*"))
+    return [f for f in files if f.is_file()]
+
+
+def summarize(paths, sort="total"):
+    shapes = {}
+    for path in paths:
+        with open(path, encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                shape = entry.get("shape") or normalize_sql(entry.get("sql", ""))
+                stats = shapes.get(shape)
+                if stats is None:
+                    stats = shapes[shape] = {
+                        "shape": shape, "count": 0, "total_ms": 0.0, "max_ms": 0.0,
+                        "views": set(), "plan": None,
+                    }
+                ms = float(entry.get("duration_ms", 0))
+                stats["count"] += 1
+                stats["total_ms"] += ms
+                if ms >= stats["max_ms"]:
+                    stats["max_ms"] = ms
+                    stats["plan"] = entry.get("plan")
+                if entry.get("view"):
+                    stats["views"].add(entry["view"])
+
+    key = {"total": "total_ms", "count": "count", "max": "max_ms"}[sort]
+    result = sorted(shapes.values(), key=lambda s: s[key], reverse=True)
+    for stats in result:
+        stats["mean_ms"] = stats["total_ms"] / stats["count"]
+        stats["views"] = sorted(stats["views"])
+    return result
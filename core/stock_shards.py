@@ -0,0 +1,139 @@
+import random
+
+from django.db import models, transaction
+
+from .models import Medicine, StockShard
+
+
+# Opt-in per medicine (Medicine.stock_shards > 0). A sharded medicine's stock
+# is the sum of its StockShard rows; Medicine.stock is only refreshed by
+# sync() and is never written on checkout, so the hot row stays cold.
+# Everything that changes stock must go through this module.
+
+DEFAULT_SHARDS = 8
+
+
+class InsufficientStock(Exception):
+    def __init__(self, available):
+        super().__init__(f"Insufficient stock. Available: {available}")
+        self.available = available
+
+
+def _split(total, count):
+    base, extra = divmod(max(total, 0), count)
+    return [base + (1 if i < extra else 0) for i in range(count)]
+
+
+def totals(medicine_ids):
+    # aggregated read: {medicine id: sum of its shards}
+    return dict(
+        StockShard.objects.filter(medicine_id__in=medicine_ids).order_by()
+        .values("medicine_id").annotate(total=models.Sum("quantity")).values_list("medicine_id", "total")
+    )
+
+
+def available(medicine):
+    if not medicine.stock_shards:
+        return medicine.stock
+    return totals([medicine.id]).get(medicine.id, 0)
+
+
+def overlay(medicines):
+    # replaces the stale Medicine.stock of sharded medicines with their shard
+    # totals, in one query and only when the list contains any
+    sharded = [m for m in medicines if m.stock_shards]
+    if sharded:
+        found = totals([m.id for m in sharded])
+        for m in sharded:
+            m.stock = found.get(m.id, 0)
+    return medicines
+
+
+def take(medicine, quantity, rng=random):
+    # must run inside a transaction: a failed borrow raises and rolls back
+    # what was already taken from sibling shards
+    if not medicine.stock_shards:
+        updated = Medicine.objects.filter(id=medicine.id, stock__gte=quantity).update(
+            stock=models.F("stock") - quantity
+        )
+        if not updated:
+            raise InsufficientStock(Medicine.objects.filter(id=medicine.id).values_list("stock", flat=True).first())
+        return
+
+    # a random shard that can cover the whole quantity: one conditional update
+    shard = rng.randrange(medicine.stock_shards)
+    if StockShard.objects.filter(medicine_id=medicine.id, shard=shard, quantity__gte=quantity).update(
+        quantity=models.F("quantity") - quantity
+    ):
+        return
+
+    # otherwise borrow from the siblings, fullest first
+    remaining = quantity
+    shards = StockShard.objects.filter(medicine_id=medicine.id, quantity__gt=0).order_by("-quantity")
+    for shard, have in shards.values_list("shard", "quantity"):
+        part = min(have, remaining)
+        if StockShard.objects.filter(medicine_id=medicine.id, shard=shard, quantity__gte=part).update(
+            quantity=models.F("quantity") - part
+        ):
+            remaining -= part
+            if not remaining:
+                return
+    raise InsufficientStock(quantity - remaining + totals([medicine.id]).get(medicine.id, 0))
+
+
+def put_back(quantities, rng=random):
+    # {medicine id: quantity} back into stock (cancellations)
+    sharded = dict(
+        Medicine.objects.filter(id__in=quantities, stock_shards__gt=0).values_list("id", "stock_shards")
+    )
+    for medicine_id, count in sharded.items():
+        StockShard.objects.filter(medicine_id=medicine_id, shard=rng.randrange(count)).update(
+            quantity=models.F("quantity") + quantities[medicine_id]
+        )
+    rest = {mid: qty for mid, qty in quantities.items() if mid not in sharded}
+    if rest:
+        Medicine.objects.filter(id__in=rest).update(
+            stock=models.Case(
+                *[models.When(id=mid, then=models.F("stock") + qty) for mid, qty in rest.items()],
+                default=models.F("stock"),
+                output_field=models.IntegerField(),
+            )
+        )
+
+
+def set_total(medicine, total):
+    # an absolute stock count (pharmacist edit): spread it over the shards
+    if not medicine.stock_shards:
+        return
+    for shard, quantity in enumerate(_split(total, medicine.stock_shards)):
+        StockShard.objects.filter(medicine_id=medicine.id, shard=shard).update(quantity=quantity)
+
+
+def enable(medicine, count=DEFAULT_SHARDS):
+    with transaction.atomic():
+        medicine = Medicine.objects.select_for_update().get(id=medicine.id)
+        stock = available(medicine)
+        StockShard.objects.filter(medicine=medicine).delete()
+        StockShard.objects.bulk_create([
+            StockShard(medicine=medicine, shard=i, quantity=q) for i, q in enumerate(_split(stock, count))
+        ])
+        Medicine.objects.filter(id=medicine.id).update(stock=stock, stock_shards=count)
+
+
+def disable(medicine):
+    with transaction.atomic():
+        medicine = Medicine.objects.select_for_update().get(id=medicine.id)
+        stock = available(medicine)
+        StockShard.objects.filter(medicine=medicine).delete()
+        Medicine.objects.filter(id=medicine.id).update(stock=stock, stock_shards=0)
+
+
+def sync(medicine_ids=None):
+    # copies shard totals into Medicine.stock for readers that do not overlay
+    qs = Medicine.objects.filter(stock_shards__gt=0)
+    if medicine_ids is not None:
+        qs = qs.filter(id__in=medicine_ids)
+    found = totals(list(qs.values_list("id", flat=True)))
+    for medicine_id, total in found.items():
+        Medicine.objects.filter(id=medicine_id).update(stock=total)
+    return found
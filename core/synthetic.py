@@ -0,0 +1,338 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.color import no_style
+from django.db import connections, models, transaction as db_transaction
+from django.utils import timezone
+
+from .models import Profile, Medicine, Prescription, Order, OrderItem, Wallet, Transaction, StockMovement
+
+
+# bulk generator for large, internally consistent datasets (benchmarks,
+# staging). Users, medicines and wallets go through bulk_create; the large
+# tables (prescriptions, orders, items, transactions) are written by
+# RowWriter with executemany and self-assigned primary keys, which skips
+# model instantiation entirely. Public ids are generated here because
+# neither path calls Model.save().
+
+SYNTHETIC_PASSWORD = "synthetic-pass-123"
+
+CATEGORIES = [
+    "Antibiotic", "Analgesic", "Antiviral", "Antihistamine", "Cardiovascular",
+    "Diabetes", "Respiratory", "Dermatology", "Vitamin", "Gastrointestinal",
+]
+MEDICINE_NAMES = [
+    "Amoxicillin", "Ibuprofen", "Paracetamol", "Oseltamivir", "Cetirizine", "Atorvastatin",
+    "Metformin", "Salbutamol", "Hydrocortisone", "Omeprazole", "Lisinopril", "Azithromycin",
+    "Loratadine", "Aspirin", "Insulin", "Montelukast", "Vitamin D3", "Ranitidine",
+]
+
+DOSAGES = ["1 tablet daily", "2 tablets daily", "5ml twice daily"]
+DURATIONS = ["5 days", "7 days", "14 days", "30 days"]
+
+ORDER_STATUS_WEIGHTS = [
+    ("completed", 85), ("pending", 4), ("processing", 3), ("cancelled", 5), ("failed", 3),
+]
+
+
+class RowWriter:
+    # executemany INSERT of plain tuples; the first value of each row is the
+    # primary key handed out by next_id(). Only valid while nothing else
+    # inserts into the table (seeding).
+    def __init__(self, model, fields, using="default"):
+        self.model = model
+        self.connection = connections[using]
+        self.using = using
+        ops = self.connection.ops
+        model_fields = [model._meta.get_field(name) for name in fields]
+        columns = [model._meta.pk.column] + [f.column for f in model_fields]
+        self.sql = "INSERT INTO {} ({}) VALUES ({})".format(
+            ops.quote_name(model._meta.db_table),
+            ", ".join(ops.quote_name(c) for c in columns),
+            ", ".join(["%s"] * len(columns)),
+        )
+        self.adapters = []
+        for index, field in enumerate(model_fields, 1):
+            if isinstance(field, models.DateTimeField):
+                self.adapters.append((index, ops.adapt_datetimefield_value))
+            elif isinstance(field, models.DateField):
+                self.adapters.append((index, ops.adapt_datefield_value))
+            elif isinstance(field, models.JSONField):
+                self.adapters.append((index, lambda v, f=field: f.get_db_prep_save(v, self.connection)))
+        last = model.objects.using(using).aggregate(m=models.Max("pk"))["m"] or 0
+        self._next_id = last + 1
+        self.written = 0
+
+    def next_id(self):
+        value = self._next_id
+        self._next_id += 1
+        return value
+
+    def write(self, rows):
+        if not rows:
+            return
+        if self.adapters:
+            rows = [list(r) for r in rows]
+            for row in rows:
+                for index, adapt in self.adapters:
+                    row[index] = adapt(row[index])
+        with self.connection.cursor() as cursor:
+            cursor.executemany(self.sql, rows)
+        self.written += len(rows)
+
+    def finish(self):
+        # keep database sequences (PostgreSQL etc.) ahead of the ids we used
+        statements = self.connection.ops.sequence_reset_sql(no_style(), [self.model])
+        if statements:
+            with self.connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+
+
+def skewed_picker(rng, items, hot_ratio, hot_share):
+    # hot_share of the picks go to a random hot_ratio slice of items
+    if not items:
+        raise ValueError("Cannot pick from an empty list")
+    if not hot_ratio or not hot_share or len(items) < 2:
+        return lambda: rng.choice(items)
+    shuffled = list(items)
+    rng.shuffle(shuffled)
+    n_hot = min(len(shuffled) - 1, max(1, int(len(shuffled) * hot_ratio)))
+    hot, cold = shuffled[:n_hot], shuffled[n_hot:]
+    return lambda: rng.choice(hot) if rng.random() < hot_share else rng.choice(cold)
+
+class SyntheticDataGenerator:
+    def __init__(self, users=500, medicines=1000, orders=5000, prescriptions=None,
+                 doctor_ratio=0.08, pharmacist_ratio=0.02, days=730, seed=42,
+                 hot_medicine_ratio=0.02, hot_medicine_share=0.5,
+                 heavy_patient_ratio=0.05, heavy_patient_share=0.4,
+                 prefix="synth", chunk_size=5000, using="default", stdout=None):
+        self.counts = {
+            "users": users,
+            "medicines": medicines,
+            "orders": orders,
+            "prescriptions": max(prescriptions if prescriptions is not None else int(orders * 1.2), orders),
+        }
+        self.doctor_ratio = doctor_ratio
+        self.pharmacist_ratio = pharmacist_ratio
+        self.hot_medicines = (hot_medicine_ratio, hot_medicine_share)
+        self.heavy_patients = (heavy_patient_ratio, heavy_patient_share)
+        self.days = days
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.prefix = prefix
+        self.chunk_size = chunk_size
+        self.using = using
+        self.stdout = stdout
+        self.now = timezone.now()
+        self._serials = {}
+
+    def log(self, msg):
+        if self.stdout is not None:
+            self.stdout.write(msg)
+
+    def _public_id(self, prefix, digits):
+        # sequential from a seeded random start: unique within a run without
+        # keeping millions of issued ids in memory
+        serial = self._serials.get(prefix)
+        if serial is None:
+            serial = random.Random(f"{self.seed}:{self.prefix}:{prefix}").getrandbits(digits * 4)
+        self._serials[prefix] = serial + 1
+        return f"{prefix}-{serial % 16 ** digits:0{digits}X}"
+
+    def _timestamp(self, not_before=None):
+        ts = self.now - timedelta(seconds=self.rng.randrange(self.days * 86400))
+        if not_before is not None and ts < not_before:
+            ts = not_before + timedelta(seconds=self.rng.randrange(3600, 86400 * 3))
+            ts = min(ts, self.now)
+        return ts
+
+    def _chunks(self, total):
+        for start in range(0, total, self.chunk_size):
+            yield start, min(start + self.chunk_size, total)
+
+    def generate(self):
+        self.create_users()
+        self.create_medicines()
+        self.create_wallets()
+        self.create_prescriptions_and_orders()
+        self.fund_wallets()
+        return self.counts
+
+    def create_users(self):
+        password = make_password(SYNTHETIC_PASSWORD)
+        total = self.counts["users"]
+        n_pharmacists = max(1, int(total * self.pharmacist_ratio))
+        n_doctors = max(1, int(total * self.doctor_ratio))
+        roles = ["pharmacist"] * n_pharmacists + ["doctor"] * n_doctors
+        roles += ["patient"] * max(1, total - len(roles))
+
+        # national ids continue after the ones earlier runs (any --prefix)
+        # handed out: prescriptions and summaries are keyed on them, so a
+        # reused id would show one patient another's prescriptions
+        last = Profile.objects.using(self.using).filter(national_id__regex=r"^9[0-9]{9}$").aggregate(
+            m=models.Max("national_id"))["m"]
+        first_national_id = int(last) + 1 if last else 9 * 10 ** 9
+        if first_national_id + len(roles) > 10 ** 10:
+            raise ValueError("No synthetic national ids left (9000000000-9999999999)")
+
+        self.patients = []
+        self.doctors = []
+        for start, end in self._chunks(len(roles)):
+            with db_transaction.atomic(using=self.using):
+                users = User.objects.using(self.using).bulk_create([
+                    User(
+                        username=f"{self.prefix}_{roles[i]}_{i}",
+                        email=f"{self.prefix}_{roles[i]}_{i}@example.com",
+                        first_name=f"{roles[i].title()} {i}",
+                        password=password,
+                        date_joined=self._timestamp(),
+                    )
+                    for i in range(start, end)
+                ])
+                profiles = []
+                for i, user in zip(range(start, end), users):
+                    role = roles[i]
+                    national_id = str(first_national_id + i) if role == "patient" else ""
+                    practice_code = f"A-{i % 1000000:06d}" if role != "patient" else ""
+                    profiles.append(Profile(user=user, role=role, national_id=national_id, practice_code=practice_code))
+                    if role == "patient":
+                        self.patients.append((user.id, national_id))
+                    elif role == "doctor":
+                        self.doctors.append(user.id)
+                Profile.objects.using(self.using).bulk_create(profiles)
+        self.log(f"users: {len(roles)} ({len(self.patients)} patients, {len(self.doctors)} doctors)")
+
+    def create_medicines(self):
+        self.medicines = []
+        for start, end in self._chunks(self.counts["medicines"]):
+            rows = []
+            for i in range(start, end):
+                name = f"{self.rng.choice(MEDICINE_NAMES)} {self.rng.choice([5, 10, 20, 50, 100, 250, 500])}mg #{i}"
+                rows.append(Medicine(
+                    name=name,
+                    category=self.rng.choice(CATEGORIES),
+                    batch_number=f"B{i:07d}",
+                    expiry_date=(self.now + timedelta(days=self.rng.randrange(-60, 900))).date(),
+                    price=Decimal(self.rng.randrange(100, 20000)) / 100,
+                    stock=self.rng.randrange(0, 500),
+                ))
+            created = Medicine.objects.using(self.using).bulk_create(rows)
+            self.medicines.extend((m.id, m.price) for m in created)
+            # synthetic orders leave stock alone, so one receipt explains it
+            StockMovement.objects.using(self.using).bulk_create([
+                StockMovement(medicine=m, kind="receipt", quantity=m.stock, note="Synthetic opening stock",
+                              created_at=self.now - timedelta(days=self.days))
+                for m in created if m.stock
+            ])
+        self.log(f"medicines: {len(self.medicines)}")
+
+    def create_wallets(self):
+        self.wallets = Wallet.objects.using(self.using).bulk_create([
+            Wallet(user_id=pid, balance=Decimal("0.00")) for pid, _ in self.patients
+        ], batch_size=self.chunk_size)
+        self.wallet_ids = {w.user_id: w.id for w in self.wallets}
+        self.txn_writer = RowWriter(Transaction, [
+            "wallet", "transaction_id", "type", "amount", "description",
+            "reference_id", "status", "metadata", "created_at",
+        ], using=self.using)
+        self.spent = {}
+        self.first_activity = {}
+
+    def _txn(self, wallet_id, type, amount, description, reference_id, created_at):
+        return (
+            self.txn_writer.next_id(), wallet_id, self._public_id("TXN", 10), type, amount,
+            description, reference_id, "completed", {"synthetic": True}, created_at,
+        )
+
+    def create_prescriptions_and_orders(self):
+        total_rx = self.counts["prescriptions"]
+        total_orders = self.counts["orders"]
+        rng = self.rng
+        pick_patient = skewed_picker(rng, self.patients, *self.heavy_patients)
+        pick_medicine = skewed_picker(rng, self.medicines, *self.hot_medicines)
+        statuses = [s for s, _ in ORDER_STATUS_WEIGHTS]
+        cum_weights = []
+        for _, w in ORDER_STATUS_WEIGHTS:
+            cum_weights.append((cum_weights[-1] if cum_weights else 0) + w)
+
+        rx_writer = RowWriter(Prescription, [
+            "prescription_id", "doctor", "patient_national_id", "medicine", "dosage",
+            "duration", "quantity", "notes", "status", "created_at", "updated_at",
+        ], using=self.using)
+        order_writer = RowWriter(Order, [
+            "order_id", "patient", "prescription", "total_amount", "status", "branch", "created_at", "updated_at",
+        ], using=self.using)
+        item_writer = RowWriter(OrderItem, ["order", "medicine", "quantity", "price_at_time"], using=self.using)
+
+        for start, end in self._chunks(total_rx):
+            rx_rows, order_rows, item_rows, txn_rows = [], [], [], []
+            for i in range(start, end):
+                patient_id, national_id = pick_patient()
+                medicine_id, price = pick_medicine()
+                quantity = rng.randint(1, 5)
+                rx_created = self._timestamp()
+                rx_id = rx_writer.next_id()
+                ordered = i < total_orders
+                status = rng.choices(statuses, cum_weights=cum_weights)[0] if ordered else None
+                rx_rows.append((
+                    rx_id, self._public_id("RX", 8), rng.choice(self.doctors), national_id, medicine_id,
+                    rng.choice(DOSAGES), rng.choice(DURATIONS), quantity, "",
+                    "filled" if ordered and status != "failed" else "active", rx_created, rx_created,
+                ))
+                if not ordered:
+                    continue
+
+                order_id = order_writer.next_id()
+                public_id = self._public_id("ORD", 8)
+                created_at = self._timestamp(not_before=rx_created)
+                total = price * quantity
+                order_rows.append((order_id, public_id, patient_id, rx_id, total, status, "", created_at, created_at))
+                item_rows.append((item_writer.next_id(), order_id, medicine_id, quantity, price))
+
+                if status == "failed":
+                    continue
+                wallet_id = self.wallet_ids[patient_id]
+                txn_rows.append(self._txn(
+                    wallet_id, "withdrawal", total, f"Payment for order {public_id}", public_id, created_at,
+                ))
+                if status == "cancelled":
+                    txn_rows.append(self._txn(
+                        wallet_id, "refund", total, f"Refund for cancelled order {public_id}", public_id, created_at,
+                    ))
+                else:
+                    self.spent[patient_id] = self.spent.get(patient_id, 0) + total
+                if created_at < self.first_activity.get(patient_id, self.now):
+                    self.first_activity[patient_id] = created_at
+
+            with db_transaction.atomic(using=self.using):
+                rx_writer.write(rx_rows)
+                order_writer.write(order_rows)
+                item_writer.write(item_rows)
+                self.txn_writer.write(txn_rows)
+            if end % (self.chunk_size * 20) == 0:
+                self.log(f"  {end}/{total_rx} prescriptions")
+
+        for writer in (rx_writer, order_writer, item_writer):
+            writer.finish()
+        self.log(f"prescriptions: {rx_writer.written}, orders: {order_writer.written}")
+
+    def fund_wallets(self):
+        # one deposit per patient covering everything they spent plus a remainder
+        for start, end in self._chunks(len(self.wallets)):
+            txn_rows = []
+            for w in self.wallets[start:end]:
+                spent = self.spent.get(w.user_id, Decimal("0"))
+                deposit = spent + Decimal(self.rng.randrange(0, 50000)) / 100
+                w.balance = deposit - spent
+                first = self.first_activity.get(w.user_id, self.now) - timedelta(hours=1)
+                txn_rows.append(self._txn(w.id, "deposit", deposit, "Initial deposit", "", first))
+            with db_transaction.atomic(using=self.using):
+                self.txn_writer.write(txn_rows)
+                Wallet.objects.using(self.using).bulk_update(self.wallets[start:end], ["balance"])
+        self.txn_writer.finish()
+        self.counts["transactions"] = self.txn_writer.written
+        self.log(f"wallets: {len(self.wallets)}, transactions: {self.txn_writer.written}")
@@ -1,3 +1,1386 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import re
+import sqlite3
+import tempfile
+import time
+from contextlib import redirect_stdout
+from unittest import mock, skipUnless
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+from urllib.parse import urlencode
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.admin.sites import site as admin_site
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.db.models import Count, F, QuerySet, Sum
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import admin as core_admin
+from . import assets, backups, branches, compression, diagnostics, exports, fefo, forecasting, ledger, loadgen, patient_summary, profiling, ratelimit, stock_shards, traffic
+from .benchmark import covered_url_names, url_names
+from .metrics import CACHE_LOOKUPS, REQUESTS_TOTAL, Registry
+from .microbench import check as check_fast_paths
+from .middleware import query_budget
+from .models import DemandForecast, Profile, Medicine, Prescription, Order, OrderItem, Wallet, Transaction, StockMovement, StockShard
+from .synthetic import SyntheticDataGenerator
+
+
+# maximum queries per request for every route in core/urls.py, keyed by
+# (url name, method). Raise a budget only together with the change that
+# needs it; list endpoints must additionally stay flat when the data grows.
+QUERY_BUDGETS = {
+    ("home", "GET"): 0,
+    ("signin", "GET"): 0,
+    ("contact", "GET"): 0,
+    ("pharmacist", "GET"): 3,
+    ("doctor", "GET"): 3,
+    ("patient", "GET"): 3,
+    ("api_signup", "POST"): 9,
+    ("api_login", "POST"): 11,
+    ("api_logout", "POST"): 4,
+    ("logout", "GET"): 4,
+    ("api_orders", "GET"): 2,
+    ("api_patient_prescriptions", "GET"): 5,
+    ("api_prescriptions", "GET"): 4,
+    ("api_prescriptions", "POST"): 8,
+    ("api_create_order", "POST"): 19,
+    ("api_bulk_order_status", "POST"): 17,
+    ("api_bootstrap", "GET"): 10,
+    ("api_users", "GET"): 4,
+    ("api_medicines", "GET"): 3,
+    ("api_medicines", "POST"): 6,
+    # +1: the row is re-read under the lock before the stock delta
+    ("api_medicine_detail", "PUT"): 9,
+    ("api_medicine_detail", "DELETE"): 12,
+    ("api_wallet_balance", "GET"): 3,
+    ("api_wallet_deposit", "POST"): 5,
+    ("api_wallet_transactions", "GET"): 6,
+    ("api_total_revenue", "GET"): 5,
+    ("api_patient_stats", "GET"): 5,
+    ("api_diagnostics", "GET"): 7,
+    ("api_pharmacist_all_orders", "GET"): 5,
+    ("api_patient_order_history", "GET"): 4,
+    ("api_stock_at", "GET"): 5,
+    ("api_stock_movements", "GET"): 6,
+    ("metrics", "GET"): 0,
+    ("api_profiles", "GET"): 2,
+    ("api_profile_download", "GET"): 2,
+    ("api_branches", "GET"): 2,
+    ("api_branch_stock", "GET"): 4,
+    ("api_branch_stock", "PUT"): 7,
+    ("api_branch_stock_report", "GET"): 4,
+    ("api_medicine_batches", "GET"): 6,
+    # the first lot of a stocked medicine also books its opening lot
+    ("api_medicine_batches", "POST"): 14,
+    # one more per CHUNK_SIZE rows streamed
+    ("api_export", "GET"): 4,
+    ("api_forecasts", "GET"): 4,
+}
+
+# (url name, role, path) of read endpoints whose query count must not grow with N
+LIST_ENDPOINTS = [
+    ("home", None, "/"),
+    ("signin", None, "/signin/"),
+    ("contact", None, "/contact/"),
+    ("pharmacist", "pharmacist", "/dashboard/pharmacist/"),
+    ("doctor", "doctor", "/dashboard/doctor/"),
+    ("patient", "patient", "/dashboard/patient/"),
+    ("api_orders", "patient", "/api/orders/"),
+    ("api_patient_prescriptions", "patient", "/api/prescriptions/patient/"),
+    ("api_prescriptions", "doctor", "/api/prescriptions/"),
+    ("api_prescriptions", "patient", "/api/prescriptions/"),
+    ("api_prescriptions", "pharmacist", "/api/prescriptions/"),
+    ("api_users", "pharmacist", "/api/users/"),
+    ("api_medicines", "pharmacist", "/api/medicines/"),
+    ("api_wallet_balance", "patient", "/api/wallet/balance/"),
+    ("api_wallet_transactions", "patient", "/api/wallet/transactions/"),
+    ("api_total_revenue", "pharmacist", "/api/revenue/total/"),
+    ("api_patient_stats", "patient", "/api/patient/stats/"),
+    ("api_diagnostics", "pharmacist", "/api/debug/diagnostics/"),
+    ("api_pharmacist_all_orders", "pharmacist", "/api/pharmacist/all-orders/"),
+    ("api_patient_order_history", "patient", "/api/patient/order-history/"),
+    ("metrics", None, "/metrics"),
+    ("api_profiles", "pharmacist", "/api/debug/profiles/"),
+    ("api_bootstrap", "patient", "/api/bootstrap/"),
+    ("api_bootstrap", "pharmacist", "/api/bootstrap/"),
+    ("api_bootstrap", "doctor", "/api/bootstrap/"),
+    ("api_stock_at", "pharmacist", "/api/stock/at/"),
+    ("api_stock_movements", "pharmacist", "/api/stock/movements/"),
+    ("api_branches", "patient", "/api/branches/"),
+    ("api_branch_stock", "patient", "/api/branches/main/stock/"),
+    ("api_branch_stock_report", "pharmacist", "/api/branches/stock-report/"),
+    ("api_forecasts", "pharmacist", "/api/forecasts/"),
+]
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+# budgets and list tests hit the same routes many times in a row
+@override_settings(RATE_LIMITS={"ENABLED": False})
+class ApiTestCase(TestCase):
+    N = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = cls.make_user("qc_patient", "patient", national_id="1000000001")
+        # signup creates it for real patients
+        patient_summary.rebuild([cls.patient.pk])
+        cls.doctor = cls.make_user("qc_doctor", "doctor", practice_code="A-100001")
+        cls.pharmacist = cls.make_user("qc_pharmacist", "pharmacist", practice_code="A-100002", is_staff=True)
+        cls.wallet = Wallet.objects.create(user=cls.patient, balance=Decimal("100000.00"))
+        cls.medicine = Medicine.objects.create(name="Base", price=Decimal("2.00"), stock=100000)
+        cls.seeded = 0
+
+    @staticmethod
+    def make_user(username, role, national_id="", practice_code="", is_staff=False):
+        user = User.objects.create_user(
+            username=username, email=f"{username}@example.com", password="qc-pass-123", is_staff=is_staff,
+        )
+        Profile.objects.create(user=user, role=role, national_id=national_id, practice_code=practice_code)
+        return user
+
+    def seed(self, n):
+        # n more rows of everything the list endpoints read; the patient's
+        # stats counters are left alone, as after a bulk import
+        with patient_summary.maintained():
+            return self._seed(n)
+
+    def _seed(self, n):
+        start = self.seeded
+        self.seeded += n
+        users = User.objects.bulk_create([
+            User(username=f"qc_extra_{i}", email=f"qc_extra_{i}@example.com") for i in range(start, start + n)
+        ])
+        Profile.objects.bulk_create([
+            Profile(user=u, role="patient", national_id=f"2{i:09d}") for i, u in zip(range(start, start + n), users)
+        ])
+        medicines = Medicine.objects.bulk_create([
+            Medicine(name=f"Medicine {i}", price=Decimal("3.00"), stock=50) for i in range(start, start + n)
+        ])
+        orders = []
+        for i, medicine in zip(range(start, start + n), medicines):
+            # an active prescription next to each filled one
+            Prescription.objects.create(
+                doctor=self.doctor, patient_national_id="1000000001", medicine=medicine, quantity=1,
+            )
+            filled = Prescription.objects.create(
+                doctor=self.doctor, patient_national_id="1000000001", medicine=medicine, quantity=2, status="filled",
+            )
+            orders.append(Order(
+                order_id=f"ORD-QC{i:06d}", patient=self.patient, prescription=filled,
+                total_amount=Decimal("6.00"), status="completed",
+            ))
+        orders = Order.objects.bulk_create(orders)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=o, medicine=o.prescription.medicine, quantity=2, price_at_time=Decimal("3.00"))
+            for o in orders
+        ])
+        Transaction.objects.bulk_create([
+            Transaction(wallet=self.wallet, transaction_id=f"TXN-QC{i:08d}", type="withdrawal", amount=Decimal("6.00"))
+            for i in range(start, start + n)
+        ])
+        StockMovement.objects.bulk_create(
+            [StockMovement(medicine=m, kind="receipt", quantity=52) for m in medicines]
+            + [StockMovement(medicine=o.prescription.medicine, kind="sale", quantity=-2) for o in orders]
+        )
+        return orders
+
+    def count_queries(self, role, method, path, body=None, expected=None):
+        client = Client()
+        if role:
+            client.force_login(getattr(self, role))
+        kwargs = {}
+        if body is not None:
+            kwargs = {"data": json.dumps(body), "content_type": "application/json"}
+        with redirect_stdout(io.StringIO()), CaptureQueriesContext(connection) as ctx:
+            response = getattr(client, method.lower())(path, **kwargs)
+        if expected is not None:
+            self.assertEqual(response.status_code, expected, f"{method} {path}: {response.content[:300]}")
+        return len(ctx.captured_queries)
+
+    def get_json(self, role, path):
+        client = Client()
+        client.force_login(getattr(self, role))
+        with redirect_stdout(io.StringIO()):
+            response = client.get(path)
+        return response.status_code, response.json()
+
+    def post(self, role, path, body, method="post"):
+        client = Client()
+        client.force_login(getattr(self, role))
+        with redirect_stdout(io.StringIO()):
+            return getattr(client, method)(path, data=json.dumps(body), content_type="application/json")
+
+
+class QueryCountTests(ApiTestCase):
+    def assert_within_budget(self, url_name, method, count):
+        budget = QUERY_BUDGETS[(url_name, method)]
+        self.assertLessEqual(
+            count, budget, f"{method} {url_name} ran {count} queries, budget is {budget}",
+        )
+
+    def test_every_route_has_a_budget(self):
+        budgeted = {name for name, _ in QUERY_BUDGETS}
+        self.assertEqual(set(url_names()) - budgeted, set())
+
+    def test_every_route_is_benchmarked(self):
+        self.assertEqual(set(url_names()) - covered_url_names(), set())
+
+    def test_list_endpoints_do_not_grow_with_data(self):
+        self.seed(self.N)
+        small = {case: self.count_queries(case[1], "GET", case[2]) for case in LIST_ENDPOINTS}
+        self.seed(self.N * 9)
+        for case in LIST_ENDPOINTS:
+            url_name, role, path = case
+            with self.subTest(url=url_name, role=role):
+                large = self.count_queries(role, "GET", path, expected=200)
+                self.assertEqual(
+                    small[case], large,
+                    f"GET {path} as {role}: {small[case]} queries for {self.N} rows, "
+                    f"{large} for {self.N * 10}",
+                )
+                self.assert_within_budget(url_name, "GET", large)
+
+    def test_bulk_status_does_not_grow_with_batch_size(self):
+        small = [o.order_id for o in self.seed(self.N)]
+        large = [o.order_id for o in self.seed(self.N * 10)]
+        counts = [
+            self.count_queries("pharmacist", "POST", "/api/orders/bulk-status/",
+                               {"order_ids": ids, "status": "cancelled"}, expected=200)
+            for ids in (small, large)
+        ]
+        self.assertEqual(counts[0], counts[1])
+        self.assert_within_budget("api_bulk_order_status", "POST", counts[1])
+
+    def test_write_endpoints_within_budget(self):
+        self.seed(self.N)
+        rx = Prescription.objects.create(
+            doctor=self.doctor, patient_national_id="1000000001", medicine=self.medicine, quantity=1,
+        )
+        doomed = Medicine.objects.create(name="Doomed", price=Decimal("1.00"))
+        cases = [
+            ("api_signup", None, "POST", "/api/signup/",
+             {"name": "New", "email": "new@example.com", "password": "pw-123456",
+              "role": "patient", "national_id": "3000000001"}, 201),
+            ("api_login", None, "POST", "/api/login/",
+             {"email": "qc_patient@example.com", "password": "qc-pass-123"}, 200),
+            ("api_logout", "patient", "POST", "/api/logout/", None, 200),
+            ("logout", "patient", "GET", "/logout/", None, 302),
+            ("api_prescriptions", "doctor", "POST", "/api/prescriptions/",
+             {"patient_national_id": "1000000001", "medicine_id": self.medicine.id, "quantity": 1}, 201),
+            ("api_create_order", "patient", "POST", "/api/orders/create/",
+             {"prescription_id": rx.prescription_id}, 201),
+            ("api_medicines", "pharmacist", "POST", "/api/medicines/", {"name": "Added", "price": "1.50"}, 201),
+            ("api_medicine_detail", "pharmacist", "PUT", f"/api/medicines/{self.medicine.id}/", {"stock": 500}, 200),
+            ("api_medicine_detail", "pharmacist", "DELETE", f"/api/medicines/{doomed.id}/", None, 200),
+            ("api_wallet_deposit", "patient", "POST", "/api/wallet/deposit/", {"amount": "25.00"}, 200),
+            ("api_medicine_batches", "pharmacist", "POST", f"/api/medicines/{self.medicine.id}/batches/",
+             {"quantity": 10, "expiry_date": "2030-01-31"}, 201),
+            ("api_branch_stock", "pharmacist", "PUT", "/api/branches/main/stock/",
+             {"items": [{"medicine_id": self.medicine.id, "stock": 40}]}, 200),
+            ("api_profile_download", "pharmacist", "GET", "/api/debug/profiles/missing.prof/", None, 404),
+        ]
+        for url_name, role, method, path, body, expected in cases:
+            with self.subTest(url=url_name, method=method):
+                count = self.count_queries(role, method, path, body, expected=expected)
+                self.assert_within_budget(url_name, method, count)
+
+
+class HelperFastPathTests(SimpleTestCase):
+    def test_fast_paths_match_reference(self):
+        self.assertEqual(check_fast_paths(), [])
+
+
+class BootstrapApiTests(ApiTestCase):
+    def test_sections_match_standalone_endpoints(self):
+        self.seed(self.N)
+        status, data = self.get_json("patient", "/api/bootstrap/")
+        self.assertEqual(status, 200)
+        self.assertEqual(data["role"], "patient")
+        self.assertEqual(data["prescriptions"], self.get_json("patient", "/api/prescriptions/patient/")[1])
+        self.assertEqual(data["order_history"], self.get_json("patient", "/api/patient/order-history/")[1])
+        self.assertEqual(data["transactions"], self.get_json("patient", "/api/wallet/transactions/")[1])
+        stats = self.get_json("patient", "/api/patient/stats/")[1]
+        self.assertEqual(data["stats"], stats)
+        self.assertEqual(data["wallet"]["balance"], stats["wallet_balance"])
+
+        status, data = self.get_json("pharmacist", "/api/bootstrap/")
+        self.assertEqual(data["orders"], self.get_json("pharmacist", "/api/pharmacist/all-orders/")[1])
+        self.assertEqual(data["medicines"], self.get_json("pharmacist", "/api/medicines/")[1])
+        # every get_json() logs in again, which moves last_login
+        users = self.get_json("pharmacist", "/api/users/")[1]
+        for row in users + data["users"]:
+            row.pop("last_login")
+        self.assertEqual(data["users"], users)
+
+    def test_field_selection(self):
+        status, data = self.get_json("patient", "/api/bootstrap/?fields=stats,wallet")
+        self.assertEqual(status, 200)
+        self.assertEqual(set(data) - {"role", "user"}, {"stats", "wallet"})
+
+        status, data = self.get_json("patient", "/api/bootstrap/?fields=stats,users")
+        self.assertEqual(status, 400)
+        self.assertIn("users", data["error"])
+
+
+@override_settings(DASHBOARD_SSR=True)
+class DashboardCacheTests(ApiTestCase):
+    def render(self, client, path):
+        with redirect_stdout(io.StringIO()), CaptureQueriesContext(connection) as ctx:
+            response = client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return response, len(ctx.captured_queries)
+
+    def initial_data(self, response):
+        content = response.content.decode()
+        start = content.index('<script id="dashboard-initial-data" type="application/json">')
+        start = content.index(">", start) + 1
+        return json.loads(content[start:content.index("</script>", start)])
+
+    def test_embeds_cached_data_until_a_write(self):
+        client = Client()
+        client.force_login(self.doctor)
+        response, misses = self.render(client, "/dashboard/doctor/")
+        data = self.initial_data(response)
+        self.assertEqual(data["role"], "doctor")
+        self.assertEqual(data["medicines"], self.get_json("doctor", "/api/medicines/")[1])
+
+        response, hits = self.render(client, "/dashboard/doctor/")
+        self.assertLess(hits, misses)
+        self.assertEqual(self.initial_data(response), data)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Medicine.objects.create(name="Fresh", price=Decimal("1.00"), stock=5)
+        response, _ = self.render(client, "/dashboard/doctor/")
+        self.assertIn("Fresh", [m["name"] for m in self.initial_data(response)["medicines"]])
+
+    def test_other_roles_get_no_data(self):
+        client = Client()
+        client.force_login(self.patient)
+        response, _ = self.render(client, "/dashboard/doctor/")
+        self.assertNotContains(response, '<script id="dashboard-initial-data"')
+        response, _ = self.render(client, "/dashboard/patient/")
+        self.assertEqual(self.initial_data(response)["wallet"]["balance"], 100000.0)
+
+    @override_settings(DASHBOARD_SSR=False)
+    def test_disabled_by_default(self):
+        client = Client()
+        client.force_login(self.patient)
+        response, _ = self.render(client, "/dashboard/patient/")
+        self.assertNotContains(response, '<script id="dashboard-initial-data"')
+
+
+class CompressionTests(ApiTestCase):
+    def fetch(self, path, accept_encoding=None):
+        client = Client()
+        client.force_login(self.pharmacist)
+        headers = {"HTTP_ACCEPT_ENCODING": accept_encoding} if accept_encoding else {}
+        with redirect_stdout(io.StringIO()):
+            return client.get(path, **headers)
+
+    def test_large_json_is_gzipped_when_accepted(self):
+        self.seed(20)
+        plain = self.fetch("/api/medicines/")
+        self.assertFalse(plain.has_header("Content-Encoding"))
+        self.assertIn("Accept-Encoding", plain["Vary"])
+
+        response = self.fetch("/api/medicines/", "gzip;q=1.0, br;q=0")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(json.loads(gzip.decompress(response.content)), plain.json())
+        self.assertLess(len(response.content), len(plain.content))
+
+    def test_small_responses_stay_plain(self):
+        response = self.fetch("/api/wallet/balance/", "gzip")
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+    def test_negotiate(self):
+        self.assertEqual(compression.negotiate("gzip, deflate", ("br", "gzip")), "gzip")
+        self.assertEqual(compression.negotiate("gzip;q=0.5, br", ("br", "gzip")), "br")
+        self.assertEqual(compression.negotiate("*;q=0.1", ("br", "gzip")), "br")
+        self.assertIsNone(compression.negotiate("identity", ("br", "gzip")))
+        self.assertIsNone(compression.negotiate("gzip;q=0", ("gzip",)))
+
+
+class AssetPipelineTests(SimpleTestCase):
+    def test_minify_js_keeps_literals(self):
+        source = (
+            '"use strict";\n'
+            "// comment\n"
+            "const a = 'x // not a comment';   /* block */\n"
+            "const re = /[/*]+/g, half = a.length / 2;\n"
+            "const html = `<td>\n    ${items.map(i => `<b>${i}</b>`).join('')}  // kept\n</td>`;\n"
+            "\n\n    return\n    value\n"
+        )
+        self.assertEqual(assets.minify_js(source), (
+            '"use strict";\n'
+            "const a = 'x // not a comment';\n"
+            "const re = /[/*]+/g, half = a.length / 2;\n"
+            "const html = `<td>\n    ${items.map(i => `<b>${i}</b>`).join('')}  // kept\n</td>`;\n"
+            "return\nvalue\n"
+        ))
+
+    def test_minify_css(self):
+        css = '/* header */\n.a > .b ,\n.c {\n  color : red;\n  content: "a  b";\n}\n'
+        self.assertEqual(assets.minify_css(css), '.a>.b,.c{color : red;content: "a  b"}\n')
+
+    def test_bundles_build(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            config = {**assets.get_config(), "BUILD_DIR": tmp}
+            built = assets.build_bundles(config)
+            self.assertEqual(set(built), set(assets.BUNDLES))
+            patient = built["core/dist/patient.js"].read_text()
+            # utils is strict but patient.js is not, so the bundle is not either
+            self.assertFalse(patient.startswith('"use strict"'))
+            self.assertIn("const Utils", patient)
+            self.assertIn("function initPatientDashboard", patient)
+            self.assertTrue(built["core/dist/pharmacist.js"].read_text().startswith('"use strict"'))
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "ratelimit-tests"}},
+    RATE_LIMITS={"ENABLED": True, "CACHE": "default", "ROUTES": {
+        "api/debug/diagnostics/": {"ip": "2/min"},
+        "api/users/": {"user": "2/min", "ip": "100/min"},
+    }},
+)
+class RateLimitTests(ApiTestCase):
+    def setUp(self):
+        caches["default"].clear()
+
+    def get(self, client, path, **extra):
+        with redirect_stdout(io.StringIO()):
+            return client.get(path, **extra)
+
+    def test_ip_bucket_returns_429_with_retry_after(self):
+        client = Client()
+        client.force_login(self.pharmacist)
+        statuses = [self.get(client, "/api/debug/diagnostics/").status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+        response = self.get(client, "/api/debug/diagnostics/")
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "30")
+        # another address has its own bucket
+        response = self.get(client, "/api/debug/diagnostics/", REMOTE_ADDR="10.0.0.2")
+        self.assertEqual(response.status_code, 200)
+
+    def test_user_buckets_are_per_user(self):
+        pharmacist, other = Client(), Client()
+        pharmacist.force_login(self.pharmacist)
+        other.force_login(self.make_user("qc_pharmacist_2", "pharmacist", practice_code="A-100003"))
+        statuses = [self.get(pharmacist, "/api/users/").status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+        self.assertEqual(self.get(other, "/api/users/").status_code, 200)
+        # routes without a limit are untouched
+        self.assertEqual(self.get(pharmacist, "/api/medicines/").status_code, 200)
+
+    def test_rejected_request_takes_no_tokens(self):
+        config = dict(ratelimit.get_config(), ROUTES={"route": {"user": "3/min", "ip": "1/min"}})
+
+        def check(addr):
+            request = RequestFactory().get("/", REMOTE_ADDR=addr)
+            request.user = self.pharmacist
+            return ratelimit.check(request, "route", config, now=0)
+
+        self.assertEqual([check("10.0.0.1") for _ in range(3)], [0, 60, 60])
+        # the two requests the ip bucket turned away left the user's tokens alone
+        self.assertEqual([check(f"10.0.0.{n}") for n in (2, 3, 4)], [0, 0, 20])
+
+    def test_bucket_refills(self):
+        cache = caches["default"]
+        self.assertEqual(ratelimit.take(cache, "bucket", "2/min", now=0), 0)
+        self.assertEqual(ratelimit.take(cache, "bucket", "2/min", now=0), 0)
+        self.assertEqual(ratelimit.take(cache, "bucket", "2/min", now=15), 15)
+        self.assertEqual(ratelimit.take(cache, "bucket", "2/min", now=30), 0)
+
+
+class MetricsTests(ApiTestCase):
+    def test_registry_returns_one_metric_per_name(self):
+        registry = Registry()
+        counter = registry.counter("jobs_total", "Jobs.", ["queue"])
+        self.assertIs(registry.counter("jobs_total", "Jobs.", ["queue"]), counter)
+        with self.assertRaises(ValueError):
+            registry.gauge("jobs_total", "Jobs.")
+        with self.assertRaises(ValueError):
+            counter.inc(queue="a", extra="b")
+
+        counter.inc(queue="a")
+        counter.inc(2, queue="a")
+        gauge = registry.gauge("busy", "Busy workers.")
+        gauge.inc(3)
+        gauge.dec()
+        self.assertEqual((counter.value(queue="a"), counter.value(queue="b"), gauge.value()), (3, 0, 2))
+        gauge.set(7)
+        self.assertEqual(gauge.value(), 7)
+        registry.clear()
+        self.assertEqual((counter.value(queue="a"), gauge.value()), (0, 0))
+
+    def test_text_format(self):
+        registry = Registry()
+        registry.counter("idle_total", "Never incremented.")
+        registry.counter("paths_total", "Paths.", ["path"]).inc(path='a"b\\c\nd')
+        histogram = registry.histogram("wait_seconds", "Waits.", ["queue"], buckets=(5, 1))
+        registry.histogram("unused_seconds", "Never observed.")
+        for value in (0.5, 3, 5, 10):
+            histogram.observe(value, queue="q")
+
+        self.assertEqual(registry.render().splitlines(), [
+            "# HELP idle_total Never incremented.",
+            "# TYPE idle_total counter",
+            "idle_total 0",
+            "# HELP paths_total Paths.",
+            "# TYPE paths_total counter",
+            'paths_total{path="a\\"b\\\\c\\nd"} 1',
+            "# HELP wait_seconds Waits.",
+            "# TYPE wait_seconds histogram",
+            # buckets are cumulative and their bounds inclusive
+            'wait_seconds_bucket{queue="q",le="1"} 1',
+            'wait_seconds_bucket{queue="q",le="5"} 3',
+            'wait_seconds_bucket{queue="q",le="+Inf"} 4',
+            'wait_seconds_sum{queue="q"} 18.5',
+            'wait_seconds_count{queue="q"} 4',
+            "# HELP unused_seconds Never observed.",
+            "# TYPE unused_seconds histogram",
+        ])
+
+    def scrape(self, user=None, addr="10.0.0.1"):
+        client = Client(REMOTE_ADDR=addr)
+        if user is not None:
+            client.force_login(user)
+        return client.get("/metrics")
+
+    def test_metrics_access(self):
+        self.assertEqual(self.scrape().status_code, 403)
+        self.assertEqual(self.scrape(self.patient).status_code, 403)
+        self.assertEqual(self.scrape(self.pharmacist).status_code, 200)
+        self.assertEqual(self.scrape(addr="127.0.0.1").status_code, 200)
+        with override_settings(METRICS_ALLOWED_IPS=["10.0.0.1"]):
+            self.assertEqual(self.scrape().status_code, 200)
+
+    def test_scrape_counts_the_request(self):
+        route = "api/medicines/"
+        requests = REQUESTS_TOTAL.value(route=route, method="GET", status=200)
+        self.get_json("pharmacist", "/" + route)
+        response = self.scrape(addr="127.0.0.1")
+        self.assertEqual(response["Content-Type"], "text/plain; version=0.0.4; charset=utf-8")
+        samples = dict(line.rsplit(" ", 1) for line in response.content.decode().splitlines() if not line.startswith("#"))
+
+        key = f'{{route="{route}",method="GET",status="200"}}'
+        self.assertEqual(samples["pharmacy_http_requests_total" + key], str(requests + 1))
+        count = int(samples[f'pharmacy_http_request_db_queries_count{{route="{route}"}}'])
+        self.assertGreaterEqual(count, 1)
+        self.assertEqual(samples[f'pharmacy_http_request_db_queries_bucket{{route="{route}",le="+Inf"}}'], str(count))
+        self.assertIn(f'pharmacy_http_request_duration_seconds_bucket{{route="{route}",method="GET",le="+Inf"}}', samples)
+
+
+class ServerTimingTests(ApiTestCase):
+    route = "api/medicines/"
+
+    def get(self):
+        client = Client()
+        client.force_login(self.pharmacist)
+        with redirect_stdout(io.StringIO()):
+            response = client.get("/" + self.route)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_header_format(self):
+        header = self.get()["Server-Timing"]
+        self.assertRegex(header, r'^db;dur=\d+\.\d;desc="\d+ queries", view;dur=\d+\.\d, .*total;dur=\d+\.\d$')
+        for entry in header.split(", "):
+            self.assertRegex(entry, r'^\w+(;dur=\d+\.\d)?(;desc="[^"]*")?$')
+
+    def test_route_budget_overrides_the_default(self):
+        with override_settings(QUERY_BUDGET=1, QUERY_BUDGETS={self.route: 100}):
+            self.assertEqual((query_budget(self.route), query_budget("api/orders/")), (100, 1))
+        with override_settings(QUERY_BUDGET=None, QUERY_BUDGETS={}):
+            self.assertIsNone(query_budget(self.route))
+
+    def test_over_budget_is_flagged(self):
+        with override_settings(QUERY_BUDGETS={self.route: 1}), self.assertLogs("core.timing", "WARNING") as logs:
+            response = self.get()
+        queries = re.search(r'desc="(\d+) queries"', response["Server-Timing"]).group(1)
+        self.assertEqual(response["X-Query-Budget-Exceeded"], f"{queries}/1")
+        self.assertIn(f'budget;desc="{queries}/1 queries"', response["Server-Timing"])
+        self.assertEqual(logs.output, [
+            f"WARNING:core.timing:Query budget exceeded on {self.route}: {queries} queries (budget 1)",
+        ])
+
+    def test_within_budget_is_not_flagged(self):
+        with override_settings(QUERY_BUDGET=1, QUERY_BUDGETS={self.route: 100}), self.assertNoLogs("core.timing", "WARNING"):
+            response = self.get()
+        self.assertNotIn("X-Query-Budget-Exceeded", response)
+        self.assertNotIn("budget;", response["Server-Timing"])
+
+
+class SlowQueryLogTests(ApiTestCase):
+    def get_medicines(self):
+        client = Client()
+        client.force_login(self.pharmacist)
+        with redirect_stdout(io.StringIO()):
+            response = client.get("/api/medicines/")
+        self.assertEqual(response.status_code, 200)
+        return int(re.search(r'desc="(\d+) queries"', response["Server-Timing"]).group(1))
+
+    def test_every_query_logged_with_its_plan_without_being_counted_twice(self):
+        baseline = self.get_medicines()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "slow.jsonl"
+            with override_settings(SLOW_QUERY_LOG={"ENABLED": True, "THRESHOLD_MS": 0, "PATH": path}):
+                queries = self.get_medicines()
+            entries = [json.loads(line) for line in path.read_text().splitlines()]
+
+        # the EXPLAINs run outside the execute_wrappers that count queries
+        self.assertEqual(queries, baseline)
+        medicines = [e for e in entries if e["shape"].startswith('SELECT "core_medicine"')]
+        self.assertEqual(len(medicines), 1, [e["shape"] for e in entries])
+        entry = medicines[0]
+        self.assertEqual((entry["view"], entry["method"], entry["db"]), ("api_medicines", "GET", "default"))
+        self.assertTrue(entry["plan"])
+        self.assertFalse(any(step.startswith("EXPLAIN failed") for e in entries for step in e.get("plan") or ()))
+
+
+class ProfilingTests(ApiTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.config = dict(profiling.get_config(), DIR=Path(tmp.name), BACKEND="cprofile")
+
+    def request(self, user=None, query="", **headers):
+        request = RequestFactory().get("/api/medicines/" + query, **headers)
+        request.user = user or AnonymousUser()
+        return request
+
+    def test_token_or_staff_flag_gates_profiling(self):
+        header = self.config["HEADER"]
+        expired = profiling.make_token()
+        cases = [
+            (self.request(**{header: profiling.make_token()}), True),
+            (self.request(**{header: "profile:forged"}), False),
+            (self.request(self.pharmacist, "?_profile"), True),
+            (self.request(self.patient, "?_profile"), False),
+            (self.request(query="?_profile"), False),
+            (self.request(self.pharmacist), False),
+        ]
+        for request, expected in cases:
+            self.assertEqual(profiling.should_profile(request, self.config), expected, request.META)
+        with mock.patch("django.core.signing.time.time", return_value=time.time() + self.config["TOKEN_MAX_AGE"] + 1):
+            self.assertFalse(profiling.should_profile(self.request(**{header: expired}), self.config))
+
+    def profiled_get(self):
+        client = Client()
+        client.force_login(self.pharmacist)
+        with override_settings(PROFILER=self.config), redirect_stdout(io.StringIO()):
+            return client.get("/api/medicines/?_profile")
+
+    def test_profiles_are_saved(self):
+        response = self.profiled_get()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue((self.config["DIR"] / response["X-Profile-Id"]).is_file())
+
+    def test_busy_profiler_serves_the_request_unprofiled(self):
+        # what cProfile raises on Python 3.12+ while another profiler runs
+        busy = ValueError("Another profiling tool is already active")
+        with mock.patch.object(profiling.cProfile.Profile, "enable", side_effect=busy):
+            response = self.profiled_get()
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("X-Profile-Id", response)
+        self.assertEqual(profiling.list_profiles(self.config), [])
+
+
+# PRAGMA synchronous cannot change inside the transaction TestCase wraps
+class SeedCommandTests(TransactionTestCase):
+    def seed(self, **options):
+        options = {"users": 20, "medicines": 10, "orders": 50, "prefix": "t", **options}
+        call_command("seed", stdout=io.StringIO(), **options)
+
+    def synchronous(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA synchronous")
+            return cursor.fetchone()[0]
+
+    def test_generated_data_is_consistent(self):
+        self.seed()
+        users = User.objects.filter(username__startswith="t_")
+        self.assertEqual(users.count(), 20)
+        orders = Order.objects.filter(patient__in=users)
+        self.assertEqual(orders.count(), 50)
+        self.assertEqual(
+            list(orders.annotate(n=Count("items")).values_list("n", flat=True).distinct()), [1],
+        )
+        self.assertEqual(Prescription.objects.filter(doctor__in=users).count(), 60)
+
+        wallets = Wallet.objects.filter(user__in=users)
+        self.assertTrue(wallets.exists())
+        sums = {
+            (wallet_id, kind): amount
+            for wallet_id, kind, amount in Transaction.objects.filter(wallet__in=wallets)
+            .values("wallet_id", "type").annotate(total=Sum("amount")).values_list("wallet_id", "type", "total")
+        }
+        for wallet in wallets:
+            total = lambda kind: sums.get((wallet.id, kind), Decimal("0"))
+            self.assertEqual(wallet.balance, total("deposit") - total("withdrawal") + total("refund"), wallet.user_id)
+
+    def test_prefix_must_be_new(self):
+        self.seed()
+        with self.assertRaisesMessage(CommandError, "Users with prefix 't_' already exist"):
+            self.seed()
+        self.seed(prefix="u")
+        self.assertEqual(User.objects.filter(username__startswith="u_").count(), 20)
+        # the second run's patients get national ids of their own
+        national_ids = list(Profile.objects.filter(role="patient").values_list("national_id", flat=True))
+        self.assertEqual(len(national_ids), len(set(national_ids)))
+
+    def set_synchronous(self, level):
+        with connection.cursor() as cursor:
+            cursor.execute(f"PRAGMA synchronous = {level}")
+
+    def test_fast_restores_the_previous_synchronous_level(self):
+        self.addCleanup(self.set_synchronous, self.synchronous())
+        self.set_synchronous(1)
+        seen = []
+        generate = SyntheticDataGenerator.generate
+
+        def spy(generator):
+            seen.append(self.synchronous())
+            return generate(generator)
+
+        with mock.patch.object(SyntheticDataGenerator, "generate", spy):
+            self.seed(fast=True)
+        # OFF while seeding, NORMAL again afterwards
+        self.assertEqual((seen, self.synchronous()), ([0], 1))
+        self.assertEqual(Order.objects.count(), 50)
+
+
+class TrafficRecorderTests(ApiTestCase):
+    password = "qc-pass-123"
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / "traffic.jsonl"
+        recording = override_settings(TRAFFIC_RECORDING={"ENABLED": True, "PATH": self.path})
+        recording.enable()
+        self.addCleanup(recording.disable)
+
+    def record_traffic(self):
+        # a form post from one browser, then a login and a checkout from another
+        Client().post("/api/login/", data=urlencode({"email": self.patient.email, "password": self.password}),
+                      content_type="application/x-www-form-urlencoded")
+        client = Client()
+        with redirect_stdout(io.StringIO()):
+            response = client.post("/api/login/", data=json.dumps({"email": self.patient.email, "password": self.password}),
+                                   content_type="application/json")
+            self.assertEqual(response.status_code, 200, response.content)
+            rx = Prescription.objects.create(doctor=self.doctor, patient_national_id="1000000001",
+                                             medicine=self.medicine, quantity=1)
+            response = client.post("/api/orders/create/", data=json.dumps({"prescription_id": rx.prescription_id}),
+                                   content_type="application/json", HTTP_AUTHORIZATION="Bearer not-for-the-log")
+            self.assertEqual(response.status_code, 201, response.content)
+            # skipped prefixes
+            client.get("/metrics")
+            client.get("/api/debug/diagnostics/")
+        return client.cookies[settings.SESSION_COOKIE_NAME].value
+
+    def test_records_requests_without_secrets(self):
+        session_key = self.record_traffic()
+        text = self.path.read_text()
+        for secret in (self.password, session_key, "not-for-the-log"):
+            self.assertNotIn(secret, text)
+
+        records = traffic.load_records(traffic.log_files(self.path))
+        self.assertEqual([r["path"] for r in records], ["/api/login/", "/api/login/", "/api/orders/create/"])
+        form, login, checkout = records
+        self.assertEqual(form["body"], urlencode({"email": self.patient.email, "password": traffic.REDACTED}))
+        self.assertEqual(json.loads(login["body"]), {"email": self.patient.email, "password": traffic.REDACTED})
+        self.assertEqual((login["route"], login["status"], login["user"]), ("api/login/", 200, self.patient.email))
+        self.assertEqual(checkout["status"], 201)
+        self.assertEqual(checkout["session_in"], traffic.session_ref(session_key))
+        self.assertEqual(login["session_out"], checkout["session_in"])
+
+    def test_replay_parses_the_log(self):
+        self.record_traffic()
+        sent = []
+
+        def request(session, method, path, query="", body=None, content_type=None):
+            sent.append((method, path, body))
+            return 0.002, 200, None
+
+        out = io.StringIO()
+        with mock.patch.object(loadgen.Session, "request", autospec=True, side_effect=request):
+            call_command("replay_traffic", path=str(self.path), processes=1, password="replayed", stdout=out)
+        self.assertIn("Replaying 3 requests in 2 sessions", out.getvalue())
+        self.assertIn("POST api/orders/create/", out.getvalue())
+        # redacted passwords are replaced by --password
+        logins = [body for method, path, body in sent if path == "/api/login/"]
+        self.assertCountEqual(logins, [
+            urlencode({"email": self.patient.email, "password": "replayed"}),
+            json.dumps({"email": self.patient.email, "password": "replayed"}),
+        ])
+
+
+class StockLedgerTests(ApiTestCase):
+    def test_every_stock_change_is_recorded(self):
+        medicine_id = self.post("pharmacist", "/api/medicines/", {"name": "Ledgered", "price": "1.00", "stock": 10}).json()["id"]
+        self.post("pharmacist", f"/api/medicines/{medicine_id}/", {"stock": 7}, "put")
+        order = self.seed(1)[0]
+        self.post("pharmacist", "/api/orders/bulk-status/", {"order_ids": [order.order_id], "status": "cancelled"})
+
+        self.assertEqual(
+            list(StockMovement.objects.filter(medicine_id=medicine_id).values_list("kind", "quantity")),
+            [("receipt", 10), ("adjustment", -3)],
+        )
+        returned = order.prescription.medicine
+        self.assertEqual(
+            StockMovement.objects.filter(medicine=returned, kind="return").get().reference_id, order.order_id,
+        )
+        # seeded with a +52 receipt and a -2 sale, back to 52 after the return
+        returned.refresh_from_db()
+        self.assertEqual(ledger.stock_at(timezone.now(), [returned.id]), {returned.id: 52})
+        self.assertEqual(returned.stock, 52)
+
+    def test_stock_edit_keeps_a_concurrent_checkout(self):
+        medicine = Medicine.objects.create(name="Raced", price=Decimal("1.00"), stock=10)
+
+        def checkout_lands(value, default):
+            # a checkout takes 4 units after the request loaded the medicine
+            Medicine.objects.filter(id=medicine.id).update(stock=F("stock") - 4)
+            return Decimal(value)
+
+        with mock.patch("core.api_views._to_decimal", side_effect=checkout_lands):
+            self.post("pharmacist", f"/api/medicines/{medicine.id}/", {"price": "2.00"}, "put")
+            medicine.refresh_from_db()
+            self.assertEqual((medicine.price, medicine.stock), (Decimal("2.00"), 6))
+            self.post("pharmacist", f"/api/medicines/{medicine.id}/", {"price": "3.00", "stock": 20}, "put")
+        medicine.refresh_from_db()
+        self.assertEqual(medicine.stock, 20)
+        adjustments = StockMovement.objects.filter(medicine=medicine, kind="adjustment").values_list("quantity", flat=True)
+        # 6 - 4 = 2 were on hand when the count was set
+        self.assertEqual(list(adjustments), [18])
+
+    def test_point_in_time_reads_snapshot_plus_tail(self):
+        t0 = timezone.now()
+        medicine = Medicine.objects.create(name="Timed", stock=0)
+        for days, kind, qty in [(10, "receipt", 100), (8, "sale", -30), (5, "sale", -20), (2, "return", 5)]:
+            StockMovement.objects.create(medicine=medicine, kind=kind, quantity=qty, created_at=t0 - timedelta(days=days))
+        snapshots, _ = ledger.take_snapshots(when=t0 - timedelta(days=6))
+        self.assertEqual({s.medicine_id: s.stock for s in snapshots}[medicine.id], 70)
+        # a movement the snapshot did not see, backdated before it, still counts
+        StockMovement.objects.create(medicine=medicine, kind="adjustment", quantity=-1, created_at=t0 - timedelta(days=7))
+
+        def at(days):
+            return ledger.stock_at(t0 - timedelta(days=days), [medicine.id])[medicine.id]
+        self.assertEqual([at(11), at(9), at(6), at(4), at(1)], [0, 100, 69, 49, 54])
+
+        report = ledger.movement_report(t0 - timedelta(days=9), t0, [medicine.id])
+        self.assertEqual(report, [{
+            "medicine_id": medicine.id, "opening": 100, "receipt": 0, "sale": -50,
+            "adjustment": -1, "return": 5, "closing": 54,
+        }])
+
+    def test_movements_are_append_only(self):
+        movement = StockMovement.objects.create(medicine=self.medicine, kind="receipt", quantity=1)
+        movement.quantity = 2
+        with self.assertRaises(ValueError):
+            movement.save()
+
+
+class StockShardTests(ApiTestCase):
+    def test_take_borrows_across_shards(self):
+        medicine = Medicine.objects.create(name="Hot", stock=10)
+        stock_shards.enable(medicine, 4)
+        medicine.refresh_from_db()
+        self.assertEqual(list(medicine.shards.order_by("shard").values_list("quantity", flat=True)), [3, 3, 2, 2])
+
+        stock_shards.take(medicine, 7)
+        self.assertEqual(stock_shards.available(medicine), 3)
+        # a failed borrow rolls back what it took from the other shards
+        with self.assertRaises(stock_shards.InsufficientStock), transaction.atomic():
+            stock_shards.take(medicine, 4)
+        self.assertEqual(stock_shards.available(medicine), 3)
+        stock_shards.put_back({medicine.id: 2})
+        self.assertEqual(stock_shards.overlay([medicine])[0].stock, 5)
+
+        stock_shards.disable(medicine)
+        medicine.refresh_from_db()
+        self.assertEqual((medicine.stock, medicine.stock_shards), (5, 0))
+        self.assertFalse(StockShard.objects.filter(medicine=medicine).exists())
+
+    def test_checkout_and_reads_use_shard_totals(self):
+        medicine = Medicine.objects.create(name="Sharded", price=Decimal("1.00"), stock=20)
+        ledger.record(medicine.id, "receipt", 20)
+        stock_shards.enable(medicine, 3)
+        prescription = Prescription.objects.create(
+            doctor=self.doctor, patient_national_id="1000000001", medicine=medicine, quantity=5,
+        )
+        response = self.post("patient", "/api/orders/create/", {"prescription_id": prescription.prescription_id})
+        self.assertEqual(response.status_code, 201, response.content)
+
+        medicines = {m["id"]: m for m in self.get_json("pharmacist", "/api/medicines/")[1]}
+        self.assertEqual(medicines[medicine.id]["stock"], 15)
+        # the checkout never touched the hot row itself
+        medicine.refresh_from_db()
+        self.assertEqual(medicine.stock, 20)
+        self.assertEqual(ledger.take_snapshots()[1].get(medicine.id), None)
+
+
+
+class BulkOrderStatusTests(ApiTestCase):
+    def checkout(self, quantity):
+        rx = Prescription.objects.create(doctor=self.doctor, patient_national_id="1000000001",
+                                         medicine=self.medicine, quantity=quantity)
+        response = self.post("patient", "/api/orders/create/", {"prescription_id": rx.prescription_id})
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()["order_id"]
+
+    def bulk(self, order_ids, status):
+        response = self.post("pharmacist", "/api/orders/bulk-status/", {"order_ids": order_ids, "status": status})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_mixed_batch_moves_only_allowed_transitions(self):
+        completed = self.checkout(1)
+        pending = Order.objects.create(patient=self.patient, total_amount=Decimal("2.00"), status="pending").order_id
+        data = self.bulk([completed, pending, "ORD-MISSING"], "processing")
+        self.assertEqual((data["updated"], data["updated_order_ids"], data["not_found"]), (1, [pending], ["ORD-MISSING"]))
+        self.assertEqual([(s["order_id"], s["status"]) for s in data["skipped"]], [(completed, "completed")])
+        statuses = dict(Order.objects.values_list("order_id", "status"))
+        self.assertEqual((statuses[completed], statuses[pending]), ("completed", "processing"))
+        self.assertEqual(self.post("pharmacist", "/api/orders/bulk-status/",
+                                   {"order_ids": [pending], "status": "shipped"}).status_code, 400)
+        self.assertEqual(self.post("patient", "/api/orders/bulk-status/",
+                                   {"order_ids": [pending], "status": "cancelled"}).status_code, 403)
+
+    def test_cancel_refunds_and_restocks_once(self):
+        balance, stock = self.wallet.balance, self.medicine.stock
+        first, second = self.checkout(3), self.checkout(2)
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, balance - Decimal("10.00"))
+
+        data = self.bulk([first, second], "cancelled")
+        self.assertEqual((data["updated"], data["refunded_total"], data["restocked_medicines"]), (2, 10.0, 1))
+        self.wallet.refresh_from_db()
+        self.medicine.refresh_from_db()
+        self.assertEqual((self.wallet.balance, self.medicine.stock), (balance, stock))
+        self.assertEqual(Transaction.objects.filter(type="refund", reference_id__in=[first, second]).count(), 2)
+
+        # already cancelled: skipped, nothing refunded or restocked again
+        data = self.bulk([first], "cancelled")
+        self.assertEqual((data["updated"], data["refunded_total"], data["restocked_medicines"]), (0, 0.0, 0))
+        self.assertEqual(data["skipped"][0]["status"], "cancelled")
+        self.wallet.refresh_from_db()
+        self.medicine.refresh_from_db()
+        self.assertEqual((self.wallet.balance, self.medicine.stock), (balance, stock))
+        self.assertEqual(Transaction.objects.filter(type="refund", reference_id=first).count(), 1)
+
+    def test_order_changed_after_read_is_left_alone(self):
+        balance, stock = self.wallet.balance, self.medicine.stock
+        raced, kept = self.checkout(3), self.checkout(2)
+        update = QuerySet.update
+
+        def racing_update(queryset, **kwargs):
+            # another request cancels the order between the read and the update
+            with connection.cursor() as cursor:
+                cursor.execute(f"UPDATE {Order._meta.db_table} SET status = 'cancelled' WHERE order_id = %s", [raced])
+            return update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, "update", autospec=True, side_effect=racing_update):
+            data = self.bulk([raced, kept], "cancelled")
+        self.assertEqual((data["updated"], data["updated_order_ids"]), (1, [kept]))
+        self.assertEqual((data["refunded_total"], data["restocked_medicines"]), (4.0, 1))
+        self.wallet.refresh_from_db()
+        self.medicine.refresh_from_db()
+        self.assertEqual((self.wallet.balance, self.medicine.stock), (balance - Decimal("6.00"), stock - 3))
+        self.assertFalse(Transaction.objects.filter(type="refund", reference_id=raced).exists())
+
+
+class PatientSummaryTests(ApiTestCase):
+    def stats(self):
+        return self.get_json("patient", "/api/patient/stats/")[1]
+
+    def test_counters_follow_checkout_and_status_changes(self):
+        self.post("doctor", "/api/prescriptions/", {"patient_national_id": "1000000001", "medicine_id": self.medicine.id, "quantity": 3})
+        self.assertEqual(self.stats()["active_prescriptions"], 1)
+
+        rx = Prescription.objects.get(patient_national_id="1000000001", status="active")
+        order_id = self.post("patient", "/api/orders/create/", {"prescription_id": rx.prescription_id}).json()["order_id"]
+        stats = self.stats()
+        self.assertEqual((stats["active_prescriptions"], stats["total_orders"], stats["total_spent"]), (0, 1, 6.0))
+
+        self.post("pharmacist", "/api/orders/bulk-status/", {"order_ids": [order_id], "status": "cancelled"})
+        stats = self.stats()
+        self.assertEqual((stats["total_orders"], stats["pending_orders"], stats["total_spent"]), (1, 0, 0.0))
+        self.assertEqual(patient_summary.drift([self.patient.pk]), {})
+
+    def test_repair_fixes_drift(self):
+        # seeding writes orders without touching the counters, like an import
+        self.seed(2)
+        self.assertEqual(patient_summary.drift([self.patient.pk])[self.patient.pk]["total_orders"], (0, 2))
+        call_command("repair_patient_summaries", batch_size=1, stdout=io.StringIO())
+        self.assertEqual(patient_summary.drift([self.patient.pk]), {})
+        self.assertEqual(self.stats()["total_spent"], 12.0)
+
+    def test_edits_outside_the_api_drop_the_counters(self):
+        self.assertEqual(self.stats()["total_orders"], 0)
+        rx = Prescription.objects.create(doctor=self.doctor, patient_national_id="1000000001", medicine=self.medicine)
+        self.assertEqual(self.stats()["active_prescriptions"], 1)
+        order = Order.objects.create(patient=self.patient, prescription=rx, total_amount=Decimal("4.00"), status="pending")
+        self.assertEqual(self.stats()["pending_orders"], 1)
+
+        # what an admin edit does
+        order.status = "completed"
+        order.save()
+        rx.status = "filled"
+        rx.save()
+        stats = self.stats()
+        self.assertEqual((stats["pending_orders"], stats["total_spent"], stats["active_prescriptions"]), (0, 4.0, 0))
+
+        # moving the order to another patient fixes both
+        other = self.make_user("qc_patient_2", "patient", national_id="1000000002")
+        patient_summary.rebuild([other.pk])
+        order.patient = other
+        order.save()
+        self.assertEqual(self.stats()["total_orders"], 0)
+        self.assertEqual(patient_summary.get(other).total_orders, 1)
+
+
+
+TWO_BRANCHES = {"north": {"NAME": "North", "DATABASE": "default"}, "south": {"NAME": "South", "DATABASE": "default"}}
+
+
+@override_settings(BRANCHES=TWO_BRANCHES)
+class BranchTests(ApiTestCase):
+    def test_checkout_and_cancel_use_branch_stock(self):
+        self.post("pharmacist", "/api/branches/north/stock/", {"items": [{"medicine_id": self.medicine.id, "stock": 5}]}, "put")
+        branches.set_stock("south", {self.medicine.id: 7})
+        rx = [
+            Prescription.objects.create(doctor=self.doctor, patient_national_id="1000000001", medicine=self.medicine, quantity=4)
+            for _ in range(2)
+        ]
+        order = self.post("patient", "/api/orders/create/", {"prescription_id": rx[0].prescription_id, "branch": "north"})
+        self.assertEqual(order.status_code, 201, order.content)
+        # north has 1 left: the second checkout fails and takes nothing anywhere
+        failed = self.post("patient", "/api/orders/create/", {"prescription_id": rx[1].prescription_id, "branch": "north"})
+        self.assertEqual(failed.status_code, 400)
+        self.assertEqual(Order.objects.get(order_id=order.json()["order_id"]).branch, "north")
+
+        report = self.get_json("pharmacist", "/api/branches/stock-report/")[1]["items"]
+        self.assertEqual(report, [{"medicine_id": self.medicine.id, "name": "Base",
+                                   "branches": {"north": 1, "south": 7}, "total": 8}])
+
+        self.post("pharmacist", "/api/orders/bulk-status/", {"order_ids": [order.json()["order_id"]], "status": "cancelled"})
+        self.assertEqual(branches.stock("north"), {self.medicine.id: 5})
+        self.assertEqual(self.post("patient", "/api/orders/create/", {"prescription_id": rx[1].prescription_id,
+                                                                     "branch": "west"}).status_code, 400)
+
+
+class BranchRouterTests(SimpleTestCase):
+    @override_settings(BRANCHES={**TWO_BRANCHES, "east": {"NAME": "East", "DATABASE": "branch_east"}})
+    def test_branch_databases_hold_only_branch_stock(self):
+        router = branches.BranchRouter()
+        self.assertTrue(router.allow_migrate("branch_east", "core", "branchstock"))
+        self.assertFalse(router.allow_migrate("branch_east", "core", "order"))
+        self.assertFalse(router.allow_migrate("branch_east", "auth", "user"))
+        self.assertIsNone(router.allow_migrate("default", "core", "order"))
+        self.assertEqual(router.db_for_write(branches.BranchStock, instance=branches.BranchStock(branch="east")), "branch_east")
+        self.assertIsNone(router.db_for_write(Order))
+
+    @override_settings(BRANCHES=TWO_BRANCHES)
+    def test_fan_out_runs_every_branch(self):
+        self.assertEqual(branches.fan_out(str.upper), {"north": "NORTH", "south": "SOUTH"})
+
+
+class FefoTests(ApiTestCase):
+    def test_checkout_draws_earliest_expiry_first_across_batches(self):
+        medicine = Medicine.objects.create(name="Lots", price=Decimal("1.00"), stock=0)
+        today = timezone.localdate()
+        path = f"/api/medicines/{medicine.id}/batches/"
+        for batch, days, qty in [("LATE", 90, 10), ("SOON", 10, 3), ("GONE", -1, 50), ("MID", 30, 4)]:
+            self.post("pharmacist", path, {"batch_number": batch, "quantity": qty,
+                                           "expiry_date": (today + timedelta(days=days)).isoformat()})
+        rx = Prescription.objects.create(doctor=self.doctor, patient_national_id="1000000001", medicine=medicine, quantity=5)
+        response = self.post("patient", "/api/orders/create/", {"prescription_id": rx.prescription_id})
+        self.assertEqual(response.status_code, 201, response.content)
+
+        # SOON emptied, MID gave 2, the expired lot untouched
+        left = dict(medicine.batches.values_list("batch_number", "quantity"))
+        self.assertEqual(left, {"LATE": 10, "SOON": 0, "GONE": 50, "MID": 2})
+        self.assertEqual(fefo.totals([medicine.id])[medicine.id]["sellable"], 12)
+
+        client = Client()
+        client.force_login(self.pharmacist)
+        with CaptureQueriesContext(connection) as ctx:
+            data = client.get(path).json()
+        self.assertLessEqual(len(ctx.captured_queries), QUERY_BUDGETS[("api_medicine_batches", "GET")])
+        self.assertEqual([b["batch_number"] for b in data["batches"]], ["GONE", "MID", "LATE"])
+        self.assertEqual((data["stock"], data["expired"], data["next_expiry"]), (62, 50, str(today + timedelta(days=30))))
+
+        self.post("pharmacist", "/api/orders/bulk-status/", {"order_ids": [response.json()["order_id"]], "status": "cancelled"})
+        self.assertEqual(dict(medicine.batches.values_list("batch_number", "quantity"))["SOON"], 3)
+
+    def test_expired_batches_are_not_dispensed(self):
+        medicine = Medicine.objects.create(name="Old", price=Decimal("1.00"), stock=0)
+        fefo.receive(medicine, 8, timezone.localdate() - timedelta(days=1))
+        rx = Prescription.objects.create(doctor=self.doctor, patient_national_id="1000000001", medicine=medicine, quantity=2)
+        response = self.post("patient", "/api/orders/create/", {"prescription_id": rx.prescription_id})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.filter(prescription=rx).exists())
+
+    def test_stock_on_hand_becomes_the_opening_lot(self):
+        medicine = Medicine.objects.create(name="Untracked", price=Decimal("1.00"), stock=100)
+        self.post("pharmacist", f"/api/medicines/{medicine.id}/batches/", {
+            "batch_number": "NEW", "quantity": 10, "expiry_date": (timezone.localdate() + timedelta(days=5)).isoformat(),
+        })
+        rx = Prescription.objects.create(doctor=self.doctor, patient_national_id="1000000001", medicine=medicine, quantity=20)
+        response = self.post("patient", "/api/orders/create/", {"prescription_id": rx.prescription_id})
+        self.assertEqual(response.status_code, 201, response.content)
+        # NEW expires first, the rest comes from the stock on hand
+        lots = lambda: dict(medicine.batches.values_list("batch_number", "quantity"))
+        self.assertEqual(lots(), {fefo.OPENING_BATCH: 90, "NEW": 0})
+
+        # stock set by hand moves the batches with it
+        for stock, expected in [(100, 100), (60, 60)]:
+            response = self.post("pharmacist", f"/api/medicines/{medicine.id}/", {"stock": stock}, "put")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(sum(lots().values()), expected)
+        self.assertEqual(fefo.totals([medicine.id])[medicine.id]["sellable"], 60)
+
+
+
+class ExportTests(ApiTestCase):
+    def export(self, path):
+        client = Client()
+        client.force_login(self.pharmacist)
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(path)
+            # the rows are only queried while the body streams
+            body = b"".join(response.streaming_content if response.streaming else [response.content]).decode()
+        return response, body, len(ctx.captured_queries)
+
+    def test_streams_in_chunks_and_resumes_by_cursor(self):
+        self.seed(5)
+        ids = list(Order.objects.order_by("id").values_list("id", flat=True))
+        with mock.patch.object(exports, "CHUNK_SIZE", 2):
+            response, body, queries = self.export("/api/exports/orders/?format=jsonl&columns=order_id,status")
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([r["id"] for r in rows], ids)
+        self.assertEqual(set(rows[0]), {"id", "order_id", "status"})
+
+        # 5 rows in chunks of 2: three chunk queries
+        with mock.patch.object(exports, "CHUNK_SIZE", 2):
+            queries_small = self.export("/api/exports/orders/?format=jsonl&limit=2")[2]
+        self.assertEqual(queries - queries_small, 2)
+        self.assertLessEqual(queries_small, QUERY_BUDGETS[("api_export", "GET")])
+
+        response, body, _ = self.export(f"/api/exports/orders/?columns=total_amount&after={ids[2]}")
+        self.assertEqual(body.splitlines(), ["id,total_amount"] + [f"{i},6.00" for i in ids[3:]])
+        self.assertEqual(self.export("/api/exports/orders/?columns=nope")[0].status_code, 400)
+
+    def test_command_resumes_an_interrupted_file(self):
+        self.seed(4)
+        ids = list(Transaction.objects.order_by("id").values_list("id", flat=True))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = f"{tmp}/transactions.csv"
+            call_command("export_data", "transactions", "--columns", "amount", "--limit", "2",
+                         "--output", path, stderr=io.StringIO())
+            with open(path, "a") as f:
+                f.write(f"{ids[2]},6.0")
+            call_command("export_data", "transactions", "--columns", "amount", "--resume",
+                         "--output", path, stderr=io.StringIO())
+            with open(path) as f:
+                lines = f.read().splitlines()
+        self.assertEqual(lines, ["id,amount"] + [f"{i},6.00" for i in ids])
+
+
+class DiagnosticsTests(ApiTestCase):
+    def test_staff_only(self):
+        self.assertEqual(self.get_json("pharmacist", "/api/debug/diagnostics/")[0], 200)
+        self.assertEqual(self.get_json("patient", "/api/debug/diagnostics/")[0], 403)
+        self.assertEqual(Client().get("/api/debug/diagnostics/").status_code, 302)
+
+    def test_counts_indexes_caches_and_slow_queries(self):
+        self.seed(3)
+        CACHE_LOOKUPS.clear()
+        CACHE_LOOKUPS.inc(3, cache="compressed_responses", result="hit")
+        CACHE_LOOKUPS.inc(cache="compressed_responses", result="miss")
+        plan = ["SEARCH core_order USING INDEX order_patient_idx (patient_id=?)", "SCAN core_medicine"]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = f"{tmp}/slow.jsonl"
+            with open(path, "w") as f:
+                f.write("partial line from a rotated file\n")
+                for i in range(5):
+                    f.write(json.dumps({"ts": i, "duration_ms": 120, "sql": f"SELECT {i}", "plan": plan}) + "\n")
+            with override_settings(SLOW_QUERY_LOG={"PATH": path}, DIAGNOSTICS={"EXACT_COUNT_LIMIT": 0}):
+                status, data = self.get_json("pharmacist", "/api/debug/diagnostics/?slow=2")
+        self.assertEqual(status, 200)
+        default = data["databases"]["default"]
+        # everything above the limit is estimated from the largest rowid
+        self.assertEqual(default["tables"]["core_order"], {"rows": Order.objects.order_by("-id")[0].id, "exact": False})
+        self.assertIn(["patient_id"], [i["columns"] for i in default["indexes"]["core_order"]])
+        self.assertEqual(data["caches"]["compressed_responses"], {"hits": 3, "misses": 1, "hit_rate": 0.75})
+        slow = data["slow_queries"]
+        self.assertEqual([e["ts"] for e in slow["recent"]], [4, 3])
+        self.assertEqual(slow["index_uses"], {"order_patient_idx": 5})
+        self.assertEqual(slow["table_scans"], {"core_medicine": 5})
+
+        exact = diagnostics.table_counts(connection, ["core_order"], exact_limit=10 ** 6)
+        self.assertEqual(exact["core_order"], {"rows": Order.objects.count(), "exact": True})
+
+
+class AdminTests(ApiTestCase):
+    def changelist_queries(self, path):
+        self.pharmacist.is_superuser = True
+        self.pharmacist.save()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_changelists_do_not_grow_with_rows(self):
+        self.client.force_login(self.pharmacist)
+        paths = ["/admin/core/order/", "/admin/core/orderitem/", "/admin/core/transaction/",
+                 "/admin/core/prescription/?status__exact=active"]
+        self.seed(self.N)
+        before = [self.changelist_queries(p) for p in paths]
+        self.seed(self.N * 3)
+        self.assertEqual([self.changelist_queries(p) for p in paths], before)
+
+    def test_stock_and_derived_rows_are_read_only(self):
+        self.pharmacist.is_superuser = True
+        self.pharmacist.save()
+        self.client.force_login(self.pharmacist)
+        path = f"/admin/core/medicine/{self.medicine.id}/change/"
+        response = self.client.post(path, {
+            "name": "Renamed", "category": "", "batch_number": "", "price": "2.00", "notes": "",
+            "stock": 1, "stock_shards": 4, "batch_tracked": "on",
+        })
+        self.assertEqual(response.status_code, 302)
+        medicine = Medicine.objects.get(id=self.medicine.id)
+        self.assertEqual((medicine.name, medicine.stock, medicine.stock_shards, medicine.batch_tracked),
+                         ("Renamed", self.medicine.stock, 0, False))
+
+        for model in ["stockmovement", "stocksnapshot", "stockshard", "medicinebatch", "batchallocation",
+                      "patientsummary", "demandforecast"]:
+            self.assertEqual(self.client.get(f"/admin/core/{model}/").status_code, 200, model)
+            self.assertEqual(self.client.get(f"/admin/core/{model}/add/").status_code, 403, model)
+
+    def test_counts_are_estimated_past_the_limit(self):
+        self.seed(4)
+        Order.objects.filter(id=Order.objects.order_by("id")[0].id).delete()
+        orders = Order.objects.order_by("-id")
+        order_admin = admin_site._registry[Order]
+        with mock.patch.object(core_admin, "EXACT_COUNT_LIMIT", 2):
+            # a deleted row still counts towards the estimate
+            self.assertEqual(order_admin.get_paginator(None, orders, 2).count, orders[0].id)
+            # filtered lists stop at the cap
+            self.assertEqual(order_admin.get_paginator(None, orders.filter(status="completed"), 2).count, 3)
+        self.assertEqual(order_admin.get_paginator(None, orders, 2).count, 3)
+
+
+@skipUnless(forecasting.available(), "NumPy is not installed")
+class ForecastTests(ApiTestCase):
+    def test_reorder_points_from_daily_sales(self):
+        np = forecasting.np
+        ids, stock = np.array([1, 2, 3]), np.array([0.0, 100.0, 5.0])
+        ages = np.arange(28)
+        sales = (
+            np.concatenate([np.full(28, 1), np.full(14, 2), [9]]),
+            np.concatenate([ages, ages[::2], [0]]),
+            # 2 a day; 4 every other day; a medicine no longer in the catalog
+            np.concatenate([np.full(28, 2.0), np.full(14, 4.0), [50.0]]),
+        )
+        config = {**forecasting.DEFAULTS, "METHOD": "sma"}
+        result = forecasting.compute(ids, stock, sales, config)
+        self.assertEqual(result["daily_demand"].tolist(), [2.0, 2.0, 0.0])
+        self.assertEqual(result["demand_std"].tolist(), [0.0, 2.0, 0.0])
+        # z(0.95) * 2 * sqrt(7) = 8.7 -> 9
+        self.assertEqual(result["safety_stock"].tolist(), [0.0, 9.0, 0.0])
+        self.assertEqual(result["reorder_point"].tolist(), [14.0, 23.0, 0.0])
+        self.assertEqual(result["suggested_order"].tolist(), [42.0, 0.0, 0.0])
+
+        ema = forecasting.compute(ids, stock, sales, {**config, "METHOD": "ema", "ALPHA": 0.5})
+        self.assertAlmostEqual(ema["daily_demand"][0], 2 * (1 - 0.5 ** 28))
+
+    def test_command_saves_forecasts_for_the_api(self):
+        orders = self.seed(3)
+        empty = orders[0].prescription.medicine
+        Medicine.objects.filter(id=empty.id).update(stock=0)
+        today = timezone.localdate().isoformat()
+        out = io.StringIO()
+        call_command("forecast_demand", "--date", today, "--method", "sma", "--window", "1", stdout=out)
+        self.assertIn("1 to reorder", out.getvalue())
+        self.assertEqual(DemandForecast.objects.count(), Medicine.objects.count())
+
+        status, data = self.get_json("pharmacist", "/api/forecasts/?reorder=1")
+        self.assertEqual(status, 200)
+        self.assertEqual([(r["medicine_id"], r["daily_demand"], r["reorder_point"], r["suggested_order"])
+                          for r in data["items"]], [(empty.id, 2.0, 14, 42)])
+        self.assertEqual(self.get_json("patient", "/api/forecasts/")[0], 403)
+
+
+class BackupTests(SimpleTestCase):
+    def make_source(self, path, journal_mode="delete"):
+        db = sqlite3.connect(path)
+        db.execute(f"PRAGMA journal_mode={journal_mode}")
+        db.execute("CREATE TABLE items (name TEXT)")
+        db.executemany("INSERT INTO items VALUES (?)", [(f"item {i}" * 50,) for i in range(500)])
+        db.commit()
+        db.close()
+
+    def copy_under_writes(self, tmp, journal_mode):
+        # a checkout-like writer commits between every step of the copy
+        source = f"{tmp}/{journal_mode}.sqlite3"
+        self.make_source(source, journal_mode)
+        writer = sqlite3.connect(source, timeout=0.2)
+
+        def write(done, total):
+            writer.execute("INSERT INTO items VALUES ('sold')")
+            writer.commit()
+
+        try:
+            return backups.copy_online(source, f"{tmp}/{journal_mode}-copy.sqlite3", pages=4, sleep_ms=0,
+                                       max_restarts=2, progress=write)
+        finally:
+            writer.close()
+
+    def test_busy_rollback_journal_copy_fails_instead_of_locking_writers(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            # a "database is locked" in the writer would surface as OperationalError
+            with self.assertRaisesMessage(backups.BackupError, "journal_mode=delete"):
+                self.copy_under_writes(tmp, "delete")
+
+    def test_busy_wal_copy_finishes_in_one_step(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            stats = self.copy_under_writes(tmp, "wal")
+            self.assertTrue(stats["one_shot"])
+            self.assertEqual(stats["restarts"], 3)
+            self.assertGreaterEqual(backups.row_counts(f"{tmp}/wal-copy.sqlite3")["items"], 500)
+
+    def test_snapshot_verify_and_rotate(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            source = f"{tmp}/live.sqlite3"
+            self.make_source(source)
+
+            first = backups.snapshot(source, f"{tmp}/out", prefix="live", pages=4, sleep_ms=0)
+            # copied a few pages per step
+            self.assertGreater(backups.load_manifest(first)["steps"], 1)
+            self.assertEqual(backups.verify(first)["tables"], {"items": 500})
+            plain = backups.snapshot(source, f"{tmp}/out", prefix="live", compress=False)
+            self.assertEqual(backups.verify(plain)["tables"], {"items": 500})
+
+            self.assertEqual(backups.rotate(f"{tmp}/out", 1, prefix="live"), [first])
+            self.assertEqual(backups.snapshots(f"{tmp}/out", prefix="live"), [plain])
+            self.assertFalse(backups.manifest_path(first).exists())
+
+            with open(plain, "r+b") as f:
+                f.seek(200)
+                f.write(b"\xff")
+            with self.assertRaisesMessage(backups.BackupError, "does not match its checksum"):
+                backups.verify(plain)
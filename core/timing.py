@@ -0,0 +1,36 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.http import JsonResponse
+
+
+# phase durations for the request being served, set by ServerTimingMiddleware
+_current_phases = ContextVar("core_timing_phases", default=None)
+
+
+def start_phases():
+    phases = {}
+    return phases, _current_phases.set(phases)
+
+
+def stop_phases(token):
+    _current_phases.reset(token)
+
+
+@contextmanager
+def phase(name):
+    phases = _current_phases.get()
+    if phases is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases[name] = phases.get(name, 0.0) + time.perf_counter() - start
+
+
+def timed_json_response(data, **kwargs):
+    with phase("serialize"):
+        return JsonResponse(data, **kwargs)
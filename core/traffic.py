@@ -0,0 +1,157 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode
+
+from django.conf import settings
+
+
+DEFAULTS = {
+    "ENABLED": False,
+    "PATH": None,
+    "MAX_BYTES": 50 * 1024 * 1024,
+    "BACKUP_COUNT": 5,
+    "MAX_BODY_BYTES": 16 * 1024,
+    "SKIP_PREFIXES": ["/static/", "/metrics", "/api/debug/"],
+}
+
+# body fields that are never written to the log; replay fills in a password
+REDACTED_FIELDS = ("password",)
+REDACTED = "***"
+
+_logger = logging.getLogger("core.traffic")
+_handler_lock = threading.Lock()
+_handler_path = None
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, "TRAFFIC_RECORDING", {}) or {})
+    if not config["PATH"]:
+        config["PATH"] = Path(settings.BASE_DIR) / "logs" / "traffic.jsonl"
+    return config
+
+
+def _ensure_handler(config):
+    global _handler_path
+    path = str(config["PATH"])
+    with _handler_lock:
+        if _handler_path == path:
+            return
+        for h in list(_logger.handlers):
+            _logger.removeHandler(h)
+            h.close()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        handler = RotatingFileHandler(
+            path, maxBytes=config["MAX_BYTES"], backupCount=config["BACKUP_COUNT"], encoding="utf-8"
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        _logger.addHandler(handler)
+        _logger.setLevel(logging.INFO)
+        _logger.propagate = False
+        _handler_path = path
+
+
+def session_ref(key):
+    # the raw session key is a credential; only a digest goes to the log
+    if not key:
+        return None
+    return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+
+def request_body(request, config):
+    # read before the view runs, while request.body is still available
+    content_type = request.content_type or ""
+    if request.method in ("GET", "HEAD", "OPTIONS"):
+        return None, content_type
+    if not content_type.startswith(("application/json", "application/x-www-form-urlencoded")):
+        return None, content_type
+    body = request.body
+    if not body or len(body) > config["MAX_BODY_BYTES"]:
+        return None, content_type
+    text = body.decode("utf-8", errors="replace")
+    if content_type.startswith("application/json"):
+        try:
+            data = json.loads(text)
+        except ValueError:
+            return text, content_type
+        if isinstance(data, dict):
+            for field in REDACTED_FIELDS:
+                if field in data:
+                    data[field] = REDACTED
+        return json.dumps(data), content_type
+    # form posts carry the same fields
+    pairs = parse_qsl(text, keep_blank_values=True)
+    if any(field in REDACTED_FIELDS for field, _ in pairs):
+        return urlencode([(f, REDACTED if f in REDACTED_FIELDS else v) for f, v in pairs]), content_type
+    return text, content_type
+
+
+def record(request, response, duration, route, body, content_type, config):
+    _ensure_handler(config)
+    session = getattr(request, "session", None)
+    user = getattr(request, "user", None)
+    session_in = session_ref(request.COOKIES.get(settings.SESSION_COOKIE_NAME))
+    entry = {
+        "ts": time.time(),
+        "method": request.method,
+        "path": request.path,
+        "query": request.META.get("QUERY_STRING", ""),
+        "route": route,
+        "content_type": content_type,
+        "body": body,
+        "status": response.status_code,
+        "duration_ms": round(duration * 1000, 2),
+        # email, so that replay can log the user in when the flow started
+        # before recording did
+        "user": user.email if user is not None and user.is_authenticated else None,
+        "session_in": session_in,
+        "session_out": session_ref(session.session_key) if session is not None else None,
+    }
+    _logger.info(json.dumps(entry))
+
+
+def log_files(path):
+    path = Path(path)
+    # rotated files are older; read them first so records stay in order
+    files = sorted(path.parent.glob(path.name + ".*"), reverse=True) + [path]
+    return [f for f in files if f.is_file()]
+
+
+def load_records(paths):
+    records = []
+    for path in paths:
+        with open(path, encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+    records.sort(key=lambda r: r.get("ts", 0))
+    return records
+
+
+def build_flows(records):
+    # a flow is the sequence of requests made by one browser: requests are
+    # chained through the session cookie they sent and the one they left
+    # behind (login_api swaps the session key, logout drops it)
+    flows = []
+    by_session = {}
+    for r in records:
+        flow = by_session.get(r.get("session_in")) if r.get("session_in") else None
+        if flow is None:
+            # an already authenticated first request means the login
+            # happened before recording started
+            flow = {"user": r.get("user") if r.get("session_in") else None, "requests": []}
+            flows.append(flow)
+        flow["requests"].append(r)
+        if r.get("session_in") and r.get("session_out") != r.get("session_in"):
+            by_session.pop(r["session_in"], None)
+        if r.get("session_out"):
+            by_session[r["session_out"]] = flow
+    return flows
@@ -18,18 +18,31 @@ urlpatterns = [
     path("api/prescriptions/patient/", api_views.patient_prescriptions_api, name="api_patient_prescriptions"),
     path("api/prescriptions/", api_views.prescriptions_api, name="api_prescriptions"),
     path("api/orders/create/", api_views.create_order_api, name="api_create_order"),
+    path("api/orders/bulk-status/", api_views.bulk_order_status_api, name="api_bulk_order_status"),
+    path("api/bootstrap/", api_views.bootstrap_api, name="api_bootstrap"),
     path("api/users/", api_views.users_api, name="api_users"),
     path("api/medicines/", api_views.medicines_api, name="api_medicines"),
     path("contact/", views.contact, name="contact"),
+    path("metrics", views.metrics_view, name="metrics"),
     path("api/medicines/<int:pk>/", api_views.medicine_detail_api, name="api_medicine_detail"),
+    path("api/medicines/<int:pk>/batches/", api_views.medicine_batches_api, name="api_medicine_batches"),
     path("api/wallet/balance/", api_views.wallet_balance_api, name="api_wallet_balance"),
     path("api/wallet/deposit/", api_views.wallet_deposit_api, name="api_wallet_deposit"),
     path("api/wallet/transactions/", api_views.wallet_transactions_api, name="api_wallet_transactions"),
     path("api/revenue/total/", api_views.total_revenue_api, name="api_total_revenue"),
     path("api/patient/stats/", api_views.patient_stats_api, name="api_patient_stats"),
-    path("api/debug/simple-orders/", api_views.debug_simple_orders, name="api_debug_simple_orders"),
+    path("api/debug/diagnostics/", api_views.diagnostics_api, name="api_diagnostics"),
+    path("api/debug/profiles/", api_views.profiles_api, name="api_profiles"),
+    path("api/debug/profiles/<str:name>/", api_views.profile_download_api, name="api_profile_download"),
     path("api/pharmacist/all-orders/", api_views.pharmacist_all_orders_api, name="api_pharmacist_all_orders"),
     path("api/patient/order-history/", api_views.patient_order_history_api, name="api_patient_order_history"),
+    path("api/stock/at/", api_views.stock_at_api, name="api_stock_at"),
+    path("api/stock/movements/", api_views.stock_movements_api, name="api_stock_movements"),
+    path("api/branches/", api_views.branches_api, name="api_branches"),
+    path("api/branches/stock-report/", api_views.branch_stock_report_api, name="api_branch_stock_report"),
+    path("api/branches/<str:code>/stock/", api_views.branch_stock_api, name="api_branch_stock"),
+    path("api/forecasts/", api_views.forecasts_api, name="api_forecasts"),
+    path("api/exports/<str:name>/", api_views.export_api, name="api_export"),
 
 
 ]
\ No newline at end of file
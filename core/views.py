@@ -2,8 +2,13 @@ from django.views.decorators.csrf import ensure_csrf_cookie
 from django.shortcuts import render, redirect
 from django.contrib.auth import logout
 from django.views.decorators.http import require_http_methods
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponse
 from django.contrib.auth.decorators import login_required
+from django.conf import settings
+
+from . import dashboard_cache
+from .api_views import dashboard_data
+from .metrics import REGISTRY
 
 
 @login_required
@@ -33,20 +38,50 @@ def signin(request):
     return render(request, "pages/signin.html")
 
 
+def _dashboard_context(request, role):
+    # with DASHBOARD_SSR the page embeds the dashboard's initial data; the
+    # template only builds it when the cached fragment has expired or a
+    # write bumped the role/user version
+    if not dashboard_cache.enabled() or not request.user.is_authenticated:
+        return {}
+    prof = getattr(request.user, "profile", None)
+    user_role = getattr(prof, "role", None) if prof else None
+    if user_role == "admin":
+        user_role = "pharmacist"
+    if user_role != role:
+        return {}
+
+    return {
+        "ssr": True,
+        "ssr_role": role,
+        "ssr_timeout": dashboard_cache.timeout(),
+        "ssr_version": dashboard_cache.versions(role, request.user.id),
+        "initial_data": lambda: dashboard_data(request.user, prof),
+    }
+
+
 def pharmacist_dashboard(request):
-    return render(request, "dashboards/pharmacist.html")
+    return render(request, "dashboards/pharmacist.html", _dashboard_context(request, "pharmacist"))
 
 
 def doctor_dashboard(request):
-    return render(request, "dashboards/doctor.html")
+    return render(request, "dashboards/doctor.html", _dashboard_context(request, "doctor"))
 
 
 def patient_dashboard(request):
-    return render(request, "dashboards/patient.html")
+    return render(request, "dashboards/patient.html", _dashboard_context(request, "patient"))
 
 
 def contact(request):
     if request.method == "POST":
         return render(request, "pages/contact.html", {"success": True})
 
-    return render(request, "pages/contact.html")
\ No newline at end of file
+    return render(request, "pages/contact.html")
+
+
+@require_http_methods(["GET"])
+def metrics_view(request):
+    allowed_ips = getattr(settings, "METRICS_ALLOWED_IPS", ["127.0.0.1", "::1"])
+    if request.META.get("REMOTE_ADDR") not in allowed_ips and not request.user.is_staff:
+        return HttpResponse("Forbidden", status=403, content_type="text/plain")
+    return HttpResponse(REGISTRY.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
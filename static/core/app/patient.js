@@ -67,76 +67,7 @@ async function loadPatientPrescriptions() {
             throw new Error(data?.error || `Failed to load prescriptions (${status})`);
         }
         
-        const prescriptions = data;
-        console.log(` Loaded ${prescriptions.length} prescriptions`);
-        
-        if (prescriptions.length === 0) {
-            container.innerHTML = `
-                <div style="text-align: center; padding: 30px; color: #6b7280; background: #f9fafb; border-radius: 8px;">
-                    <svg style="width: 48px; height: 48px; color: #9ca3af; margin-bottom: 16px;" fill="none" stroke="currentColor" viewBox="0 0 24 24">
-                        <path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M9 12h6m-6 4h6m2 5H7a2 2 0 01-2-2V5a2 2 0 012-2h5.586a1 1 0 01.707.293l5.414 5.414a1 1 0 01.293.707V19a2 2 0 01-2 2z"/>
-                    </svg>
-                    <h3 style="margin: 0 0 8px 0; color: #374151;">No prescriptions found</h3>
-                    <p style="margin: 0; color: #6b7280;">You don't have any active prescriptions yet.</p>
-                </div>
-            `;
-            return;
-        }
-        
-        container.innerHTML = prescriptions.map(prescription => `
-            <div class="prescription-card" style="background: white; border: 1px solid #e5e7eb; border-radius: 8px; padding: 16px; margin-bottom: 12px;">
-                <div style="display: flex; justify-content: space-between; align-items: flex-start; margin-bottom: 12px;">
-                    <div>
-                        <h3 style="margin: 0 0 4px 0; color: #1f2937;">
-                            ${prescription.medicine_name}
-                            <span class="badge badge-green" style="font-size: 0.75rem; margin-left: 8px;">${prescription.status}</span>
-                        </h3>
-                        <p style="margin: 0; color: #6b7280; font-size: 0.875rem;">
-                            Prescribed by: <strong>${prescription.doctor_name}</strong>
-                        </p>
-                    </div>
-                    <div style="text-align: right;">
-                        <div style="font-size: 0.875rem; color: #6b7280;">Prescription ID</div>
-                        <div style="font-family: monospace; font-weight: 600; color: #3b82f6;">${prescription.prescription_id}</div>
-                    </div>
-                </div>
-                
-                <div style="display: grid; grid-template-columns: repeat(2, 1fr); gap: 12px; margin-bottom: 12px;">
-                    <div>
-                        <div style="font-size: 0.75rem; color: #6b7280; text-transform: uppercase;">Dosage</div>
-                        <div style="font-weight: 500;">${prescription.dosage || 'Not specified'}</div>
-                    </div>
-                    <div>
-                        <div style="font-size: 0.75rem; color: #6b7280; text-transform: uppercase;">Duration</div>
-                        <div style="font-weight: 500;">${prescription.duration || 'Not specified'}</div>
-                    </div>
-                    <div>
-                        <div style="font-size: 0.75rem; color: #6b7280; text-transform: uppercase;">Quantity</div>
-                        <div style="font-weight: 500;">${prescription.quantity}</div>
-                    </div>
-                    <div>
-                        <div style="font-size: 0.75rem; color: #6b7280; text-transform: uppercase;">Total Price</div>
-                        <div style="font-weight: 600; color: #059669;">$${prescription.total_price?.toFixed(2) || '0.00'}</div>
-                    </div>
-                </div>
-                
-                ${prescription.notes ? `
-                <div style="margin-bottom: 12px; padding: 8px; background: #f8fafc; border-radius: 6px; border-left: 3px solid #3b82f6;">
-                    <div style="font-size: 0.75rem; color: #6b7280; margin-bottom: 4px;">Doctor's Notes:</div>
-                    <div style="font-size: 0.875rem; color: #374151;">${prescription.notes}</div>
-                </div>
-                ` : ''}
-                
-                <div style="display: flex; justify-content: space-between; align-items: center; margin-top: 12px;">
-                    <div style="font-size: 0.75rem; color: #6b7280;">
-                        Created: ${new Date(prescription.created_at).toLocaleDateString()}
-                    </div>
-                    <button class="btn btn-primary" onclick="createOrder('${prescription.prescription_id}')">
-                         Place Order
-                    </button>
-                </div>
-            </div>
-        `).join('');
+        renderPatientPrescriptions(data);
         
     } catch (error) {
         console.error(' Error loading prescriptions:', error);
@@ -155,6 +86,81 @@ async function loadPatientPrescriptions() {
     }
 }
 
+function renderPatientPrescriptions(prescriptions) {
+    const container = $('prescription-history-list');
+    if (!container) return;
+    
+    console.log(` Loaded ${prescriptions.length} prescriptions`);
+    
+    if (prescriptions.length === 0) {
+        container.innerHTML = `
+            <div style="text-align: center; padding: 30px; color: #6b7280; background: #f9fafb; border-radius: 8px;">
+                <svg style="width: 48px; height: 48px; color: #9ca3af; margin-bottom: 16px;" fill="none" stroke="currentColor" viewBox="0 0 24 24">
+                    <path stroke-linecap="round" stroke-linejoin="round" stroke-width="2" d="M9 12h6m-6 4h6m2 5H7a2 2 0 01-2-2V5a2 2 0 012-2h5.586a1 1 0 01.707.293l5.414 5.414a1 1 0 01.293.707V19a2 2 0 01-2 2z"/>
+                </svg>
+                <h3 style="margin: 0 0 8px 0; color: #374151;">No prescriptions found</h3>
+                <p style="margin: 0; color: #6b7280;">You don't have any active prescriptions yet.</p>
+            </div>
+        `;
+        return;
+    }
+    
+    container.innerHTML = prescriptions.map(prescription => `
+        <div class="prescription-card" style="background: white; border: 1px solid #e5e7eb; border-radius: 8px; padding: 16px; margin-bottom: 12px;">
+            <div style="display: flex; justify-content: space-between; align-items: flex-start; margin-bottom: 12px;">
+                <div>
+                    <h3 style="margin: 0 0 4px 0; color: #1f2937;">
+                        ${prescription.medicine_name}
+                        <span class="badge badge-green" style="font-size: 0.75rem; margin-left: 8px;">${prescription.status}</span>
+                    </h3>
+                    <p style="margin: 0; color: #6b7280; font-size: 0.875rem;">
+                        Prescribed by: <strong>${prescription.doctor_name}</strong>
+                    </p>
+                </div>
+                <div style="text-align: right;">
+                    <div style="font-size: 0.875rem; color: #6b7280;">Prescription ID</div>
+                    <div style="font-family: monospace; font-weight: 600; color: #3b82f6;">${prescription.prescription_id}</div>
+                </div>
+            </div>
+            
+            <div style="display: grid; grid-template-columns: repeat(2, 1fr); gap: 12px; margin-bottom: 12px;">
+                <div>
+                    <div style="font-size: 0.75rem; color: #6b7280; text-transform: uppercase;">Dosage</div>
+                    <div style="font-weight: 500;">${prescription.dosage || 'Not specified'}</div>
+                </div>
+                <div>
+                    <div style="font-size: 0.75rem; color: #6b7280; text-transform: uppercase;">Duration</div>
+                    <div style="font-weight: 500;">${prescription.duration || 'Not specified'}</div>
+                </div>
+                <div>
+                    <div style="font-size: 0.75rem; color: #6b7280; text-transform: uppercase;">Quantity</div>
+                    <div style="font-weight: 500;">${prescription.quantity}</div>
+                </div>
+                <div>
+                    <div style="font-size: 0.75rem; color: #6b7280; text-transform: uppercase;">Total Price</div>
+                    <div style="font-weight: 600; color: #059669;">$${prescription.total_price?.toFixed(2) || '0.00'}</div>
+                </div>
+            </div>
+            
+            ${prescription.notes ? `
+            <div style="margin-bottom: 12px; padding: 8px; background: #f8fafc; border-radius: 6px; border-left: 3px solid #3b82f6;">
+                <div style="font-size: 0.75rem; color: #6b7280; margin-bottom: 4px;">Doctor's Notes:</div>
+                <div style="font-size: 0.875rem; color: #374151;">${prescription.notes}</div>
+            </div>
+            ` : ''}
+            
+            <div style="display: flex; justify-content: space-between; align-items: center; margin-top: 12px;">
+                <div style="font-size: 0.75rem; color: #6b7280;">
+                    Created: ${new Date(prescription.created_at).toLocaleDateString()}
+                </div>
+                <button class="btn btn-primary" onclick="createOrder('${prescription.prescription_id}')">
+                     Place Order
+                </button>
+            </div>
+        </div>
+    `).join('');
+}
+
 async function createOrder(prescriptionId, prescriptionData) {
     if (!prescriptionId) {
         alert(' Invalid prescription ID');
@@ -233,10 +239,29 @@ async function createOrder(prescriptionId, prescriptionData) {
 }
 
 
+// sections of /api/bootstrap/ this dashboard renders
+const PATIENT_BOOTSTRAP_FIELDS = 'stats,prescriptions,order_history,transactions';
+
+function renderPatientBootstrap(data) {
+    renderPatientStats(data.stats);
+    renderPatientPrescriptions(data.prescriptions);
+    renderOrderHistory(data.order_history);
+    renderWalletHistory(data.transactions);
+}
+
 async function refreshAllData() {
     console.log(' Refreshing all data...');
     
     try {
+        const { ok, data } = await apiRequest(`/api/bootstrap/?fields=${PATIENT_BOOTSTRAP_FIELDS}`);
+        
+        if (ok && data) {
+            renderPatientBootstrap(data);
+            console.log(' All data refreshed successfully');
+            return;
+        }
+        
+        console.log(' Bootstrap failed, loading sections one by one');
         await Promise.all([
             loadPatientStats(),
             loadPatientPrescriptions(),
@@ -271,14 +296,7 @@ async function loadOrderHistory() {
             return loadOrderHistoryFromGeneralAPI();
         }
         
-        const orders = data || [];
-        
-        if (orders.length === 0) {
-            showNoOrdersMessage(container);
-            return;
-        }
-        
-        displayOrderHistory(orders, container);
+        renderOrderHistory(data || []);
         
     } catch (error) {
         console.error(' Error:', error);
@@ -290,6 +308,18 @@ async function loadOrderHistory() {
     }
 }
 
+function renderOrderHistory(orders) {
+    const container = $('order-history-list');
+    if (!container) return;
+    
+    if (orders.length === 0) {
+        showNoOrdersMessage(container);
+        return;
+    }
+    
+    displayOrderHistory(orders, container);
+}
+
 async function loadOrderHistoryFromGeneralAPI() {
     const container = $('order-history-list');
     const { ok, data } = await apiRequest('/api/orders/');
@@ -514,7 +544,13 @@ async function searchPrescription(event) {
 function initPatientDashboard() {
     console.log(' Initializing Patient Dashboard...');
     
-    refreshAllData();
+    // embedded by the server when DASHBOARD_SSR is on
+    const initial = document.getElementById('dashboard-initial-data');
+    if (initial) {
+        renderPatientBootstrap(JSON.parse(initial.textContent));
+    } else {
+        refreshAllData();
+    }
     
     setInterval(() => {
         console.log(' Auto-refreshing patient data...');
@@ -683,37 +719,7 @@ async function loadWalletHistory() {
     try {
         const { ok, status, data } = await apiRequest('/api/wallet/transactions/');
         
-        const transactions = data || [];
-        
-        if (!transactions || transactions.length === 0) {
-            previewContainer.innerHTML = `
-                <div style="text-align: center; padding: 20px; color: #6b7280; font-size: 0.9rem;">
-                    No transactions yet
-                </div>
-            `;
-            return;
-        }
-        
-        previewContainer.innerHTML = transactions.slice(0, 3).map(t => `
-            <div style="display: flex; justify-content: space-between; align-items: center; padding: 8px 0; border-bottom: 1px solid #f3f4f6;">
-                <div>
-                    <div style="font-weight: 600; color: #1e293b; font-size: 0.875rem;">
-                        ${t.description || (t.type === 'deposit' ? 'Deposit' : 'Payment')}
-                    </div>
-                    <div style="font-size: 0.75rem; color: #6b7280;">
-                        ${t.date ? new Date(t.date).toLocaleDateString() : 'Recent'}
-                    </div>
-                </div>
-                <div style="text-align: right;">
-                    <div style="font-weight: 700; color: ${t.type === 'deposit' ? '#059669' : '#dc2626'}; font-size: 0.95rem;">
-                        ${t.type === 'deposit' ? '+' : '-'}$${t.amount?.toFixed(2) || '0.00'}
-                    </div>
-                    <div style="font-size: 0.75rem; color: #6b7280;">
-                        ${t.status || 'completed'}
-                    </div>
-                </div>
-            </div>
-        `).join('');
+        renderWalletHistory(data || []);
         
     } catch (error) {
         console.error(' Error loading wallet history:', error);
@@ -725,6 +731,40 @@ async function loadWalletHistory() {
     }
 }
 
+function renderWalletHistory(transactions) {
+    const previewContainer = document.getElementById('wallet-history-preview');
+    if (!previewContainer) return;
+    
+    if (!transactions || transactions.length === 0) {
+        previewContainer.innerHTML = `
+            <div style="text-align: center; padding: 20px; color: #6b7280; font-size: 0.9rem;">
+                No transactions yet
+            </div>
+        `;
+        return;
+    }
+    
+    previewContainer.innerHTML = transactions.slice(0, 3).map(t => `
+        <div style="display: flex; justify-content: space-between; align-items: center; padding: 8px 0; border-bottom: 1px solid #f3f4f6;">
+            <div>
+                <div style="font-weight: 600; color: #1e293b; font-size: 0.875rem;">
+                    ${t.description || (t.type === 'deposit' ? 'Deposit' : 'Payment')}
+                </div>
+                <div style="font-size: 0.75rem; color: #6b7280;">
+                    ${t.date ? new Date(t.date).toLocaleDateString() : 'Recent'}
+                </div>
+            </div>
+            <div style="text-align: right;">
+                <div style="font-weight: 700; color: ${t.type === 'deposit' ? '#059669' : '#dc2626'}; font-size: 0.95rem;">
+                    ${t.type === 'deposit' ? '+' : '-'}$${t.amount?.toFixed(2) || '0.00'}
+                </div>
+                <div style="font-size: 0.75rem; color: #6b7280;">
+                    ${t.status || 'completed'}
+                </div>
+            </div>
+        </div>
+    `).join('');
+}
 
 async function loadPatientStats() {
     console.log(" Loading patient stats...");
@@ -733,33 +773,37 @@ async function loadPatientStats() {
         const { ok, status, data } = await apiRequest('/api/patient/stats/');
         
         if (ok && data) {
-            if ($('wallet-balance')) {
-                $('wallet-balance').textContent = `$${data.wallet_balance?.toFixed(2) || '0.00'}`;
-            }
-            
-            if ($('active-prescriptions-count')) {
-                $('active-prescriptions-count').textContent = data.active_prescriptions || 0;
-            }
-            
-            if ($('total-orders-count')) {
-                $('total-orders-count').textContent = data.total_orders || 0;
-            }
-            
-            if ($('pending-orders-count')) {
-                $('pending-orders-count').textContent = `${data.pending_orders || 0} pending orders`;
-            }
-            
-            if ($('total-spent-amount')) {
-                $('total-spent-amount').textContent = `$${data.total_spent?.toFixed(2) || '0.00'}`;
-            }
-            
-            console.log(' Patient stats loaded:', data);
+            renderPatientStats(data);
         }
     } catch (error) {
         console.error(' Error loading patient stats:', error);
     }
 }
 
+function renderPatientStats(data) {
+    if ($('wallet-balance')) {
+        $('wallet-balance').textContent = `$${data.wallet_balance?.toFixed(2) || '0.00'}`;
+    }
+    
+    if ($('active-prescriptions-count')) {
+        $('active-prescriptions-count').textContent = data.active_prescriptions || 0;
+    }
+    
+    if ($('total-orders-count')) {
+        $('total-orders-count').textContent = data.total_orders || 0;
+    }
+    
+    if ($('pending-orders-count')) {
+        $('pending-orders-count').textContent = `${data.pending_orders || 0} pending orders`;
+    }
+    
+    if ($('total-spent-amount')) {
+        $('total-spent-amount').textContent = `$${data.total_spent?.toFixed(2) || '0.00'}`;
+    }
+    
+    console.log(' Patient stats loaded:', data);
+}
+
 function showAddFundsModal() {
 }
 
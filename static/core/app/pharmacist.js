@@ -253,41 +253,7 @@ async function loadUsers() {
             throw new Error(data?.error || `Failed to load users (${status})`);
         }
         
-        const users = data;
-        console.log(` Loaded ${users.length} users`);
-        
-        if (users.length === 0) {
-            tbody.innerHTML = `
-                <tr>
-                    <td colspan="4" style="text-align:center;padding:1rem;color:#6b7280">
-                        No users found
-                    </td>
-                </tr>
-            `;
-            return;
-        }
-        
-        tbody.innerHTML = users.map(user => `
-            <tr>
-                <td>
-                    <strong>${user.first_name || user.username}</strong><br>
-                    <small style="color:#6b7280">${user.username}</small>
-                </td>
-                <td>${user.email || "—"}</td>
-                <td>
-                    <span class="badge ${
-                        user.role === 'pharmacist' ? 'badge-blue' : 
-                        user.role === 'doctor' ? 'badge-green' : 
-                        'badge-gray'
-                    }">
-                        ${user.role}
-                    </span>
-                </td>
-                <td>
-                    ${user.role === 'patient' ? user.national_id || "—" : user.practice_code || "—"}
-                </td>
-            </tr>
-        `).join('');
+        renderUsers(data);
         
     } catch (error) {
         console.error("❌ Error loading users:", error);
@@ -301,6 +267,46 @@ async function loadUsers() {
     }
 }
 
+function renderUsers(users) {
+    const tbody = document.getElementById('users-table');
+    if (!tbody) return;
+    
+    console.log(` Loaded ${users.length} users`);
+    
+    if (users.length === 0) {
+        tbody.innerHTML = `
+            <tr>
+                <td colspan="4" style="text-align:center;padding:1rem;color:#6b7280">
+                    No users found
+                </td>
+            </tr>
+        `;
+        return;
+    }
+    
+    tbody.innerHTML = users.map(user => `
+        <tr>
+            <td>
+                <strong>${user.first_name || user.username}</strong><br>
+                <small style="color:#6b7280">${user.username}</small>
+            </td>
+            <td>${user.email || "—"}</td>
+            <td>
+                <span class="badge ${
+                    user.role === 'pharmacist' ? 'badge-blue' : 
+                    user.role === 'doctor' ? 'badge-green' : 
+                    'badge-gray'
+                }">
+                    ${user.role}
+                </span>
+            </td>
+            <td>
+                ${user.role === 'patient' ? user.national_id || "—" : user.practice_code || "—"}
+            </td>
+        </tr>
+    `).join('');
+}
+
 async function loadAllOrders() {
     console.log("🔄 loadAllOrders() called - USING NEW ENDPOINT");
     
@@ -340,79 +346,7 @@ async function loadAllOrders() {
         }
         
         const orders = await response.json();
-        console.log(` SUCCESS: Received ${orders.length} orders from new API`, orders);
-        
-        orders.forEach((order, i) => {
-            console.log(` [${i+1}] ${order.order_id} - ${order.patient_name} - $${order.total_amount} - ${order.status}`);
-        });
-        
-        if (orders.length === 0) {
-            tbody.innerHTML = `
-                <tr>
-                    <td colspan="6" style="text-align:center;padding:2rem;color:#dc2626">
-                        <div style="font-size:2rem;margin-bottom:1rem;">🚨</div>
-                        <div style="font-weight:600">CRITICAL: API returned 0 orders!</div>
-                        <div style="color:#991b1b;margin-top:0.5rem;">
-                            But there are 11 orders in database. Check server logs.
-                        </div>
-                    </td>
-                </tr>
-            `;
-            return;
-        }
-        
-        tbody.innerHTML = orders.map(order => {
-            const medicineName = order.medicine_info?.name || 
-                               order.prescription?.medicine_name || 
-                               'Not specified';
-            
-            const quantity = order.prescription?.quantity || 1;
-            
-            let statusClass = 'badge-gray';
-            let statusText = order.status;
-            if (order.status === 'completed') {
-                statusClass = 'badge-green';
-                statusText = ' Completed';
-            } else if (order.status === 'pending') {
-                statusClass = 'badge-yellow';
-                statusText = ' Pending';
-            }
-            
-            const date = order.created_at ? new Date(order.created_at) : new Date();
-            
-            return `
-                <tr>
-                    <td>
-                        <strong style="color:#3b82f6">${order.order_id}</strong>
-                        <div style="font-size:0.75rem;color:#9ca3af">ID: ${order.id}</div>
-                    </td>
-                    <td>
-                        <div style="font-weight:600">${order.patient_name}</div>
-                        <small style="color:#6b7280">${order.patient_email || ''}</small>
-                    </td>
-                    <td>${medicineName}</td>
-                    <td>${quantity}</td>
-                    <td style="font-weight:700;color:#059669;font-size:1.1rem">
-                        $${order.total_amount.toFixed(2)}
-                    </td>
-                    <td>
-                        <div>${date.toLocaleDateString()}</div>
-                        <div style="font-size:0.8rem;color:#6b7280">
-                            ${date.toLocaleTimeString([], {hour: '2-digit', minute:'2-digit'})}
-                        </div>
-                        <div style="margin-top:4px;">
-                            <span class="badge ${statusClass}">
-                                ${statusText}
-                            </span>
-                        </div>
-                    </td>
-                </tr>
-            `;
-        }).join('');
-        
-        console.log(` Displayed ${orders.length} orders in table`);
-        
-        updateRevenueStats(orders);
+        renderAllOrders(orders);
         
     } catch (error) {
         console.error('❌ FATAL ERROR:', error);
@@ -445,6 +379,85 @@ async function loadAllOrders() {
     }
 }
 
+function renderAllOrders(orders) {
+    const tbody = document.getElementById('all-orders');
+    if (!tbody) return;
+    
+    console.log(` SUCCESS: Received ${orders.length} orders from new API`, orders);
+    
+    orders.forEach((order, i) => {
+        console.log(` [${i+1}] ${order.order_id} - ${order.patient_name} - $${order.total_amount} - ${order.status}`);
+    });
+    
+    if (orders.length === 0) {
+        tbody.innerHTML = `
+            <tr>
+                <td colspan="6" style="text-align:center;padding:2rem;color:#dc2626">
+                    <div style="font-size:2rem;margin-bottom:1rem;">🚨</div>
+                    <div style="font-weight:600">CRITICAL: API returned 0 orders!</div>
+                    <div style="color:#991b1b;margin-top:0.5rem;">
+                        But there are 11 orders in database. Check server logs.
+                    </div>
+                </td>
+            </tr>
+        `;
+        return;
+    }
+    
+    tbody.innerHTML = orders.map(order => {
+        const medicineName = order.medicine_info?.name || 
+                           order.prescription?.medicine_name || 
+                           'Not specified';
+        
+        const quantity = order.prescription?.quantity || 1;
+        
+        let statusClass = 'badge-gray';
+        let statusText = order.status;
+        if (order.status === 'completed') {
+            statusClass = 'badge-green';
+            statusText = ' Completed';
+        } else if (order.status === 'pending') {
+            statusClass = 'badge-yellow';
+            statusText = ' Pending';
+        }
+        
+        const date = order.created_at ? new Date(order.created_at) : new Date();
+        
+        return `
+            <tr>
+                <td>
+                    <strong style="color:#3b82f6">${order.order_id}</strong>
+                    <div style="font-size:0.75rem;color:#9ca3af">ID: ${order.id}</div>
+                </td>
+                <td>
+                    <div style="font-weight:600">${order.patient_name}</div>
+                    <small style="color:#6b7280">${order.patient_email || ''}</small>
+                </td>
+                <td>${medicineName}</td>
+                <td>${quantity}</td>
+                <td style="font-weight:700;color:#059669;font-size:1.1rem">
+                    $${order.total_amount.toFixed(2)}
+                </td>
+                <td>
+                    <div>${date.toLocaleDateString()}</div>
+                    <div style="font-size:0.8rem;color:#6b7280">
+                        ${date.toLocaleTimeString([], {hour: '2-digit', minute:'2-digit'})}
+                    </div>
+                    <div style="margin-top:4px;">
+                        <span class="badge ${statusClass}">
+                            ${statusText}
+                        </span>
+                    </div>
+                </td>
+            </tr>
+        `;
+    }).join('');
+    
+    console.log(` Displayed ${orders.length} orders in table`);
+    
+    updateRevenueStats(orders);
+}
+
 function updateRevenueStats(orders) {
     console.log(" updateRevenueStats called");
     
@@ -487,34 +500,53 @@ async function loadMedicinesForPharmacist() {
         });
         
         if (response.ok) {
-            const medicines = await response.json();
-            console.log(` Loaded ${medicines.length} medicines`);
-            
-            const medicinesElement = document.getElementById('total-medicines');
-            const lowStockElement = document.getElementById('low-stock-count');
-            
-            if (medicinesElement) {
-                medicinesElement.textContent = medicines.length;
-            }
-            
-            if (lowStockElement) {
-                const lowStockCount = medicines.filter(m => (m.stock || 0) < 10).length;
-                lowStockElement.textContent = lowStockCount;
-                lowStockElement.style.color = lowStockCount > 0 ? '#dc2626' : '#059669';
-            }
+            renderMedicineStats(await response.json());
         }
     } catch (error) {
         console.error('Error loading medicines:', error);
     }
 }
 
+function renderMedicineStats(medicines) {
+    console.log(` Loaded ${medicines.length} medicines`);
+    
+    const medicinesElement = document.getElementById('total-medicines');
+    const lowStockElement = document.getElementById('low-stock-count');
+    
+    if (medicinesElement) {
+        medicinesElement.textContent = medicines.length;
+    }
+    
+    if (lowStockElement) {
+        const lowStockCount = medicines.filter(m => (m.stock || 0) < 10).length;
+        lowStockElement.textContent = lowStockCount;
+        lowStockElement.style.color = lowStockCount > 0 ? '#dc2626' : '#059669';
+    }
+}
+
+// first paint: orders, medicine stats and users in one request
+// (or from the data the server embedded when DASHBOARD_SSR is on)
+async function loadPharmacistBootstrap() {
+    const initial = document.getElementById("dashboard-initial-data");
+    const { ok, data } = initial
+        ? { ok: true, data: JSON.parse(initial.textContent) }
+        : await Utils.apiRequest("/api/bootstrap/?fields=orders,medicines,users");
+    if (!ok || !data) {
+        console.log(" Bootstrap failed, loading sections one by one");
+        loadAllOrders();
+        loadMedicinesForPharmacist();
+        loadUsers();
+        return;
+    }
+    renderAllOrders(data.orders);
+    renderMedicineStats(data.medicines);
+    renderUsers(data.users);
+}
 
 function initPharmacistDashboard() {
     console.log(" Initializing Pharmacist Dashboard");
     
-    loadAllOrders();
-    loadMedicinesForPharmacist();
-    loadUsers();
+    loadPharmacistBootstrap();
     
     setInterval(() => {
         console.log("🔄 Auto-refreshing pharmacist dashboard...");
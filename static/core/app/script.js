@@ -2,26 +2,23 @@
 
 console.log(" Loading main application...");
 
-const modules = [
-    { name: "utils", file: "utils.js" },
-    { name: "auth", file: "auth.js" },
-    { name: "doctor", file: "doctor.js" },
-    { name: "pharmacist", file: "pharmacist.js" },
-    { name: "patient", file: "patient.js" }
-];
+// one bundle per page (utils plus the role's module, see core/assets.py);
+// base.html passes their hashed URLs as data-* attributes of this script
+const BUNDLE_URLS = document.currentScript ? document.currentScript.dataset : {};
+const ROLE_MODULES = ["auth", "doctor", "pharmacist", "patient"];
 
 async function loadModules() {
     console.log(" Loading modules...");
     
-    for (const module of modules) {
-        try {
-            if (isModuleNeeded(module.name)) {
-                console.log(` Loading ${module.name} module...`);
-                await loadScript(`/static/core/app/${module.file}`);
-            }
-        } catch (error) {
-            console.error(`❌ Failed to load ${module.name} module:`, error);
-        }
+    // pages that include their bundle themselves need nothing else
+    if (document.querySelector("script[data-bundle]")) return;
+    
+    const name = ROLE_MODULES.find(isModuleNeeded) || "utils";
+    try {
+        console.log(` Loading ${name} bundle...`);
+        await loadScript(BUNDLE_URLS[name] || `/static/core/dist/${name}.js`);
+    } catch (error) {
+        console.error(`❌ Failed to load ${name} bundle:`, error);
     }
 }
 